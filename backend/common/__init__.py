@@ -0,0 +1 @@
+# Common utilities package 
\ No newline at end of file
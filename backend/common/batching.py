@@ -0,0 +1,136 @@
+"""
+Async micro-batching dispatcher for model inference.
+
+Requests submitted from concurrent handlers are queued and flushed as one batched predict call
+when either max_batch_size rows are waiting or the oldest row has waited max_wait_ms. A request
+may carry several rows; one that would push the batch past max_batch_size is held for the next
+flush. The batch runs in a worker thread so the event loop stays free, and each caller's future
+is resolved with its own rows of the output.
+"""
+
+import asyncio
+import time
+import numpy as np
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5.0, name="model", executor=None):
+        """
+        predict_fn takes a stacked batch (concatenated along axis 0) and returns one output row
+        per input row. It runs on `executor` (the loop's default thread pool when None).
+        """
+        self.predict_fn = predict_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._loop = None
+        self._queue = None
+        self._worker = None
+        # A queued request that did not fit in the previous batch
+        self._held = None
+
+        self.batches = 0
+        self.items = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.total_predict_time = 0.0
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            # Bind a fresh queue and worker to the loop serving this process' requests
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._held = None
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, x):
+        """
+        Queue one input (with a leading batch axis of 1, or a single row) and wait for its output row.
+        """
+        self._ensure_worker()
+        x = np.asarray(x)
+        future = self._loop.create_future()
+        await self._queue.put((x, future, time.perf_counter()))
+        return await future
+
+    @staticmethod
+    def _rows(item):
+        x = item[0]
+        return len(x) if x.ndim > 1 else 1
+
+    async def _collect(self):
+        if self._held is not None:
+            first, self._held = self._held, None
+        else:
+            first = await self._queue.get()
+        batch = [first]
+        rows = self._rows(first)
+        deadline = self._loop.time() + self.max_wait
+        while rows < self.max_batch_size:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if rows + self._rows(item) > self.max_batch_size:
+                self._held = item
+                break
+            batch.append(item)
+            rows += self._rows(item)
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            inputs = [x if x.ndim > 1 else x[np.newaxis] for x, _, _ in batch]
+            sizes = [len(x) for x in inputs]
+
+            flushed_at = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                wait = flushed_at - enqueued_at
+                self.total_queue_wait += wait
+                self.max_queue_wait = max(self.max_queue_wait, wait)
+
+            self.batches += 1
+            self.items += len(batch)
+            self.rows += sum(sizes)
+            self.largest_batch = max(self.largest_batch, sum(sizes))
+
+            try:
+                outputs = await self._loop.run_in_executor(self.executor, self.predict_fn, np.concatenate(inputs))
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.total_predict_time += time.perf_counter() - flushed_at
+
+            offset = 0
+            for (x, future, _), size in zip(batch, sizes):
+                if not future.done():
+                    result = outputs[offset:offset + size]
+                    future.set_result(result if x.ndim > 1 else result[0])
+                offset += size
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "items": self.items,
+            "rows": self.rows,
+            "avg_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "avg_queue_wait_ms": round(self.total_queue_wait / self.items * 1000, 3) if self.items else 0.0,
+            "max_queue_wait_ms": round(self.max_queue_wait * 1000, 3),
+            "avg_predict_ms": round(self.total_predict_time / self.batches * 1000, 3) if self.batches else 0.0,
+            "queued": (self._queue.qsize() if self._queue is not None else 0) + (self._held is not None),
+        }
@@ -0,0 +1,78 @@
+"""
+Circuit breaker for calls to a slow or failing dependency such as Gemini.
+
+closed     calls go through; `failure_threshold` consecutive failures open the breaker
+open       calls are refused (the caller answers some other way) for `reset_timeout` seconds
+half_open  after that a single trial call goes through; success closes the breaker, failure
+           opens it again
+
+Routes call allow() before the dependency and record_success() / record_failure() after it.
+A call that misses the caller's latency budget counts as a failure. A call abandoned without
+an outcome (e.g. cancelled because the client disconnected) must call release() instead, or a
+half-open breaker would wait for its trial forever. Used from the event loop
+only, so no locking is needed.
+"""
+
+import time
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def allow(self):
+        """Whether a call may go to the dependency now."""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._trial_in_flight:
+                self.rejected += 1
+                return False
+            self._trial_in_flight = True
+        return True
+
+    def record_success(self):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+        self.state = "closed"
+
+    def release(self):
+        """Give up an allowed call without recording an outcome."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout_seconds": self.reset_timeout,
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
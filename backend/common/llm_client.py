@@ -0,0 +1,358 @@
+"""
+Shared async Gemini client for the LLM-backed routes.
+
+genai is configured once per process and GenerativeModel objects are cached, so every call
+reuses the same transport channel. Calls are async, bounded by a process-wide concurrency limit
+and a per-call timeout, and retried with jittered exponential backoff on transient errors.
+Per-call latency, attempts and token usage are recorded and exposed through stats().
+Concurrent generate() calls with an identical prompt and config are coalesced into one upstream
+request whose result every caller receives (single flight).
+
+Configuration (environment):
+    GEMINI_API_KEY / VITE_GEMINI_API_KEY   API key
+    LLM_MODEL                              default model name (gemini-1.5-flash)
+    LLM_TIMEOUT_SECONDS                    per-attempt timeout (30)
+    LLM_MAX_CONCURRENCY                    concurrent calls per process (8)
+    LLM_MAX_RETRIES                        retries after the first attempt (2)
+    LLM_BACKOFF_BASE_SECONDS / LLM_BACKOFF_MAX_SECONDS   backoff schedule (0.5 / 8)
+    LLM_API_ENDPOINT                       alternative endpoint, e.g. http://127.0.0.1:8089 for a stub
+    LLM_TRANSPORT                          "grpc_asyncio" (default) or "rest"
+    LLM_COALESCE                           share one call among identical concurrent prompts (1)
+
+The REST transport has no async client in google-generativeai, so with LLM_TRANSPORT=rest (used
+for local stub servers and HTTP-only proxies) calls run on worker threads instead.
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from dotenv import load_dotenv
+
+dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '.env')
+load_dotenv(dotenv_path=dotenv_path)
+
+# Errors worth another attempt; anything else (bad request, auth, safety blocks) fails at once
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.GatewayTimeout,
+    ConnectionError,
+)
+
+
+class LLMError(Exception):
+    """Raised when a call fails permanently or exhausts its retries."""
+
+
+def _response_text(response):
+    try:
+        return response.text
+    except (ValueError, AttributeError):
+        # No text part, e.g. the candidate was blocked
+        return ""
+
+
+def _usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0, 0
+    return getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "candidates_token_count", 0) or 0
+
+
+class CallMetrics:
+    """Counters and a rolling latency window for one named operation."""
+
+    def __init__(self, window=1000):
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.latencies = deque(maxlen=window)
+
+    def snapshot(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(q):
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 1) if latencies else None
+
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "coalesced": self.coalesced,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+        }
+
+
+class LLMClient:
+    def __init__(self, api_key=None, model_name="gemini-1.5-flash", timeout=30.0, max_concurrency=8,
+                 max_retries=2, backoff_base=0.5, backoff_max=8.0, api_endpoint=None, transport=None,
+                 coalesce=True):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.api_endpoint = api_endpoint
+        self.transport = transport or "grpc_asyncio"
+        self.coalesce = coalesce
+
+        self._configured = False
+        self._configure_lock = threading.Lock()
+        self._models = {}
+        self._loop = None
+        self._semaphore = None
+        self._inflight = {}
+        self.metrics = {}
+        self.recent_calls = deque(maxlen=50)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            api_key=os.getenv("GEMINI_API_KEY") or os.getenv("VITE_GEMINI_API_KEY"),
+            model_name=os.getenv("LLM_MODEL", "gemini-1.5-flash"),
+            timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "30")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            backoff_base=float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5")),
+            backoff_max=float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8")),
+            api_endpoint=os.getenv("LLM_API_ENDPOINT") or None,
+            transport=os.getenv("LLM_TRANSPORT") or None,
+            coalesce=os.getenv("LLM_COALESCE", "1") == "1",
+        )
+
+    @property
+    def uses_threads(self):
+        return self.transport == "rest"
+
+    def _configure(self):
+        with self._configure_lock:
+            if self._configured:
+                return
+            options = {"api_key": self.api_key, "transport": self.transport}
+            if self.api_endpoint:
+                options["client_options"] = {"api_endpoint": self.api_endpoint}
+            genai.configure(**options)
+            self._configured = True
+
+    def model(self, model_name=None, generation_config=None):
+        """Cached GenerativeModel for a model name and generation config."""
+        self._configure()
+        model_name = model_name or self.model_name
+        key = (model_name, json.dumps(generation_config, sort_keys=True, default=str))
+        model = self._models.get(key)
+        if model is None:
+            model = self._models[key] = genai.GenerativeModel(model_name, generation_config=generation_config)
+        return model
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # asyncio primitives belong to one loop; rebind when a new one (e.g. a new worker) starts
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._inflight = {}
+        return loop
+
+    def _limit(self):
+        self._bind_loop()
+        return self._semaphore
+
+    def _metrics(self, name):
+        if name not in self.metrics:
+            self.metrics[name] = CallMetrics()
+        return self.metrics[name]
+
+    def _backoff(self, attempt):
+        # Full jitter keeps retries from many callers from arriving in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _record(self, name, started, attempts, outcome, prompt_tokens=0, output_tokens=0):
+        latency_ms = (time.perf_counter() - started) * 1000
+        metrics = self._metrics(name)
+        metrics.calls += 1
+        metrics.retries += attempts - 1
+        metrics.latencies.append(latency_ms)
+        metrics.prompt_tokens += prompt_tokens
+        metrics.output_tokens += output_tokens
+        if outcome != "ok":
+            metrics.failures += 1
+        if outcome == "timeout":
+            metrics.timeouts += 1
+        self.recent_calls.append({
+            "name": name,
+            "latency_ms": round(latency_ms, 1),
+            "attempts": attempts,
+            "outcome": outcome,
+            "prompt_tokens": prompt_tokens,
+            "output_tokens": output_tokens,
+        })
+
+    @staticmethod
+    def _request_options(timeout):
+        # retry=None turns off the library's own retries so only the backoff below applies
+        return {"timeout": timeout, "retry": None}
+
+    async def _attempt(self, model, prompt, timeout):
+        if self.uses_threads:
+            call = asyncio.to_thread(model.generate_content, prompt, request_options=self._request_options(timeout))
+        else:
+            call = model.generate_content_async(prompt, request_options=self._request_options(timeout))
+        return await asyncio.wait_for(call, timeout)
+
+    async def generate(self, prompt, name="default", timeout=None, model_name=None, generation_config=None):
+        """
+        Generate a completion and return its text. Raises LLMError on permanent failure.
+
+        While a call for the same prompt and config is in flight, later callers wait for it
+        instead of starting their own. The shared call is shielded, so one caller being cancelled
+        (e.g. a client disconnect) does not cancel it for the others.
+        """
+        if not self.coalesce:
+            return await self._generate(prompt, name, timeout, model_name, generation_config)
+
+        loop = self._bind_loop()
+        key = (model_name or self.model_name, json.dumps(generation_config, sort_keys=True, default=str), prompt)
+        task = self._inflight.get(key)
+        if task is None:
+            task = loop.create_task(self._generate(prompt, name, timeout, model_name, generation_config))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish_flight(key, done))
+        else:
+            self._metrics(name).coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish_flight(self, key, task):
+        self._inflight.pop(key, None)
+        # Mark the error as retrieved in case every waiter was cancelled before it arrived
+        if not task.cancelled():
+            task.exception()
+
+    async def _generate(self, prompt, name, timeout, model_name, generation_config):
+        model = self.model(model_name, generation_config)
+        timeout = timeout or self.timeout
+        started = time.perf_counter()
+        attempt = 0
+        async with self._limit():
+            while True:
+                attempt += 1
+                try:
+                    response = await self._attempt(model, prompt, timeout)
+                    break
+                except RETRYABLE_ERRORS as e:
+                    if attempt > self.max_retries:
+                        outcome = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                        self._record(name, started, attempt, outcome)
+                        raise LLMError(f"{name}: giving up after {attempt} attempts: {e!r}") from e
+                    await asyncio.sleep(self._backoff(attempt - 1))
+                except Exception as e:
+                    self._record(name, started, attempt, "error")
+                    raise LLMError(f"{name}: {e}") from e
+
+        self._record(name, started, attempt, "ok", *_usage(response))
+        return _response_text(response).strip()
+
+    async def _stream_chunks(self, model, prompt, timeout):
+        """Yield response chunks, each awaited with the per-call timeout."""
+        if not self.uses_threads:
+            response = await asyncio.wait_for(
+                model.generate_content_async(prompt, stream=True, request_options=self._request_options(timeout)), timeout
+            )
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    yield await asyncio.wait_for(chunks.__anext__(), timeout)
+                except StopAsyncIteration:
+                    return
+
+        response = await asyncio.wait_for(
+            asyncio.to_thread(model.generate_content, prompt, stream=True, request_options=self._request_options(timeout)), timeout
+        )
+        chunks = iter(response)
+        done = object()
+        while True:
+            chunk = await asyncio.wait_for(asyncio.to_thread(next, chunks, done), timeout)
+            if chunk is done:
+                return
+            yield chunk
+
+    async def stream(self, prompt, name="default", timeout=None, model_name=None, generation_config=None):
+        """
+        Async generator of text deltas. Failures before the first chunk are retried like
+        generate(); a failure mid-stream raises LLMError, since the caller has already used the
+        partial text.
+
+        The concurrency slot is held only until the first chunk arrives, so a slow reader (or a
+        consumer that never closes the generator) cannot starve other calls.
+        """
+        model = self.model(model_name, generation_config)
+        timeout = timeout or self.timeout
+        started = time.perf_counter()
+        attempt = 0
+        usage = (0, 0)
+        semaphore = self._limit()
+        await semaphore.acquire()
+        holding = True
+        try:
+            while True:
+                attempt += 1
+                received = False
+                try:
+                    async for chunk in self._stream_chunks(model, prompt, timeout):
+                        if holding:
+                            semaphore.release()
+                            holding = False
+                        received = True
+                        usage = _usage(chunk) if getattr(chunk, "usage_metadata", None) else usage
+                        text = _response_text(chunk)
+                        if text:
+                            yield text
+                    break
+                except RETRYABLE_ERRORS as e:
+                    if received or attempt > self.max_retries:
+                        outcome = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                        self._record(name, started, attempt, outcome, *usage)
+                        raise LLMError(f"{name}: stream failed after {attempt} attempts: {e!r}") from e
+                    await asyncio.sleep(self._backoff(attempt - 1))
+                except Exception as e:
+                    self._record(name, started, attempt, "error", *usage)
+                    raise LLMError(f"{name}: {e}") from e
+        finally:
+            if holding:
+                semaphore.release()
+
+        self._record(name, started, attempt, "ok", *usage)
+
+    def stats(self):
+        return {
+            "model": self.model_name,
+            "transport": self.transport,
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout,
+            "max_retries": self.max_retries,
+            "operations": {name: metrics.snapshot() for name, metrics in self.metrics.items()},
+            "recent_calls": list(self.recent_calls),
+        }
+
+
+# Process-wide client shared by every LLM-backed route
+llm_client = LLMClient.from_env()
@@ -0,0 +1,121 @@
+"""
+Shared model loading layer.
+
+Artifacts are re-serialized once into uncompressed joblib files under MODEL_CACHE_DIR and then
+loaded with mmap_mode="r". Their NumPy arrays are file-backed pages, so every worker process
+that maps the same file shares one physical copy through the OS page cache. Combined with
+loading the app in the parent before forking (see gunicorn.conf.py), the Python objects that
+wrap those arrays are shared copy-on-write as well.
+
+TensorFlow and TFLite models are the exception: they are wrapped in PerProcessModel and loaded
+in each worker instead (see its docstring).
+"""
+
+import os
+import sys
+import threading
+import joblib
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(BACKEND_DIR, ".model_cache"))
+
+# Set MODEL_MMAP=0 to fall back to plain joblib.load into private memory
+MMAP_ENABLED = os.getenv("MODEL_MMAP", "1") != "0"
+
+
+def _cache_path(source_path, variant):
+    name = os.path.basename(source_path)
+    return os.path.join(MODEL_CACHE_DIR, f"{name}.{variant}.joblib")
+
+
+def _is_fresh(cache_path, source_path):
+    return os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(source_path)
+
+
+def _dump_atomic(obj, cache_path):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    # compress=0 keeps arrays as raw aligned buffers, which is what mmap_mode needs
+    joblib.dump(obj, tmp_path, compress=0)
+    os.replace(tmp_path, cache_path)
+
+
+def load_derived(source_path, variant, build):
+    """
+    Load an artifact derived from source_path (e.g. a compiled model), memory-mapped.
+
+    build() is only called when the cached copy is missing or older than source_path.
+    """
+    if not MMAP_ENABLED:
+        return build()
+
+    cache_path = _cache_path(source_path, variant)
+    if not _is_fresh(cache_path, source_path):
+        print(f"Writing memory-mappable copy of {os.path.basename(source_path)} ({variant})")
+        _dump_atomic(build(), cache_path)
+    return joblib.load(cache_path, mmap_mode="r")
+
+
+def load_artifact(source_path):
+    """
+    Load a joblib/pickle artifact with its NumPy arrays memory-mapped from disk.
+    """
+    return load_derived(source_path, "mmap", lambda: joblib.load(source_path))
+
+
+class PerProcessModel:
+    """
+    A model loaded on first use in each process rather than at import time.
+
+    TensorFlow starts its thread pools when a model is loaded, and they do not survive fork():
+    a Keras model loaded in the gunicorn master hangs forever in predict() in the forked
+    workers. load() (which should also do the TensorFlow import) therefore runs lazily, once
+    per process, so the preloaded master never initializes TensorFlow.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._model = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._model = self._load()
+                    self._pid = pid
+        return self._model
+
+    def predict(self, *args, **kwargs):
+        return self.get().predict(*args, **kwargs)
+
+
+def memory_usage():
+    """
+    Resident memory of the current process in MB.
+
+    rss_file_mb counts file-backed pages (memory-mapped models) that are shared between
+    workers; rss_anon_mb is the memory private to this worker.
+    """
+    usage = {"pid": os.getpid()}
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "RssAnon", "RssFile", "RssShmem"):
+                    usage[key] = int(value.split()[0]) / 1024
+        return {
+            "pid": usage["pid"],
+            "rss_mb": round(usage.get("VmRSS", 0.0), 1),
+            "rss_anon_mb": round(usage.get("RssAnon", 0.0), 1),
+            "rss_file_mb": round(usage.get("RssFile", 0.0), 1),
+        }
+    except OSError:
+        import resource
+
+        # Without /proc only the peak RSS is available (reported in bytes on macOS, KB elsewhere)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return {"pid": usage["pid"], "peak_rss_mb": round(peak / divisor, 1)}
@@ -0,0 +1,198 @@
+"""
+Bounded LRU cache for tabular model predictions.
+
+Soil-test inputs have limited precision, so requests repeat the same feature tuples. Keys are
+the inputs rounded to a per-feature number of decimals; the model is evaluated on those rounded
+values so a cached answer is exactly what a fresh call would return. The cache watches the model
+files it depends on and clears itself (and runs the registered hooks) when one of them changes.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def parse_precision(spec):
+    """
+    Parse a per-feature precision spec such as "N=0,P=0,ph=1" into {"N": 0, "P": 0, "ph": 1}.
+    """
+    precision = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, digits = item.split("=", 1)
+            precision[name.strip()] = int(digits)
+    return precision
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with optional TTL and hit/miss/eviction counters.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if self.ttl is None or time.monotonic() - stored_at < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def keys(self):
+        with self._lock:
+            return list(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class PredictionCache(LRUCache):
+    """
+    LRU cache keyed by quantized model inputs, invalidated when a watched model file changes.
+    """
+
+    def __init__(self, maxsize=4096, precision=None, default_precision=2, watch_paths=(), check_interval=5.0):
+        super().__init__(maxsize=maxsize)
+        self.precision = precision or {}
+        self.default_precision = default_precision
+        self.watch_paths = list(watch_paths)
+        self.check_interval = check_interval
+        self.invalidations = 0
+        self._hooks = []
+        self._signature = self._file_signature()
+        self._last_check = time.monotonic()
+        # Serializes reloads so concurrent requests don't each run the hooks for one file change
+        self._reload_lock = threading.Lock()
+
+    def quantize(self, features):
+        """
+        Round every feature to its configured number of decimals. Returns a new dict in the
+        same key order.
+        """
+        return {
+            name: round(value, self.precision.get(name, self.default_precision)) if isinstance(value, float) else value
+            for name, value in features.items()
+        }
+
+    def add_invalidation_hook(self, hook):
+        """
+        Register a callable run (with no arguments) when a watched model file changed. The cache
+        is cleared once every hook has returned; if a hook raises, the change is retried on the
+        next check.
+        """
+        self._hooks.append(hook)
+
+    def _file_signature(self):
+        signature = []
+        for path in self.watch_paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return signature
+
+    def check_for_changes(self):
+        """
+        Clear the cache and fire the hooks if any watched file changed since the last check.
+        """
+        now = time.monotonic()
+        if not self.watch_paths or now - self._last_check < self.check_interval:
+            return False
+        # Another request is already reloading; keep serving the current model meanwhile
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._last_check = now
+            signature = self._file_signature()
+            if signature == self._signature:
+                return False
+
+            print("Model file changed, reloading model.")
+            try:
+                for hook in self._hooks:
+                    hook()
+            except Exception as e:
+                # The signature is left as is so the next check tries again (e.g. a half-written file)
+                print(f"Model reload failed, keeping the current model: {e}")
+                return False
+
+            self._signature = signature
+            self.clear()
+            self.invalidations += 1
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def get_or_compute(self, features, compute):
+        """
+        Return the cached prediction for the quantized features, calling compute(quantized)
+        on a miss.
+        """
+        self.check_for_changes()
+        quantized = self.quantize(features)
+        key = tuple(quantized.values())
+
+        result = self.get(key)
+        if result is None:
+            result = compute(quantized)
+            self.put(key, result)
+        return result
+
+    async def get_or_compute_async(self, features, compute):
+        """
+        Same as get_or_compute, for an async compute(quantized) coroutine function.
+        """
+        self.check_for_changes()
+        quantized = self.quantize(features)
+        key = tuple(quantized.values())
+
+        result = self.get(key)
+        if result is None:
+            result = await compute(quantized)
+            self.put(key, result)
+        return result
+
+    def stats(self):
+        stats = super().stats()
+        stats["invalidations"] = self.invalidations
+        return stats
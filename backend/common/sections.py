@@ -0,0 +1,151 @@
+"""
+Single-pass section tokenizer for structured LLM responses.
+
+Gemini is prompted to answer in "**HEADER:** body" blocks with numbered or bulleted items. The
+tokenizer walks the text line by line exactly once, splitting it into sections (header to next
+header) and items, and works the same on a complete string (tokenize) as on a stream of chunks
+(feed/close): a line is processed as soon as its newline arrives and a section is returned as
+soon as the next header closes it.
+
+Header lines may start with whitespace, "#" or "**" and end with "LABEL:" or "LABEL:**"
+(case-insensitive); any text after the colon is the first body line.
+"""
+
+import functools
+import re
+
+NUMBERED_ITEM = re.compile(r'\d+\.\s*')
+BULLETED_ITEM = re.compile(r'\s*[-*•]\s+')
+
+
+class Section:
+    """
+    One header-delimited block. `key` is the caller's name for the header (None for text before
+    the first header, or after a stray bold line when stop_at_bold_lines is set).
+    """
+
+    __slots__ = ("key", "lines")
+
+    def __init__(self, key):
+        self.key = key
+        self.lines = []
+
+    @property
+    def text(self):
+        return "\n".join(self.lines).strip()
+
+    def numbered_items(self):
+        """Numbered items with ** markers removed and whitespace collapsed."""
+        items = []
+        for line in self.lines:
+            marker = NUMBERED_ITEM.match(line)
+            if marker:
+                items.append([line[marker.end():]])
+            elif items:
+                items[-1].append(line)
+        return _clean_items(items)
+
+    def bulleted_items(self):
+        items = []
+        for line in self.lines:
+            marker = BULLETED_ITEM.match(line)
+            if marker:
+                items.append([line[marker.end():]])
+            elif items and line.strip() and not NUMBERED_ITEM.match(line):
+                items[-1].append(line)
+        return _clean_items(items)
+
+    def _add(self, line):
+        self.lines.append(line if self.lines else line.lstrip())
+
+
+def _clean_items(items):
+    # Items are lists of lines: the marker line plus its continuation lines
+    cleaned = []
+    for lines in items:
+        item = " ".join(" ".join(lines).replace("**", "").split())
+        if item:
+            cleaned.append(item)
+    return cleaned
+
+
+@functools.lru_cache(maxsize=None)
+def compile_headers(labels):
+    """
+    Header pattern for a tuple of labels, compiled once per label set. Longer labels are tried
+    first so that one label being a prefix of another cannot cut it short.
+    """
+    alternatives = "|".join(re.escape(label) for label in sorted(labels, key=len, reverse=True))
+    return re.compile(r'[ \t#]*(?:\*\*)?[ \t]*(' + alternatives + r')[ \t]*:(?:\*\*)?[ \t]*(.*)', re.IGNORECASE)
+
+
+class SectionTokenizer:
+    def __init__(self, headers, strip_bold=False, stop_at_bold_lines=False):
+        """
+        headers maps header labels (matched case-insensitively) to section keys.
+
+        strip_bold removes every "**" before a line is processed. stop_at_bold_lines closes the
+        current section at any line starting with "**", not only at known headers.
+        """
+        self.headers = {label.casefold(): key for label, key in headers.items()}
+        self.header_pattern = compile_headers(tuple(headers)) if headers else None
+        self.strip_bold = strip_bold
+        self.stop_at_bold_lines = stop_at_bold_lines
+        self.pending = ""
+        self.current = Section(None)
+        self.sections = {}
+
+    def _close_current(self, closed):
+        section = self.current
+        # Like a first-match search, only the first occurrence of each header counts
+        if section.key is not None and section.key not in self.sections:
+            self.sections[section.key] = section
+            closed.append(section)
+
+    def _lines(self, raw_lines, closed, lines):
+        # The per-line hot path, so attributes are bound to locals once per call
+        header_pattern, headers = self.header_pattern, self.headers
+        strip_bold, stop_at_bold_lines = self.strip_bold, self.stop_at_bold_lines
+        current = self.current
+        for line in raw_lines:
+            if strip_bold:
+                line = line.replace("**", "")
+            # Every header has a colon; most body lines are rejected without running the pattern
+            header = header_pattern.match(line) if header_pattern is not None and ":" in line else None
+            if header:
+                self._close_current(closed)
+                current = self.current = Section(headers[header.group(1).casefold()])
+                rest = header.group(2)
+                if rest.rstrip("*").strip():
+                    current._add(rest)
+                continue
+            if stop_at_bold_lines and line.startswith("**"):
+                self._close_current(closed)
+                current = self.current = Section(None)
+            current._add(line)
+            lines.append((current.key, line))
+
+    def feed(self, chunk):
+        """
+        Consume a chunk. Returns (closed sections, completed body lines as (key, line) pairs).
+        """
+        closed, lines = [], []
+        parts = (self.pending + chunk).split("\n")
+        self.pending = parts.pop()
+        self._lines(parts, closed, lines)
+        return closed, lines
+
+    def close(self):
+        """Flush the last partial line and the open section."""
+        closed, lines = [], []
+        if self.pending:
+            self._lines([self.pending], closed, lines)
+            self.pending = ""
+        self._close_current(closed)
+        return closed, lines
+
+    def tokenize(self, text):
+        """Tokenize a complete response; returns {key: Section} for the headers found."""
+        self.feed(text)
+        self.close()
+        return self.sections
@@ -0,0 +1,12 @@
+"""
+Server-Sent Events helpers.
+"""
+
+import json
+
+
+def format_sse(event, data):
+    """
+    Encode one SSE message with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
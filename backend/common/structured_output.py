@@ -0,0 +1,90 @@
+"""
+Output modes for the Gemini prompts, and parse counters per mode.
+
+In "text" mode (the default) the prompts ask for markdown "**HEADER:**" sections, which the
+parsers in each API's utils/ turn into the response shape. In "json" mode the response's
+Pydantic model is sent as the Gemini response_schema, so the answer is schema-constrained JSON
+that is validated straight into the model, with no parse stage and no raw-text fallback.
+
+Configuration (environment):
+    LLM_OUTPUT_MODE    "text" (default) or "json"
+"""
+
+import os
+import time
+from collections import deque
+
+from pydantic import ValidationError
+
+OUTPUT_MODES = ("text", "json")
+OUTPUT_MODE = os.getenv("LLM_OUTPUT_MODE", "text").strip().lower()
+if OUTPUT_MODE not in OUTPUT_MODES:
+    raise ValueError(f"LLM_OUTPUT_MODE must be one of {OUTPUT_MODES}, got {OUTPUT_MODE!r}")
+
+
+class SchemaError(Exception):
+    """Raised when a JSON-mode answer does not validate against its schema."""
+
+
+def json_generation_config(schema):
+    """generation_config asking Gemini for JSON constrained to a Pydantic model."""
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+
+def validate_json(schema, text):
+    try:
+        return schema.model_validate_json(text)
+    except ValidationError as e:
+        raise SchemaError(f"{schema.__name__}: {e}") from e
+
+
+class ParseMetrics:
+    """Parse counters and a rolling latency window for one (response, mode) pair."""
+
+    def __init__(self, window=1000):
+        self.parses = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=window)
+
+    def snapshot(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(q):
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 3) if latencies else None
+
+        return {
+            "parses": self.parses,
+            "failures": self.failures,
+            "failure_rate": round(self.failures / self.parses, 4) if self.parses else 0.0,
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+        }
+
+
+class ParseStats:
+    def __init__(self):
+        self.metrics = {}
+
+    def record(self, name, mode, started, ok):
+        """
+        Count one parse of a `name` response in `mode` that began at perf_counter() `started`.
+        A failure is an answer that fell back to the raw text or did not validate.
+        """
+        key = (name, mode)
+        if key not in self.metrics:
+            self.metrics[key] = ParseMetrics()
+        metrics = self.metrics[key]
+        metrics.parses += 1
+        metrics.latencies.append((time.perf_counter() - started) * 1000)
+        if not ok:
+            metrics.failures += 1
+
+    def stats(self):
+        stats = {}
+        for (name, mode), metrics in self.metrics.items():
+            stats.setdefault(name, {})[mode] = metrics.snapshot()
+        return stats
+
+
+# Process-wide counters, exposed through /health/llm
+parse_stats = ParseStats()
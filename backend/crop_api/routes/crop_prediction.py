@@ -1,9 +1,21 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from typing import List, NamedTuple
 import numpy as np
+import codecs
+import csv
+import io
+import json
 import joblib
+import math
 import os
 
+from common.model_store import load_artifact, load_derived
+from common.prediction_cache import PredictionCache, parse_precision
+from ..utils.compiled_forest import CompiledForest
+
 router = APIRouter()
 
 # Load model and label encoder once
@@ -16,11 +28,56 @@ if not os.path.exists(model_path):
 if not os.path.exists(encoder_path):
     raise FileNotFoundError(f"Label encoder file not found at: {encoder_path}. Please ensure the label encoder is saved by running train_model.py in the backend directory.")
 
-try:
-    model = joblib.load(model_path)
-    label_encoder = joblib.load(encoder_path)
-except Exception as e:
-    raise RuntimeError(f"Error loading model or label encoder: {e}")
+# "compiled" evaluates the forest from flat NumPy node arrays; "sklearn" calls the pipeline directly
+INFERENCE_MODE = os.getenv("CROP_INFERENCE_MODE", "compiled").lower()
+
+class CropModels(NamedTuple):
+    label_encoder: object
+    predictor: object
+    # Crop name for every predict_proba column, decoded once instead of per request
+    class_names: np.ndarray
+
+def load_models():
+    """
+    Load (or reload) the label encoder and predictor, then publish them together in the
+    `models` global so a request never sees a predictor paired with another model's classes.
+    """
+    global models
+    try:
+        label_encoder = load_artifact(encoder_path)
+        if INFERENCE_MODE == "compiled":
+            # The compiled node arrays are memory-mapped, so forked workers share a single copy
+            predictor = load_derived(model_path, "compiled", lambda: CompiledForest(joblib.load(model_path)))
+        else:
+            predictor = load_artifact(model_path)
+        class_names = label_encoder.inverse_transform(predictor.classes_)
+    except Exception as e:
+        raise RuntimeError(f"Error loading model or label encoder: {e}")
+
+    models = CropModels(label_encoder, predictor, class_names)
+
+load_models()
+
+# Largest number of rows accepted by the batch endpoint in a single request
+MAX_BATCH_SIZE = int(os.getenv("CROP_MAX_BATCH_SIZE", "5000"))
+
+# Rows scored per predict_proba call by the streaming endpoint; bounds its memory use
+STREAM_CHUNK_SIZE = int(os.getenv("CROP_STREAM_CHUNK_SIZE", "1024"))
+# Longest CSV/NDJSON record accepted by the stream endpoint; longer lines get a per-row error
+STREAM_MAX_LINE_CHARS = int(os.getenv("CROP_STREAM_MAX_LINE_CHARS", "4096"))
+
+# Column order the pipeline was trained on
+FEATURE_ORDER = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+
+# Single-row predictions are cached on inputs rounded to soil-test-card precision.
+# CROP_CACHE_SIZE=0 disables the cache.
+prediction_cache = PredictionCache(
+    maxsize=int(os.getenv("CROP_CACHE_SIZE", "4096")),
+    precision=parse_precision(os.getenv("CROP_CACHE_PRECISION", "N=0,P=0,K=0,temperature=1,humidity=0,ph=1,rainfall=0")),
+    default_precision=int(os.getenv("CROP_CACHE_DEFAULT_PRECISION", "2")),
+    watch_paths=[model_path, encoder_path],
+)
+prediction_cache.add_invalidation_hook(load_models)
 
 # Input schema
 class CropInput(BaseModel):
@@ -32,12 +89,218 @@ class CropInput(BaseModel):
     ph: float
     rainfall: float
 
+class CropBatchInput(BaseModel):
+    rows: List[CropInput]
+
+def build_feature_matrix(rows):
+    """
+    Stack CropInput rows into a single (n_rows, n_features) array in training column order.
+    """
+    return np.array([[getattr(row, feature) for feature in FEATURE_ORDER] for row in rows], dtype=np.float64)
+
+def rank_crops(probabilities, top_k, class_names):
+    """
+    Return, for every row of a predict_proba matrix, the top_k crops with their probabilities.
+    """
+    top_k = min(top_k, probabilities.shape[1])
+    # Stable sort keeps the first class on ties, matching argmax/predict
+    ranked = np.argsort(-probabilities, axis=1, kind="stable")[:, :top_k]
+    return [
+        [{"crop": class_names[index], "probability": round(float(row[index]), 4)} for index in order]
+        for row, order in zip(probabilities, ranked)
+    ]
+
 @router.post("/predict-crop")
-def predict_crop(data: CropInput):
+def predict_crop(data: CropInput, top_k: int = Query(default=1, ge=1)):
+    try:
+        def compute(quantized):
+            # Cached together with the class names of the model that produced them
+            current = models
+            return current.predictor.predict_proba(build_feature_matrix([CropInput(**quantized)])), current.class_names
+
+        probabilities, class_names = prediction_cache.get_or_compute(
+            {feature: getattr(data, feature) for feature in FEATURE_ORDER}, compute
+        )
+        ranking = rank_crops(probabilities, top_k, class_names)[0]
+
+        response = {"predicted_crop": ranking[0]["crop"]}
+        if top_k > 1:
+            response["recommendations"] = ranking
+        return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/predict-crop/batch")
+def predict_crop_batch(data: CropBatchInput, top_k: int = Query(default=1, ge=1)):
+    if not data.rows:
+        raise HTTPException(status_code=400, detail="At least one row is required.")
+    if len(data.rows) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch size {len(data.rows)} exceeds the maximum of {MAX_BATCH_SIZE} rows.")
+
+    # The batch path bypasses the cache, so it checks for a replaced model file itself
+    prediction_cache.check_for_changes()
+    samples = build_feature_matrix(data.rows)
+    non_finite = np.flatnonzero(~np.isfinite(samples).all(axis=1))
+    if len(non_finite):
+        raise HTTPException(status_code=400, detail=[f"rows[{index}]: NaN or infinite value" for index in non_finite])
     try:
-        sample = np.array([[data.N, data.P, data.K, data.temperature, data.humidity, data.ph, data.rainfall]])
-        prediction = model.predict(sample)
-        crop_name = label_encoder.inverse_transform(prediction)[0]
-        return {"predicted_crop": crop_name}
+        # One predict_proba call scores the whole batch; the first ranked column is what predict() would return
+        current = models
+        probabilities = current.predictor.predict_proba(samples)
+
+        results = []
+        for ranking in rank_crops(probabilities, top_k, current.class_names):
+            result = {"predicted_crop": ranking[0]["crop"], "confidence": ranking[0]["probability"]}
+            if top_k > 1:
+                result["recommendations"] = ranking
+            results.append(result)
+        return {"count": len(results), "results": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/predict-crop/cache-stats")
+def crop_cache_stats():
+    return prediction_cache.stats()
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body generator is still reading the request body.
+
+    The stock class starts a task that consumes receive() to watch for disconnects, which would
+    race the generator for the request body chunks. Here disconnects surface through
+    request.stream() (ClientDisconnect) instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+async def iter_lines(request):
+    """
+    Yield decoded lines from the request body as it arrives, without buffering the whole body.
+    A line longer than STREAM_MAX_LINE_CHARS is yielded as None and the rest of it is skipped,
+    so memory stays flat even for a body with no newlines.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    remainder = ""
+    skipping = False
+    async for chunk in request.stream():
+        text = remainder + decoder.decode(chunk)
+        lines = text.split("\n")
+        remainder = lines.pop()
+        for line in lines:
+            if skipping:
+                # The tail of an oversized line
+                skipping = False
+                continue
+            yield line.rstrip("\r") if len(line) <= STREAM_MAX_LINE_CHARS else None
+        if len(remainder) > STREAM_MAX_LINE_CHARS:
+            if not skipping:
+                yield None
+            skipping = True
+            remainder = ""
+    remainder += decoder.decode(b"", final=True)
+    if remainder and not skipping:
+        yield remainder.rstrip("\r") if len(remainder) <= STREAM_MAX_LINE_CHARS else None
+
+def parse_features(values):
+    """Floats in FEATURE_ORDER from a mapping of raw values; NaN and infinity are rejected."""
+    features = [float(values[feature]) for feature in FEATURE_ORDER]
+    non_finite = [feature for feature, value in zip(FEATURE_ORDER, features) if not math.isfinite(value)]
+    if non_finite:
+        raise ValueError(f"non-finite value for {', '.join(non_finite)}")
+    return features
+
+async def iter_rows(request, is_csv):
+    """
+    Yield (row_number, features, error) for every record of a CSV or NDJSON body.
+    features is a list in FEATURE_ORDER, or None when the record could not be parsed.
+    """
+    columns = None
+    row_number = 0
+    async for line in iter_lines(request):
+        if line is not None and not line.strip():
+            continue
+        if is_csv and columns is None:
+            if line is None:
+                raise ValueError(f"CSV header is longer than {STREAM_MAX_LINE_CHARS} characters")
+            header = next(csv.reader([line]))
+            columns = {name.strip(): index for index, name in enumerate(header)}
+            missing = [feature for feature in FEATURE_ORDER if feature not in columns]
+            if missing:
+                raise ValueError(f"CSV header is missing columns: {', '.join(missing)}")
+            continue
+
+        row_number += 1
+        if line is None:
+            yield row_number, None, f"Invalid row: longer than {STREAM_MAX_LINE_CHARS} characters"
+            continue
+        try:
+            if is_csv:
+                values = next(csv.reader([line]))
+                features = parse_features({feature: values[columns[feature]] for feature in FEATURE_ORDER})
+            else:
+                features = parse_features(json.loads(line))
+            yield row_number, features, None
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            yield row_number, None, f"Invalid row: {e}"
+
+def score_chunk(chunk, top_k):
+    """
+    Score the valid rows of a chunk in one predict_proba call and return result dicts in input order.
+    """
+    valid = [features for _, features, _ in chunk if features is not None]
+    current = models
+    rankings = iter(
+        rank_crops(current.predictor.predict_proba(np.array(valid, dtype=np.float64)), top_k, current.class_names)
+        if valid else []
+    )
+
+    results = []
+    for row_number, features, error in chunk:
+        if features is None:
+            results.append({"row": row_number, "error": error})
+            continue
+        ranking = next(rankings)
+        result = {"row": row_number, "predicted_crop": ranking[0]["crop"], "confidence": ranking[0]["probability"]}
+        if top_k > 1:
+            result["recommendations"] = ranking
+        results.append(result)
+    return results
+
+def format_csv_result(result):
+    recommendations = ";".join(f"{item['crop']}:{item['probability']}" for item in result.get("recommendations", []))
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow([
+        result["row"], result.get("predicted_crop", ""), result.get("confidence", ""), recommendations, result.get("error", "")
+    ])
+    return buffer.getvalue()
+
+@router.post("/predict-crop/stream")
+async def predict_crop_stream(request: Request, top_k: int = Query(default=1, ge=1)):
+    """
+    Score a CSV (text/csv, header row required) or NDJSON body of soil samples in fixed-size chunks
+    and stream the results back in the same format while the upload is still being read.
+    """
+    is_csv = "csv" in request.headers.get("content-type", "")
+    prediction_cache.check_for_changes()
+
+    async def generate():
+        if is_csv:
+            yield "row,predicted_crop,confidence,recommendations,error\n"
+        chunk = []
+        try:
+            async for item in iter_rows(request, is_csv):
+                chunk.append(item)
+                if len(chunk) >= STREAM_CHUNK_SIZE:
+                    results = await run_in_threadpool(score_chunk, chunk, top_k)
+                    chunk = []
+                    yield "".join(format_csv_result(r) if is_csv else json.dumps(r) + "\n" for r in results)
+            if chunk:
+                results = await run_in_threadpool(score_chunk, chunk, top_k)
+                yield "".join(format_csv_result(r) if is_csv else json.dumps(r) + "\n" for r in results)
+        except Exception as e:
+            error = {"row": None, "error": str(e)}
+            yield format_csv_result(error) if is_csv else json.dumps(error) + "\n"
+
+    media_type = "text/csv" if is_csv else "application/x-ndjson"
+    return DuplexStreamingResponse(generate(), media_type=media_type)
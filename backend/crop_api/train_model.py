@@ -4,22 +4,92 @@ warnings.filterwarnings("ignore")
 import pandas as pd
 import numpy as np
 import joblib
+import argparse
+import io
+import json
 import os
-from sklearn.model_selection import train_test_split
+import time
+from sklearn.model_selection import train_test_split, GridSearchCV, ParameterGrid
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.pipeline import Pipeline
 from sklearn.ensemble import RandomForestClassifier
 
+from utils.compiled_forest import CompiledForest
+
 # Define paths for data and model saving
 DATA_PATH = os.path.join("..", "..", "Crop_recommendation.csv")
 MODELS_DIR = os.path.join("models")
 MODEL_PATH = os.path.join(MODELS_DIR, "crop_model.pkl")
 ENCODER_PATH = os.path.join(MODELS_DIR, "label_encoder.pkl")
+REPORT_PATH = os.path.join(MODELS_DIR, "training_report.json")
 
 # Ensure the models directory exists
 os.makedirs(MODELS_DIR, exist_ok=True)
 
-def train_and_save_model():
+def parse_int_list(value):
+    """Parse "50,100,none" into [50, 100, None]."""
+    return [None if item.strip().lower() == "none" else int(item) for item in value.split(",")]
+
+def build_pipeline(n_jobs=None, **classifier_params):
+    return Pipeline([
+        ("scaler", StandardScaler()),
+        ("classifier", RandomForestClassifier(random_state=42, n_jobs=n_jobs, **classifier_params))
+    ])
+
+def serialized_size(obj):
+    """Size in bytes of the joblib dump that would be written to disk."""
+    buffer = io.BytesIO()
+    joblib.dump(obj, buffer)
+    return buffer.getbuffer().nbytes
+
+def measure_latency(predict, X, repeats):
+    """Median wall time of predict(X) in milliseconds."""
+    predict(X)  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(X)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+def benchmark_candidate(pipeline, X_test, y_test, repeats):
+    """
+    Accuracy, serialized size and single-row / batch latency of a fitted pipeline, for both
+    the sklearn pipeline and the compiled evaluator used by the API.
+    """
+    # Deployed models predict on one thread; per-call thread start-up dominates small batches
+    pipeline.named_steps["classifier"].set_params(n_jobs=None)
+    compiled = CompiledForest(pipeline)
+
+    X_test = X_test.to_numpy(dtype=np.float64)
+    row = X_test[:1]
+    return {
+        "test_accuracy": round(float(np.mean(pipeline.predict(X_test) == y_test)), 4),
+        "model_size_bytes": serialized_size(pipeline),
+        "sklearn_single_row_ms": round(measure_latency(pipeline.predict_proba, row, repeats), 3),
+        "sklearn_batch_ms": round(measure_latency(pipeline.predict_proba, X_test, max(1, repeats // 10)), 3),
+        "compiled_single_row_ms": round(measure_latency(compiled.predict_proba, row, repeats), 3),
+        "compiled_batch_ms": round(measure_latency(compiled.predict_proba, X_test, max(1, repeats // 10)), 3),
+        "batch_rows": len(X_test),
+    }
+
+def select_candidate(candidates, strategy, tolerance, latency_mode):
+    """
+    Pick the most accurate candidate, or the smallest / fastest one whose cross-validated
+    accuracy is within `tolerance` of the best.
+    """
+    best_accuracy = max(candidate["cv_accuracy"] for candidate in candidates)
+    eligible = [candidate for candidate in candidates if candidate["cv_accuracy"] >= best_accuracy - tolerance]
+
+    if strategy == "smallest":
+        return min(eligible, key=lambda candidate: candidate["model_size_bytes"])
+    if strategy == "fastest":
+        return min(eligible, key=lambda candidate: candidate[f"{latency_mode}_single_row_ms"])
+    return max(eligible, key=lambda candidate: candidate["cv_accuracy"])
+
+def train_and_save_model(n_estimators=(100,), max_depth=(None,), min_samples_leaf=(1,), cv=5,
+                         select="accuracy", tolerance=0.005, latency_mode="compiled",
+                         latency_repeats=200, n_jobs=-1):
     print("Starting model training...")
 
     # Load Data
@@ -38,15 +108,39 @@ def train_and_save_model():
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42)
     print(f"Train Samples: {len(X_train)}, Test Samples: {len(X_test)}")
 
-    # Model Building (Using RandomForestClassifier as it was the 'best_clf' in the original script)
-    pipeline = Pipeline([
-        ("scaler", StandardScaler()),
-        ("classifier", RandomForestClassifier(n_estimators=100, random_state=42)) # Using 100 estimators as a reasonable default
-    ])
-    
-    print("Fitting model...")
-    pipeline.fit(X_train, y_train)
-    print("Model fitted.")
+    # Cross-validated search over the forest's size/shape, fitting folds on every core
+    param_grid = {
+        "classifier__n_estimators": list(n_estimators),
+        "classifier__max_depth": list(max_depth),
+        "classifier__min_samples_leaf": list(min_samples_leaf),
+    }
+    print(f"Cross-validating {len(ParameterGrid(param_grid))} candidates with {cv} folds...")
+    search = GridSearchCV(build_pipeline(), param_grid, cv=cv, scoring="accuracy", n_jobs=n_jobs, refit=False)
+    search.fit(X_train, y_train)
+
+    # Each candidate is fitted once on the full training split for the benchmark; that fitted
+    # pipeline is the one saved if it is selected. refit=True would only refit the most
+    # accurate candidate, but "smallest" and "fastest" can select any of them.
+    candidates, fitted = [], []
+    for params, cv_accuracy in zip(search.cv_results_["params"], search.cv_results_["mean_test_score"]):
+        classifier_params = {name.split("__", 1)[1]: value for name, value in params.items()}
+        pipeline = build_pipeline(n_jobs=n_jobs, **classifier_params)
+        pipeline.fit(X_train, y_train)
+
+        candidate = {"params": classifier_params, "cv_accuracy": round(float(cv_accuracy), 4)}
+        candidate.update(benchmark_candidate(pipeline, X_test, y_test, latency_repeats))
+        candidates.append(candidate)
+        fitted.append(pipeline)
+        print(f"  {classifier_params}: cv={candidate['cv_accuracy']:.4f} test={candidate['test_accuracy']:.4f} "
+              f"size={candidate['model_size_bytes'] / 1024:.0f} KB "
+              f"row={candidate[f'{latency_mode}_single_row_ms']:.3f} ms "
+              f"batch={candidate[f'{latency_mode}_batch_ms']:.1f} ms")
+
+    chosen = select_candidate(candidates, select, tolerance, latency_mode)
+    print(f"Selected ({select}, tolerance {tolerance}): {chosen['params']}")
+
+    # benchmark_candidate has already reset the classifier to single-threaded prediction
+    pipeline = fitted[candidates.index(chosen)]
 
     # Save trained model
     joblib.dump(pipeline, MODEL_PATH)
@@ -55,7 +149,42 @@ def train_and_save_model():
     # Save label encoder
     joblib.dump(le, ENCODER_PATH)
     print(f"Label encoder saved to: {ENCODER_PATH}")
+
+    # Save the benchmark report alongside the model
+    report = {
+        "selection": {"strategy": select, "tolerance": tolerance, "latency_mode": latency_mode},
+        "selected": chosen,
+        "candidates": candidates,
+    }
+    with open(REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Training report saved to: {REPORT_PATH}")
     print("Model training complete.")
+    return report
 
 if __name__ == "__main__":
-    train_and_save_model() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train, benchmark and select the crop recommendation model.")
+    parser.add_argument("--n-estimators", type=parse_int_list, default=[100], help="Comma-separated values, e.g. 25,50,100")
+    parser.add_argument("--max-depth", type=parse_int_list, default=[None], help="Comma-separated values, 'none' for unlimited")
+    parser.add_argument("--min-samples-leaf", type=parse_int_list, default=[1], help="Comma-separated values")
+    parser.add_argument("--cv", type=int, default=5, help="Number of cross-validation folds")
+    parser.add_argument("--select", choices=["accuracy", "smallest", "fastest"], default="accuracy",
+                        help="Pick the most accurate model, or the smallest/fastest within --tolerance of it")
+    parser.add_argument("--tolerance", type=float, default=0.005, help="Allowed drop in CV accuracy for smallest/fastest")
+    parser.add_argument("--latency-mode", choices=["compiled", "sklearn"], default="compiled",
+                        help="Inference path used for --select fastest (match CROP_INFERENCE_MODE)")
+    parser.add_argument("--latency-repeats", type=int, default=200, help="Timed calls per single-row measurement")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Parallel jobs for fitting (-1 uses every core)")
+    args = parser.parse_args()
+
+    train_and_save_model(
+        n_estimators=args.n_estimators,
+        max_depth=args.max_depth,
+        min_samples_leaf=args.min_samples_leaf,
+        cv=args.cv,
+        select=args.select,
+        tolerance=args.tolerance,
+        latency_mode=args.latency_mode,
+        latency_repeats=args.latency_repeats,
+        n_jobs=args.n_jobs,
+    )
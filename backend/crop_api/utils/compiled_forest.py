@@ -0,0 +1,140 @@
+"""
+Compiled flat-array evaluator for the crop recommendation pipeline.
+
+The trained artifact is a Pipeline(StandardScaler, RandomForestClassifier). At load time the
+scaler statistics and every tree are copied into contiguous NumPy arrays so that a prediction
+is a vectorized walk over node indices instead of a trip through sklearn's input validation
+and per-estimator dispatch.
+"""
+
+import numpy as np
+
+
+class CompiledForest:
+    """
+    Drop-in replacement for the sklearn pipeline's predict / predict_proba on dense float input.
+    """
+
+    def __init__(self, pipeline):
+        scaler = pipeline.named_steps["scaler"]
+        forest = pipeline.named_steps["classifier"]
+
+        n_features = forest.n_features_in_
+        self.mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+        self.scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+        self.classes_ = forest.classes_
+        self.n_trees = len(forest.estimators_)
+
+        features, thresholds, lefts, rights, leaf_values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+
+            # Children are stored as global node indices; leaves point at themselves so the
+            # traversal loop can keep stepping without branching on finished rows.
+            own_index = np.arange(tree.node_count) + offset
+            lefts.append(np.where(is_leaf, own_index, tree.children_left + offset))
+            rights.append(np.where(is_leaf, own_index, tree.children_right + offset))
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+
+            # Normalize leaf class counts per tree exactly like DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            leaf_values.append(value / normalizer)
+
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        self.feature = np.ascontiguousarray(np.concatenate(features), dtype=np.intp)
+        self.threshold = np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64)
+        self.children_left = np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp)
+        self.children_right = np.ascontiguousarray(np.concatenate(rights), dtype=np.intp)
+        self.leaf_value = np.ascontiguousarray(np.concatenate(leaf_values), dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = max_depth
+
+    def _scale(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        # Reject what sklearn's check_array rejects, so both backends fail on the same rows
+        if not np.isfinite(X).all():
+            kind = "NaN" if np.isnan(X).any() else "infinity or a value too large for dtype('float64')"
+            raise ValueError(f"Input X contains {kind}.")
+        # sklearn trees compare float32 features against float64 thresholds
+        return ((X - self.mean) / self.scale).astype(np.float32)
+
+    def apply(self, X):
+        """
+        Return the global leaf index reached by every (row, tree) pair, shape (n_rows, n_trees).
+        """
+        X = self._scale(X)
+        n_rows = X.shape[0]
+        nodes = np.repeat(self.roots[np.newaxis, :], n_rows, axis=0)
+        rows = np.arange(n_rows)[:, np.newaxis]
+
+        for _ in range(self.max_depth):
+            values = X[rows, self.feature[nodes]]
+            go_left = values <= self.threshold[nodes]
+            nodes = np.where(go_left, self.children_left[nodes], self.children_right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        return self.leaf_value[leaves].sum(axis=1) / self.n_trees
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def verify_parity(pipeline, compiled, X):
+    """
+    Compare the compiled evaluator against the joblib pipeline on the same rows.
+    Returns (label_mismatches, max_probability_difference).
+    """
+    expected_proba = pipeline.predict_proba(X)
+    actual_proba = compiled.predict_proba(X)
+    mismatches = int(np.sum(pipeline.predict(X) != compiled.predict(X)))
+    return mismatches, float(np.max(np.abs(expected_proba - actual_proba)))
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import time
+    import joblib
+
+    default_model = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "crop_model.pkl")
+
+    parser = argparse.ArgumentParser(description="Check the compiled crop forest against the sklearn pipeline.")
+    parser.add_argument("--model", default=default_model)
+    parser.add_argument("--rows", type=int, default=5000, help="Number of random soil samples to compare")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    pipeline = joblib.load(args.model)
+    compiled = CompiledForest(pipeline)
+
+    # Sample uniformly over a range slightly wider than the training data
+    scaler = pipeline.named_steps["scaler"]
+    spread = 3.0 * scaler.scale_
+    rng = np.random.default_rng(args.seed)
+    X = rng.uniform(scaler.mean_ - spread, scaler.mean_ + spread, size=(args.rows, len(scaler.mean_)))
+
+    mismatches, max_diff = verify_parity(pipeline, compiled, X)
+    print(f"Rows compared: {args.rows}, label mismatches: {mismatches}, max probability difference: {max_diff:.2e}")
+
+    row = X[:1]
+    for name, predictor in (("sklearn pipeline", pipeline), ("compiled forest", compiled)):
+        start = time.perf_counter()
+        for _ in range(200):
+            predictor.predict_proba(row)
+        print(f"{name}: {(time.perf_counter() - start) / 200 * 1000:.3f} ms per single-row call")
+
+    if mismatches:
+        raise SystemExit(1)
@@ -1,12 +1,48 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional
-import re
+from collections import Counter
+import asyncio
+import os
 
-from ..utils.crop_rotation_gemini import generate_rotation_advice
+from common.circuit_breaker import CircuitBreaker
+from common.sse import format_sse
+from common.structured_output import OUTPUT_MODE
+from ..utils.crop_rotation_gemini import generate_rotation_advice, stream_rotation_advice
+from ..utils.rotation_parser import PARSE_FAILURES, RotationAdviceStreamParser, parse_rotation_advice
+from ..utils.rotation_rules import recommend_rotation
+from ..utils.rotation_cache import (
+    DEFAULT_BANDS, RotationAdviceCache, cache_key, normalize_rotation_input, parse_bands
+)
 
 router = APIRouter()
 
+# Parsed advice keyed by the normalized request; ROTATION_CACHE_BANDS sets the width of the
+# bands soil readings are bucketed into (e.g. "nitrogen=10,phosphorus=5,potassium=10,soil_ph=0.5")
+CACHE_BANDS = parse_bands(os.getenv("ROTATION_CACHE_BANDS", DEFAULT_BANDS))
+advice_cache = RotationAdviceCache(
+    max_entries=int(os.getenv("ROTATION_CACHE_MAX_ENTRIES", "5000")),
+    ttl=float(os.getenv("ROTATION_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+)
+
+ADVICE_SECTIONS = ("nextCrop", "justification", "advantages", "rotationPlan")
+
+# Gemini gets this long (for the stream endpoint: until its first chunk) before the request is
+# answered by the local rule-based engine instead; 0 waits indefinitely
+LLM_BUDGET_SECONDS = float(os.getenv("ROTATION_LLM_BUDGET_SECONDS", "8"))
+# Consecutive Gemini failures or budget misses that open the breaker, and how long it stays open
+rotation_breaker = CircuitBreaker(
+    "rotation_llm",
+    failure_threshold=int(os.getenv("ROTATION_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("ROTATION_BREAKER_RESET_SECONDS", "30")),
+)
+local_answers = Counter()
+late_answers = Counter()
+# Background work kept referenced until done: cache writes, and Gemini calls that outlived
+# their budget (they finish in the background and fill the cache)
+background_tasks = set()
+
 class RotationInput(BaseModel):
     currentCrop: str
     previousCrops: List[str]
@@ -22,109 +58,238 @@ class RotationInput(BaseModel):
     pestDiseaseHistory: List[str]
     targetGoal: str
 
-def parse_gemini_response(response_text: str):
+def build_rotation_request(data: RotationInput):
+    """
+    Returns (normalized input, cache key, prompt data) for a rotation request.
+    """
+    input_data = {
+        'current_crop': data.currentCrop,
+        'previous_crops': data.previousCrops,
+        'soil_type': data.soilType,
+        'nitrogen': data.nitrogen,
+        'phosphorus': data.phosphorus,
+        'potassium': data.potassium,
+        'soil_ph': data.soilpH,
+        'climate_zone': data.climateZone,
+        'season': data.season,
+        'water_availability': data.waterAvailability,
+        'irrigation_type': data.irrigationType,
+        'pest_history': data.pestDiseaseHistory,
+        'target_goal': data.targetGoal,
+    }
+    input_data = normalize_rotation_input(input_data, CACHE_BANDS)
+    prompt_data = {**input_data, 'pest_history': ", ".join(input_data['pest_history']) or "None"}
+    return input_data, cache_key(input_data), prompt_data
+
+def generation_failed(advice_text):
+    return "error occurred" in advice_text.lower() or "could not generate" in advice_text.lower()
+
+def cache_advice(key, input_data, structured_response):
+    """
+    Stores an answer that parsed into the structured format. The SQLite write runs on a
+    worker thread in the background, so it never holds up the response.
+    """
+    if structured_response["nextCrop"] in PARSE_FAILURES:
+        return
+
+    async def put():
+        try:
+            await asyncio.to_thread(advice_cache.put, key, input_data, structured_response)
+        except Exception as e:
+            print(f"Rotation cache write failed: {e}")
+
+    task = asyncio.ensure_future(put())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def local_advice(data: RotationInput, reason):
+    """
+    Advice from the rule-based engine, flagged with its source and why Gemini was not used.
+    """
+    local_answers[reason] += 1
+    advice = recommend_rotation({
+        'current_crop': data.currentCrop,
+        'previous_crops': data.previousCrops,
+        'nitrogen': data.nitrogen,
+        'phosphorus': data.phosphorus,
+        'potassium': data.potassium,
+        'soil_ph': data.soilpH,
+        'season': data.season,
+        'water_availability': data.waterAvailability,
+    })
+    return {**advice, "source": "local", "fallbackReason": reason}
+
+def gemini_advice(advice_text, key, input_data):
+    """
+    Structured advice from a Gemini answer, cached and flagged with its source. Raises
+    RuntimeError for a Gemini error message and SchemaError for invalid JSON.
+    """
+    if generation_failed(advice_text):
+        raise RuntimeError(advice_text)
+    structured_response = {**parse_rotation_advice(advice_text, OUTPUT_MODE), "source": "gemini"}
+    cache_advice(key, input_data, structured_response)
+    return structured_response
+
+def cache_late_advice(task, key, input_data):
+    def finished(task):
+        background_tasks.discard(task)
+        if task.cancelled():
+            return
+        try:
+            gemini_advice(task.result(), key, input_data)
+            late_answers["cached"] += 1
+        except Exception as e:
+            late_answers["failed"] += 1
+            print(f"Late Gemini answer discarded: {e}")
+
+    background_tasks.add(task)
+    task.add_done_callback(finished)
+
+async def advice_within_budget(data: RotationInput, input_data, key, prompt_data):
     """
-    Parses the raw text from Gemini into a structured dictionary.
+    Gemini's advice if the breaker lets the call through and it answers within the latency
+    budget, otherwise the local engine's. An answer that misses the budget is still cached
+    when it arrives.
     """
+    if not rotation_breaker.allow():
+        return local_advice(data, "circuit_open")
+
+    task = asyncio.ensure_future(generate_rotation_advice(prompt_data))
+    try:
+        done, _ = await asyncio.wait({task}, timeout=LLM_BUDGET_SECONDS or None)
+    except asyncio.CancelledError:
+        # The request was cancelled: no outcome for the breaker, but keep the answer
+        rotation_breaker.release()
+        cache_late_advice(task, key, input_data)
+        raise
+    if not done:
+        rotation_breaker.record_failure()
+        cache_late_advice(task, key, input_data)
+        return local_advice(data, "latency_budget")
+
     try:
-        response = {
-            "nextCrop": "Not specified",
-            "justification": "No justification provided.",
-            "advantages": [],
-            "rotationPlan": []
-        }
-
-        # Extract next crop
-        next_crop_match = re.search(r'\*\*NEXT CROP:\*\*\s*(.*?)(?=\n\*\*|$)', response_text, re.IGNORECASE | re.DOTALL)
-        if next_crop_match:
-            response["nextCrop"] = next_crop_match.group(1).strip()
-
-        # Extract justification
-        justification_match = re.search(r'\*\*JUSTIFICATION:\*\*\s*(.*?)(?=\n\*\*|$)', response_text, re.IGNORECASE | re.DOTALL)
-        if justification_match:
-            response["justification"] = justification_match.group(1).strip()
-
-        # Extract advantages
-        advantages_match = re.search(r'\*\*ADVANTAGES:\*\*\s*\n(.*?)(?=\n\*\*|$)', response_text, re.IGNORECASE | re.DOTALL)
-        if advantages_match:
-            advantages_text = advantages_match.group(1).strip()
-            advantages_list = re.findall(r'\d+\.\s*(.*?)(?=\n\d+\.|\n*$)', advantages_text, re.DOTALL)
-            if advantages_list:
-                # Clean up formatting by removing ** markers and extra whitespace
-                cleaned_advantages = []
-                for adv in advantages_list:
-                    cleaned_adv = adv.strip()
-                    # Remove ** markers
-                    cleaned_adv = re.sub(r'\*\*', '', cleaned_adv)
-                    # Remove extra whitespace and newlines
-                    cleaned_adv = re.sub(r'\s+', ' ', cleaned_adv).strip()
-                    if cleaned_adv:
-                        cleaned_advantages.append(cleaned_adv)
-                response["advantages"] = cleaned_advantages
-
-        # Extract rotation plan
-        rotation_match = re.search(r'\*\*ROTATION PLAN:\*\*\s*\n(.*?)(?=\n\*\*|$)', response_text, re.IGNORECASE | re.DOTALL)
-        if rotation_match:
-            rotation_text = rotation_match.group(1).strip()
-            rotation_list = re.findall(r'\d+\.\s*(.*?)(?=\n\d+\.|\n*$)', rotation_text, re.DOTALL)
-            if rotation_list:
-                # Clean up formatting for rotation plan
-                cleaned_rotation = []
-                for plan in rotation_list:
-                    cleaned_plan = plan.strip()
-                    # Remove ** markers
-                    cleaned_plan = re.sub(r'\*\*', '', cleaned_plan)
-                    # Remove extra whitespace and newlines
-                    cleaned_plan = re.sub(r'\s+', ' ', cleaned_plan).strip()
-                    if cleaned_plan:
-                        cleaned_rotation.append(cleaned_plan)
-                response["rotationPlan"] = cleaned_rotation
-
-        # Fallback if parsing failed
-        if response["nextCrop"] == "Not specified":
-            print(f"Could not parse response. Full Gemini Response:\n{response_text}")
-            response["justification"] = "Could not automatically parse the AI's response. The full response has been logged for review."
-            response["nextCrop"] = "See Full Response"
-            response["advantages"] = [response_text]
-
-        return response
+        structured_response = gemini_advice(task.result(), key, input_data)
     except Exception as e:
-        print(f"Error during response parsing: {e}")
-        return {
-            "nextCrop": "Parsing Error",
-            "justification": f"An error occurred while parsing the AI's advice: {str(e)}",
-            "advantages": [],
-            "rotationPlan": []
-        }
+        print(f"Gemini Error: {e}")
+        rotation_breaker.record_failure()
+        return local_advice(data, "llm_error")
+    rotation_breaker.record_success()
+    return structured_response
 
+async def cached_advice(key):
+    cached = await asyncio.to_thread(advice_cache.get, key)
+    if cached is not None:
+        # Entries cached before answers were flagged all came from Gemini
+        cached.setdefault("source", "gemini")
+    return cached
 
 @router.post("/generate-advice")
 async def get_rotation_advice(data: RotationInput):
+    """
+    Crop rotation advice from Gemini, or from the local rule-based engine when Gemini misses
+    the latency budget, fails, or the circuit breaker is open. "source" is "gemini" or "local";
+    local answers also carry "fallbackReason".
+    """
     try:
-        input_data = {
-            'current_crop': data.currentCrop,
-            'previous_crops': data.previousCrops,
-            'soil_type': data.soilType,
-            'nitrogen': data.nitrogen,
-            'phosphorus': data.phosphorus,
-            'potassium': data.potassium,
-            'soil_ph': data.soilpH,
-            'climate_zone': data.climateZone,
-            'season': data.season,
-            'water_availability': data.waterAvailability,
-            'irrigation_type': data.irrigationType,
-            'pest_history': ", ".join(data.pestDiseaseHistory) if data.pestDiseaseHistory else "None",
-            'target_goal': data.targetGoal,
-        }
-        
-        advice_text = generate_rotation_advice(input_data)
-        
-        if "error occurred" in advice_text.lower() or "could not generate" in advice_text.lower():
-            raise HTTPException(status_code=500, detail=advice_text)
-
-        structured_response = parse_gemini_response(advice_text)
-        
-        return structured_response
+        input_data, key, prompt_data = build_rotation_request(data)
+
+        cached = await cached_advice(key)
+        if cached is not None:
+            return cached
+
+        return await advice_within_budget(data, input_data, key, prompt_data)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/generate-advice/stream")
+async def stream_rotation_advice_events(data: RotationInput):
+    """
+    Server-Sent Events variant of /generate-advice. Gemini's text is forwarded as "chunk" events
+    while each section (nextCrop, justification, advantages, rotationPlan) is sent as its own
+    event as soon as its block is complete; "done" carries the full structured response.
+
+    Partial JSON cannot be split into sections, so in JSON output mode the whole answer is
+    awaited and the section events follow each other immediately, without "chunk" events.
+    Local answers (breaker open, or no first chunk within the latency budget) are sent the
+    same way.
+    """
+    input_data, key, prompt_data = build_rotation_request(data)
+    cached = await cached_advice(key)
+
+    async def events():
+        structured_response = cached
+        if structured_response is None and OUTPUT_MODE == "json":
+            structured_response = await advice_within_budget(data, input_data, key, prompt_data)
+        elif structured_response is None and not rotation_breaker.allow():
+            structured_response = local_advice(data, "circuit_open")
+
+        if structured_response is not None:
+            for section in ADVICE_SECTIONS:
+                yield format_sse(section, {section: structured_response[section]})
+            yield format_sse("done", structured_response)
+            return
+
+        # The breaker let this call through; if the client disconnects (the generator is
+        # cancelled or closed) before an outcome is recorded, the call is released in finally
+        outcome_pending = True
+        stream = stream_rotation_advice(prompt_data)
+        try:
+            try:
+                first_text = await asyncio.wait_for(anext(stream), LLM_BUDGET_SECONDS or None)
+            except Exception as e:
+                print(f"Gemini Error: {e!r}")
+                outcome_pending = False
+                rotation_breaker.record_failure()
+                structured_response = local_advice(data, "latency_budget" if isinstance(e, asyncio.TimeoutError) else "llm_error")
+                for section in ADVICE_SECTIONS:
+                    yield format_sse(section, {section: structured_response[section]})
+                yield format_sse("done", structured_response)
+                return
+
+            parser = RotationAdviceStreamParser()
+            try:
+                text = first_text
+                while True:
+                    yield format_sse("chunk", {"text": text})
+                    for section, value in parser.feed(text).items():
+                        yield format_sse(section, {section: value})
+                    try:
+                        text = await anext(stream)
+                    except StopAsyncIteration:
+                        break
+                for section, value in parser.close().items():
+                    yield format_sse(section, {section: value})
+            except Exception as e:
+                print(f"Gemini Error: {e}")
+                outcome_pending = False
+                rotation_breaker.record_failure()
+                yield format_sse("error", {"detail": "An error occurred while generating the crop rotation advice."})
+                return
+
+            outcome_pending = False
+            rotation_breaker.record_success()
+            structured_response = {**parse_rotation_advice(parser.text, "text"), "source": "gemini"}
+            cache_advice(key, input_data, structured_response)
+            yield format_sse("done", structured_response)
+        finally:
+            if outcome_pending:
+                rotation_breaker.release()
+            # Ends the upstream call (and frees its slot) when the client disconnects mid-stream
+            await stream.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.get("/cache-stats")
+def cache_stats():
+    return advice_cache.stats()
+
+@router.get("/fallback-stats")
+def fallback_stats():
+    """Circuit breaker state and how often the local engine answered, by reason."""
+    return {
+        "latency_budget_seconds": LLM_BUDGET_SECONDS,
+        "breaker": rotation_breaker.stats(),
+        "local_answers": dict(local_answers),
+        "late_gemini_answers": dict(late_answers),
+    }
@@ -1,23 +1,10 @@
-import os
-from dotenv import load_dotenv
-import google.generativeai as genai
+from contextlib import aclosing
+from common.llm_client import llm_client
+from common.structured_output import OUTPUT_MODE, json_generation_config
+from .rotation_parser import RotationAdvice
 
-# Load environment variable
-dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '..', '.env')
-load_dotenv(dotenv_path=dotenv_path)
-
-# Configure Gemini API
-genai.configure(api_key=os.getenv("VITE_GEMINI_API_KEY"))
-
-def generate_rotation_advice(data: dict) -> str:
-    """
-    Generates AI-based crop rotation advice using Gemini API
-    """
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        prompt = f"""
-You're an expert agricultural advisor. Based on the following field and crop parameters, generate an AI-assisted crop rotation plan.
+def rotation_input_details(data: dict) -> str:
+    return f"""You're an expert agricultural advisor. Based on the following field and crop parameters, generate an AI-assisted crop rotation plan.
 
 **Input Details:**
 - Current Crop: {data.get('current_crop')}
@@ -32,7 +19,14 @@ You're an expert agricultural advisor. Based on the following field and crop par
 - Water Availability: {data.get('water_availability')}
 - Irrigation Type: {data.get('irrigation_type')}
 - Pest/Disease History: {data.get('pest_history') or 'None'}
-- Target Goal: {data.get('target_goal')}
+- Target Goal: {data.get('target_goal')}"""
+
+def build_rotation_prompt(data: dict) -> str:
+    """
+    Prompt for the structured crop rotation plan.
+    """
+    return f"""
+{rotation_input_details(data)}
 
 **Please provide your response in the following structured format:**
 
@@ -56,9 +50,42 @@ You're an expert agricultural advisor. Based on the following field and crop par
 Keep the response educational, clear, and easy for farmers to understand. Focus on practical, actionable advice.
         """
 
-        response = model.generate_content(prompt)
-        return response.text if hasattr(response, 'text') else "Could not generate a crop rotation plan."
+def build_rotation_json_prompt(data: dict) -> str:
+    """
+    Prompt for JSON mode; the response schema carries the output format.
+    """
+    return f"""
+{rotation_input_details(data)}
+
+Answer with the recommended next crop, a justification considering soil health, nutrient balance and pest control, four advantages, and a rotation plan with one recommendation for each of the next three seasons.
+
+Keep the answer educational, clear, and easy for farmers to understand. Focus on practical, actionable advice.
+        """
+
+async def generate_rotation_advice(data: dict, mode: str = OUTPUT_MODE) -> str:
+    """
+    Generates AI-based crop rotation advice using Gemini API, as markdown sections or, in
+    "json" mode, as JSON matching RotationAdvice.
+    """
+    try:
+        if mode == "json":
+            text = await llm_client.generate(
+                build_rotation_json_prompt(data), name="rotation_advice_json",
+                generation_config=json_generation_config(RotationAdvice),
+            )
+        else:
+            text = await llm_client.generate(build_rotation_prompt(data), name="rotation_advice")
+        return text or "Could not generate a crop rotation plan."
     
     except Exception as e:
         print(f"Gemini Error: {e}")
         return "An error occurred while generating the crop rotation advice."
+
+async def stream_rotation_advice(data: dict):
+    """
+    Async generator yielding the rotation advice text as Gemini produces it. Errors propagate to
+    the caller, which has already sent part of the response.
+    """
+    async with aclosing(llm_client.stream(build_rotation_prompt(data), name="rotation_advice_stream")) as stream:
+        async for text in stream:
+            yield text
@@ -0,0 +1,181 @@
+# Crop Rotation Advice Cache
+
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_PATH = os.getenv("ROTATION_CACHE_PATH", os.path.join(BASE_DIR, "data", "rotation_cache.sqlite3"))
+
+# Width of the agronomic band each numeric field is bucketed into; 0 keeps the exact value
+DEFAULT_BANDS = "nitrogen=10,phosphorus=5,potassium=10,soil_ph=0.5"
+
+
+def parse_bands(spec):
+    """
+    Parse a band spec such as "nitrogen=10,soil_ph=0.5" into {"nitrogen": 10.0, "soil_ph": 0.5}.
+    """
+    bands = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, width = item.split("=", 1)
+            bands[name.strip()] = float(width)
+    return bands
+
+
+def _band(value, width):
+    if not width:
+        return value
+    low = math.floor(value / width) * width
+    decimals = max(0, -math.floor(math.log10(width))) if width < 1 else 0
+    return f"{round(low, decimals):g}-{round(low + width, decimals):g}"
+
+
+def normalize_rotation_input(input_data, bands):
+    """
+    Canonical form of a rotation request: strings case-folded and trimmed, crop lists sorted and
+    de-duplicated, and soil readings replaced by their band (e.g. nitrogen 43 -> "40-50"). The
+    prompt is built from this form as well, so a cached answer is exactly what Gemini was asked.
+    """
+    normalized = {}
+    for key, value in input_data.items():
+        if isinstance(value, (list, tuple)):
+            normalized[key] = sorted({item.strip().casefold() for item in value if item and item.strip()})
+        elif isinstance(value, str):
+            normalized[key] = " ".join(value.split()).casefold()
+        elif isinstance(value, (int, float)) and key in bands:
+            normalized[key] = _band(float(value), bands[key])
+        else:
+            normalized[key] = value
+    return normalized
+
+
+def cache_key(normalized):
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+class RotationAdviceCache:
+    """
+    SQLite cache of parsed rotation advice keyed by the normalized request, with a TTL and a
+    bound on the number of entries (least recently used entries are evicted first).
+
+    The methods block on SQLite, so async callers run them with asyncio.to_thread. A hit is a
+    single SELECT: last-used times are kept in memory and written back in batches of
+    `touch_batch` on a best-effort basis, and expired or surplus rows are evicted every
+    `evict_every` puts rather than on each one.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=5000, ttl=7 * 24 * 3600, touch_batch=64, evict_every=100):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.touch_batch = touch_batch
+        self.evict_every = evict_every
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS advice ("
+                " key TEXT PRIMARY KEY, request TEXT NOT NULL, response TEXT NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS advice_accessed ON advice (accessed_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute("SELECT response, created_at FROM advice WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                # Left for the next eviction pass
+                self.expired += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = now
+            flush = len(self._touched) >= self.touch_batch
+        if flush:
+            self.flush_touches()
+        return json.loads(row[0])
+
+    def flush_touches(self):
+        """Write the buffered last-used times; skipped (and dropped) if the database is busy."""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return
+        try:
+            with sqlite3.connect(self.path, timeout=0.1) as connection:
+                connection.executemany(
+                    "UPDATE advice SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+                    [(accessed_at, key) for key, accessed_at in touched.items()],
+                )
+        except sqlite3.OperationalError as e:
+            print(f"Rotation cache: skipped {len(touched)} last-used updates: {e}")
+
+    def put(self, key, normalized, response):
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO advice (key, request, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(normalized, sort_keys=True), json.dumps(response), now, now),
+            )
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % self.evict_every == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Delete expired entries, then the least recently used ones beyond max_entries."""
+        self.flush_touches()
+        with self._connect() as connection:
+            removed = 0
+            if self.ttl:
+                removed += connection.execute(
+                    "DELETE FROM advice WHERE created_at < ?", (time.time() - self.ttl,)
+                ).rowcount
+            overflow = connection.execute("SELECT COUNT(*) FROM advice").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                removed += connection.execute(
+                    "DELETE FROM advice WHERE key IN (SELECT key FROM advice ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                ).rowcount
+        with self._lock:
+            self.evictions += removed
+
+    def clear(self):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM advice")
+
+    def stats(self):
+        with self._connect() as connection:
+            entries = connection.execute("SELECT COUNT(*) FROM advice").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
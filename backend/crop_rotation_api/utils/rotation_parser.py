@@ -0,0 +1,119 @@
+# Crop Rotation Response Parsing
+
+import time
+from typing import List
+
+from pydantic import BaseModel, Field
+
+from common.sections import SectionTokenizer
+from common.structured_output import SchemaError, parse_stats, validate_json
+
+ROTATION_HEADERS = {
+    "NEXT CROP": "nextCrop",
+    "JUSTIFICATION": "justification",
+    "ADVANTAGES": "advantages",
+    "ROTATION PLAN": "rotationPlan",
+    "ADDITIONAL NOTES": "additionalNotes",
+}
+
+# nextCrop values of a text answer that could not be parsed
+PARSE_FAILURES = ("See Full Response", "Parsing Error")
+
+class RotationAdvice(BaseModel):
+    """
+    Response shape of /generate-advice, also sent to Gemini as the JSON-mode response schema.
+    """
+    nextCrop: str = Field(description="The specific crop recommended for the next season")
+    justification: str = Field(description="Why this crop is the best choice for soil health, nutrient balance and pest control")
+    advantages: List[str] = Field(description="Four advantages of choosing this crop")
+    rotationPlan: List[str] = Field(description="One recommendation per season for the next three seasons")
+
+def new_rotation_tokenizer():
+    # A section ends at the next line starting with "**", header or not
+    return SectionTokenizer(ROTATION_HEADERS, stop_at_bold_lines=True)
+
+def rotation_fields(sections):
+    """
+    Maps tokenized sections to response fields, skipping sections that are missing or empty lists.
+    """
+    fields = {}
+    for section in sections:
+        if section.key in ("nextCrop", "justification"):
+            fields[section.key] = section.text
+        elif section.key in ("advantages", "rotationPlan"):
+            items = section.numbered_items()
+            if items:
+                fields[section.key] = items
+    return fields
+
+def extract_rotation_sections(response_text: str):
+    """
+    Returns the sections found in the Gemini text, without defaults or fallbacks.
+    """
+    return rotation_fields(new_rotation_tokenizer().tokenize(response_text).values())
+
+def parse_gemini_response(response_text: str):
+    """
+    Parses the raw text from Gemini into a structured dictionary.
+    """
+    try:
+        response = {
+            "nextCrop": "Not specified",
+            "justification": "No justification provided.",
+            "advantages": [],
+            "rotationPlan": []
+        }
+        response.update(extract_rotation_sections(response_text))
+
+        # Fallback if parsing failed
+        if response["nextCrop"] == "Not specified":
+            print(f"Could not parse response. Full Gemini Response:\n{response_text}")
+            response["justification"] = "Could not automatically parse the AI's response. The full response has been logged for review."
+            response["nextCrop"] = "See Full Response"
+            response["advantages"] = [response_text]
+
+        return response
+    except Exception as e:
+        print(f"Error during response parsing: {e}")
+        return {
+            "nextCrop": "Parsing Error",
+            "justification": f"An error occurred while parsing the AI's advice: {str(e)}",
+            "advantages": [],
+            "rotationPlan": []
+        }
+
+class RotationAdviceStreamParser:
+    """
+    Incremental version of parse_gemini_response: feed() Gemini text as it streams in and get
+    back the fields whose section has been closed by the next "**HEADER:**" line.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.tokenizer = new_rotation_tokenizer()
+
+    def feed(self, chunk: str):
+        self.text += chunk
+        closed, _ = self.tokenizer.feed(chunk)
+        return rotation_fields(closed)
+
+    def close(self):
+        closed, _ = self.tokenizer.close()
+        return rotation_fields(closed)
+
+def parse_rotation_advice(response_text: str, mode: str):
+    """
+    Turns a Gemini answer in either output mode into the response dictionary, counting parse
+    latency and failures per mode. Raises SchemaError when a JSON answer does not validate.
+    """
+    started = time.perf_counter()
+    if mode == "json":
+        try:
+            advice = validate_json(RotationAdvice, response_text).model_dump()
+        except SchemaError:
+            parse_stats.record("rotation", mode, started, ok=False)
+            raise
+    else:
+        advice = parse_gemini_response(response_text)
+    parse_stats.record("rotation", mode, started, ok=advice["nextCrop"] not in PARSE_FAILURES)
+    return advice
@@ -0,0 +1,223 @@
+# Rule-Based Crop Rotation Recommender
+
+import functools
+import re
+
+# Agronomic profile per crop: botanical family, growing seasons, N/P/K demand and water need
+# (1 = low, 2 = medium, 3 = high), suitable soil pH range, and whether it fixes nitrogen
+CROPS = {
+    "Rice": {"family": "Poaceae", "seasons": ("kharif",), "npk": (3, 2, 2), "water": 3, "ph": (5.0, 7.5)},
+    "Wheat": {"family": "Poaceae", "seasons": ("rabi",), "npk": (3, 2, 2), "water": 2, "ph": (6.0, 7.5)},
+    "Maize": {"family": "Poaceae", "seasons": ("kharif", "rabi"), "npk": (3, 2, 2), "water": 2, "ph": (5.5, 7.5)},
+    "Barley": {"family": "Poaceae", "seasons": ("rabi",), "npk": (2, 1, 1), "water": 1, "ph": (6.0, 8.5)},
+    "Sorghum": {"family": "Poaceae", "seasons": ("kharif", "rabi"), "npk": (2, 1, 1), "water": 1, "ph": (5.5, 8.5)},
+    "Pearl Millet": {"family": "Poaceae", "seasons": ("kharif", "zaid"), "npk": (1, 1, 1), "water": 1, "ph": (6.0, 8.5)},
+    "Chickpea": {"family": "Fabaceae", "seasons": ("rabi",), "npk": (1, 2, 1), "water": 1, "ph": (6.0, 8.0), "fixes_nitrogen": True},
+    "Lentil": {"family": "Fabaceae", "seasons": ("rabi",), "npk": (1, 2, 1), "water": 1, "ph": (6.0, 8.0), "fixes_nitrogen": True},
+    "Green Gram": {"family": "Fabaceae", "seasons": ("kharif", "zaid"), "npk": (1, 2, 1), "water": 1, "ph": (6.2, 7.5), "fixes_nitrogen": True},
+    "Black Gram": {"family": "Fabaceae", "seasons": ("kharif", "zaid"), "npk": (1, 2, 1), "water": 1, "ph": (6.0, 7.5), "fixes_nitrogen": True},
+    "Pigeon Pea": {"family": "Fabaceae", "seasons": ("kharif",), "npk": (1, 2, 1), "water": 1, "ph": (6.0, 7.5), "fixes_nitrogen": True},
+    "Soybean": {"family": "Fabaceae", "seasons": ("kharif",), "npk": (1, 2, 2), "water": 2, "ph": (6.0, 7.5), "fixes_nitrogen": True},
+    "Groundnut": {"family": "Fabaceae", "seasons": ("kharif", "zaid"), "npk": (1, 2, 2), "water": 2, "ph": (6.0, 7.5), "fixes_nitrogen": True},
+    "Cowpea": {"family": "Fabaceae", "seasons": ("kharif", "zaid"), "npk": (1, 1, 1), "water": 1, "ph": (5.5, 7.5), "fixes_nitrogen": True},
+    "Mustard": {"family": "Brassicaceae", "seasons": ("rabi",), "npk": (2, 2, 1), "water": 1, "ph": (6.0, 8.0)},
+    "Cotton": {"family": "Malvaceae", "seasons": ("kharif",), "npk": (3, 2, 2), "water": 2, "ph": (5.8, 8.0)},
+    "Potato": {"family": "Solanaceae", "seasons": ("rabi",), "npk": (3, 3, 3), "water": 2, "ph": (5.0, 6.5)},
+    "Tomato": {"family": "Solanaceae", "seasons": ("rabi", "zaid"), "npk": (2, 2, 3), "water": 2, "ph": (6.0, 7.0)},
+    "Onion": {"family": "Amaryllidaceae", "seasons": ("rabi",), "npk": (2, 2, 2), "water": 2, "ph": (6.0, 7.5)},
+    "Sunflower": {"family": "Asteraceae", "seasons": ("rabi", "zaid"), "npk": (2, 2, 2), "water": 1, "ph": (6.0, 7.5)},
+}
+
+CROP_ALIASES = {
+    "paddy": "Rice", "corn": "Maize", "jowar": "Sorghum", "bajra": "Pearl Millet", "millet": "Pearl Millet",
+    "gram": "Chickpea", "bengal gram": "Chickpea", "chana": "Chickpea", "masoor": "Lentil",
+    "moong": "Green Gram", "mung": "Green Gram", "mung bean": "Green Gram", "greengram": "Green Gram",
+    "urad": "Black Gram", "blackgram": "Black Gram", "arhar": "Pigeon Pea", "tur": "Pigeon Pea",
+    "red gram": "Pigeon Pea", "soya": "Soybean", "soyabean": "Soybean", "peanut": "Groundnut",
+    "lobia": "Cowpea", "rapeseed": "Mustard", "sarson": "Mustard",
+}
+
+SEASON_ALIASES = {
+    "kharif": "kharif", "monsoon": "kharif", "rainy": "kharif",
+    "rabi": "rabi", "winter": "rabi",
+    "zaid": "zaid", "summer": "zaid", "spring": "zaid",
+}
+SEASON_CYCLE = ("kharif", "rabi", "zaid")
+
+WATER_LEVELS = {
+    "low": 1, "scarce": 1, "limited": 1, "rainfed": 1,
+    "medium": 2, "moderate": 2, "adequate": 2,
+    "high": 3, "abundant": 3, "plenty": 3, "assured": 3,
+}
+
+# Soil test cut-offs (mg/kg) between low, medium and high supply of N, P and K
+NUTRIENT_BANDS = ((50, 100), (25, 50), (40, 80))
+NUTRIENT_NAMES = ("nitrogen", "phosphorus", "potassium")
+
+_CROP_NAMES = {name.casefold(): name for name in CROPS}
+_CROP_NAMES.update(CROP_ALIASES)
+# Longest names first so "bengal gram" wins over "gram"
+_CROP_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(name) for name in sorted(_CROP_NAMES, key=len, reverse=True)) + r")\b"
+)
+_WORD = re.compile(r"[a-z]+")
+
+
+def crop_name(text):
+    """Canonical crop name for free text such as "Paddy" or "Green gram (Moong)", or None."""
+    match = _CROP_PATTERN.search((text or "").casefold())
+    return _CROP_NAMES[match.group(1)] if match else None
+
+
+def _lookup_word(text, table, default=None):
+    for word in _WORD.findall((text or "").casefold()):
+        if word in table:
+            return table[word]
+    return default
+
+
+def _level(value, bands):
+    low, high = bands
+    return 1 if value < low else 2 if value < high else 3
+
+
+def _next_season(season):
+    return SEASON_CYCLE[(SEASON_CYCLE.index(season) + 1) % len(SEASON_CYCLE)]
+
+
+def _score(name, current, history, soil, water, ph):
+    """
+    Returns (score, advantages, cautions) for growing `name` after `current` (a canonical name
+    or None) with `history` as earlier crops, most recent first.
+    """
+    crop = CROPS[name]
+    score = 0.0
+    advantages, cautions = [], []
+
+    current_family = CROPS[current]["family"] if current else None
+    if current_family and crop["family"] == current_family:
+        score -= 3
+        cautions.append(f"{name} is in the same family as {current}, so shared pests and diseases can carry over.")
+    elif current_family:
+        score += 1
+        advantages.append(f"Breaks the pest and disease cycle of {current} ({crop['family']} after {current_family})")
+    repeats = sum(1 for earlier in history if earlier and CROPS[earlier]["family"] == crop["family"])
+    score -= min(repeats, 2)
+
+    if crop.get("fixes_nitrogen"):
+        legume_bonus = 2 if not (current and CROPS[current].get("fixes_nitrogen")) else 0
+        if soil[0] == 1:
+            legume_bonus += 1
+        score += legume_bonus
+        if legume_bonus:
+            advantages.append("Fixes atmospheric nitrogen, rebuilding soil N for the following crop")
+
+    shortfalls = [
+        nutrient for nutrient, demand, supply in zip(NUTRIENT_NAMES, crop["npk"], soil) if demand > supply
+    ]
+    score -= sum(max(0, demand - supply) for demand, supply in zip(crop["npk"], soil))
+    if shortfalls:
+        cautions.append(f"Soil {', '.join(shortfalls)} is below what {name} needs; supplement it before sowing.")
+    else:
+        advantages.append("Current soil N-P-K levels meet its nutrient demand")
+
+    if crop["water"] > water:
+        score -= 2 * (crop["water"] - water)
+        cautions.append(f"{name} needs more water than is available; plan supplementary irrigation.")
+    else:
+        advantages.append("Fits the available water")
+
+    low, high = crop["ph"]
+    if ph is not None and not low <= ph <= high:
+        score -= 2
+        cautions.append(f"Soil pH {ph:g} is outside the {low:g}-{high:g} range {name} prefers.")
+    elif ph is not None:
+        advantages.append(f"Suited to soil pH {ph:g}")
+
+    return score, advantages, cautions
+
+
+@functools.lru_cache(maxsize=4096)
+def rank_next_crops(current, history, soil, water, ph, season):
+    """
+    Candidates for the next season, best first, as (score, name, advantages, cautions). A crop
+    never follows itself, and when the season is known only crops grown in it are considered.
+
+    Every argument is a small discrete value (history and soil as tuples), so rankings are
+    memoized and repeated field profiles are answered from the cache.
+    """
+    ranked = []
+    for name, crop in CROPS.items():
+        if name == current or (season and season not in crop["seasons"]):
+            continue
+        score, advantages, cautions = _score(name, current, history, soil, water, ph)
+        ranked.append((score, name, advantages, cautions))
+    # Ties are broken by name so the answer is deterministic
+    ranked.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+    return ranked
+
+
+def recommend_rotation(input_data):
+    """
+    Deterministic rotation advice in the /generate-advice response shape, ranked from the
+    current and previous crops, soil N-P-K and pH, season and water availability.
+
+    input_data uses the keys of the rotation prompt data (current_crop, previous_crops,
+    nitrogen, phosphorus, potassium, soil_ph, season, water_availability). When the season is
+    one the current crop grows in, it is taken as the current season and the advice is for the
+    next one; otherwise it is taken as the season being planned.
+    """
+    current = crop_name(input_data.get("current_crop"))
+    history = tuple(crop_name(crop) for crop in input_data.get("previous_crops") or [])
+    soil = tuple(
+        _level(float(input_data.get(nutrient) or 0), bands) for nutrient, bands in zip(NUTRIENT_NAMES, NUTRIENT_BANDS)
+    )
+    water = _lookup_word(input_data.get("water_availability"), WATER_LEVELS, 2)
+    ph = input_data.get("soil_ph")
+    ph = float(ph) if ph is not None else None
+
+    season = _lookup_word(input_data.get("season"), SEASON_ALIASES)
+    if season and current and season in CROPS[current]["seasons"]:
+        season = _next_season(season)
+
+    ranked = rank_next_crops(current, history, soil, water, ph, season)
+    if not ranked:
+        ranked = rank_next_crops(current, history, soil, water, ph, None)
+    _, next_crop, advantages, cautions = ranked[0]
+
+    # Plan three seasons greedily, updating the history and the nitrogen left behind
+    plan = []
+    previous, earlier, plan_soil, plan_season = current, history, soil, season
+    crop = next_crop
+    while True:
+        plan.append(f"{plan_season.capitalize()}: {crop}" if plan_season else crop)
+        if len(plan) == 3:
+            break
+        nitrogen = plan_soil[0]
+        if CROPS[crop].get("fixes_nitrogen"):
+            nitrogen = min(3, nitrogen + 1)
+        elif CROPS[crop]["npk"][0] == 3:
+            nitrogen = max(1, nitrogen - 1)
+        plan_soil = (nitrogen,) + plan_soil[1:]
+        previous, earlier = crop, (previous,) + earlier
+        plan_season = _next_season(plan_season) if plan_season else None
+        candidates = rank_next_crops(previous, earlier, plan_soil, water, ph, plan_season)
+        crop = candidates[0][1] if candidates else next_crop
+
+    season_text = f" for the {season} season" if season else ""
+    after = f" after {current}" if current else ""
+    justification = (
+        f"{next_crop} ranks highest{after}{season_text} among {len(ranked)} candidate crops, "
+        f"based on crop family, nutrient demand, water need and soil pH."
+    )
+    if advantages:
+        justification += f" {advantages[0]}."
+    if cautions:
+        justification += " " + " ".join(cautions)
+
+    return {
+        "nextCrop": next_crop,
+        "justification": justification,
+        "advantages": advantages[:4],
+        "rotationPlan": plan,
+    }
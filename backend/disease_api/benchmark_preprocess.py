@@ -0,0 +1,96 @@
+"""
+Benchmark disease image preprocessing: full-resolution decode vs. reduce-on-decode.
+
+Each path runs in a fresh process so its peak RSS is not polluted by the other one. Usage,
+from backend/:
+
+    python -m disease_api.benchmark_preprocess --megapixels 12 --repeats 10
+    python -m disease_api.benchmark_preprocess --image leaf.jpg
+"""
+
+import argparse
+import io
+import multiprocessing
+import resource
+import sys
+import time
+import numpy as np
+from PIL import Image
+
+from disease_api.utils.image_preprocessing import ImageBufferPool, preprocess_image
+
+
+def legacy_preprocess(image_bytes):
+    """The original path: decode at native resolution, convert, then resize."""
+    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    img = img.resize((224, 224))
+    return np.expand_dims(np.array(img), axis=0)
+
+
+def peak_rss_mb():
+    # VmHWM is per address space; ru_maxrss on Linux survives exec and would report the parent's peak
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_path(name, image_bytes, repeats, results):
+    before = peak_rss_mb()
+    if name == "legacy":
+        preprocess = legacy_preprocess
+    else:
+        buffer = ImageBufferPool().acquire()
+        preprocess = lambda data: preprocess_image(data, buffer)
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        preprocess(image_bytes)
+        timings.append((time.perf_counter() - start) * 1000)
+    results[name] = {"median_ms": float(np.median(timings)), "peak_rss_increase_mb": peak_rss_mb() - before}
+
+
+def synthetic_jpeg(megapixels):
+    # Smooth gradients plus noise compress like a real photo rather than pure noise
+    height = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    width = int(height * 4 / 3)
+    y, x = np.mgrid[0:height, 0:width]
+    rng = np.random.default_rng(0)
+    pixels = np.stack([(x * 255 // width), (y * 255 // height), ((x + y) * 255 // (width + height))], axis=-1)
+    pixels = np.clip(pixels + rng.integers(-20, 20, size=pixels.shape), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare disease image preprocessing paths.")
+    parser.add_argument("--image", help="JPEG to decode (defaults to a synthetic photo)")
+    parser.add_argument("--megapixels", type=float, default=12.0, help="Size of the synthetic photo")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    image_bytes = open(args.image, "rb").read() if args.image else synthetic_jpeg(args.megapixels)
+    width, height = Image.open(io.BytesIO(image_bytes)).size
+    print(f"Image: {width}x{height}, {len(image_bytes) / 1e6:.1f} MB")
+
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        results = manager.dict()
+        for name in ("legacy", "reduce-on-decode"):
+            process = context.Process(target=run_path, args=(name, image_bytes, args.repeats, results))
+            process.start()
+            process.join()
+
+        for name in ("legacy", "reduce-on-decode"):
+            result = results[name]
+            print(f"{name:>17}: {result['median_ms']:8.1f} ms median, peak RSS +{result['peak_rss_increase_mb']:.1f} MB")
+
+    legacy, reduced = legacy_preprocess(image_bytes), preprocess_image(image_bytes)
+    print(f"Mean absolute pixel difference between paths: {np.mean(np.abs(legacy.astype(int) - reduced.astype(int))):.2f}")
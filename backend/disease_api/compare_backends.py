@@ -0,0 +1,160 @@
+"""
+Accuracy / latency / memory comparison of the Keras disease model against TFLite conversions.
+
+Each backend runs in a fresh process so its memory numbers are not polluted by the others.
+Usage, from backend/:
+
+    python -m disease_api.compare_backends --tflite disease_api/model/crop_disease_model.float16.tflite
+    python -m disease_api.compare_backends --tflite a.tflite --tflite b.tflite --images path/to/val --threads 2
+
+With --images, subdirectories named after the raw class names (as in class_names.pkl) are used
+as labels for accuracy; otherwise only agreement with the Keras predictions is reported.
+Synthetic images are used when --images is omitted (latency and memory only are meaningful).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import joblib
+import numpy as np
+
+from disease_api.utils.image_preprocessing import preprocess_image
+
+# TensorFlow is only imported inside the Keras run, so the TFLite numbers exclude it
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "model", "crop_disease_model.h5")
+CLASS_NAMES_PATH = os.path.join(BASE_DIR, "model", "class_names.pkl")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def memory_mb(field):
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def load_images(directory, limit):
+    if directory is None:
+        rng = np.random.default_rng(0)
+        return rng.integers(0, 256, size=(limit, 224, 224, 3), dtype=np.uint8), None
+
+    class_names = list(joblib.load(CLASS_NAMES_PATH))
+    images, labels = [], []
+    for root, _, names in sorted(os.walk(directory)):
+        label = os.path.basename(root)
+        for name in sorted(names):
+            if name.lower().endswith(IMAGE_EXTENSIONS) and len(images) < limit:
+                with open(os.path.join(root, name), "rb") as image_file:
+                    images.append(preprocess_image(image_file.read())[0])
+                labels.append(class_names.index(label) if label in class_names else -1)
+    if not images:
+        raise SystemExit(f"No images found in {directory}")
+    return np.stack(images), np.array(labels)
+
+
+def run_backend(backend, model_path, threads, images, batch_size, repeats, results):
+    before = memory_mb("VmRSS")
+    start = time.perf_counter()
+    if backend == "keras":
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        model = tf.keras.models.load_model(model_path)
+    else:
+        from disease_api.utils.tflite_model import TFLiteModel
+        model = TFLiteModel(model_path, num_threads=threads)
+    load_seconds = time.perf_counter() - start
+    loaded = memory_mb("VmRSS")
+
+    # Warm-up also triggers lazy graph tracing / tensor allocation
+    model.predict(images[:1], verbose=0)
+
+    single = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        model.predict(images[i % len(images):i % len(images) + 1], verbose=0)
+        single.append((time.perf_counter() - start) * 1000)
+
+    batched = []
+    probabilities = []
+    for offset in range(0, len(images), batch_size):
+        start = time.perf_counter()
+        probabilities.append(model.predict(images[offset:offset + batch_size], verbose=0))
+        batched.append((time.perf_counter() - start) * 1000 / len(images[offset:offset + batch_size]))
+
+    results[f"{backend}:{model_path}"] = {
+        "backend": backend,
+        "model_path": model_path,
+        "model_size_mb": os.path.getsize(model_path) / 1e6,
+        "load_seconds": load_seconds,
+        "rss_after_load_mb": loaded - before,
+        "peak_rss_mb": memory_mb("VmHWM"),
+        "single_median_ms": float(np.median(single)),
+        "single_p95_ms": float(np.percentile(single, 95)),
+        "batched_ms_per_image": float(np.median(batched)),
+        "probabilities": np.concatenate(probabilities).tolist(),
+    }
+
+
+def summarize(result, reference, labels):
+    probabilities = np.array(result.pop("probabilities"))
+    predicted = probabilities.argmax(axis=1)
+    result["top1_agreement_with_keras"] = float(np.mean(predicted == reference.argmax(axis=1)))
+    result["max_abs_probability_diff"] = float(np.max(np.abs(probabilities - reference)))
+    if labels is not None and np.any(labels >= 0):
+        known = labels >= 0
+        result["accuracy"] = float(np.mean(predicted[known] == labels[known]))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Keras and TFLite disease backends.")
+    parser.add_argument("--keras-model", default=MODEL_PATH)
+    parser.add_argument("--tflite", action="append", required=True, help="TFLite model(s) to compare")
+    parser.add_argument("--images", help="Validation images, optionally in per-class subdirectories")
+    parser.add_argument("--limit", type=int, default=256, help="Maximum number of images")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=50, help="Single-image latency samples")
+    parser.add_argument("--report", help="Write the comparison as JSON to this path")
+    args = parser.parse_args()
+
+    images, labels = load_images(args.images, args.limit)
+    print(f"Comparing on {len(images)} images with {args.threads} thread(s)")
+
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        results = manager.dict()
+        runs = [("keras", args.keras_model)] + [("tflite", path) for path in args.tflite]
+        for backend, path in runs:
+            process = context.Process(
+                target=run_backend,
+                args=(backend, path, args.threads, images, args.batch_size, args.repeats, results),
+            )
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                raise SystemExit(f"{backend} run failed for {path}")
+        results = dict(results)
+
+    reference = np.array(results[f"keras:{args.keras_model}"]["probabilities"])
+    report = [summarize(results[f"{backend}:{path}"], reference, labels) for backend, path in runs]
+
+    header = f"{'model':<40} {'size MB':>8} {'RSS MB':>7} {'1-img ms':>9} {'p95 ms':>7} {'batch ms/img':>13} {'agree':>6} {'acc':>6}"
+    print(header)
+    print("-" * len(header))
+    for row in report:
+        accuracy = f"{row['accuracy']:.3f}" if "accuracy" in row else "-"
+        print(
+            f"{os.path.basename(row['model_path']):<40} {row['model_size_mb']:>8.2f} {row['rss_after_load_mb']:>7.1f} "
+            f"{row['single_median_ms']:>9.2f} {row['single_p95_ms']:>7.2f} {row['batched_ms_per_image']:>13.2f} "
+            f"{row['top1_agreement_with_keras']:>6.3f} {accuracy:>6}"
+        )
+
+    if args.report:
+        with open(args.report, "w") as report_file:
+            json.dump({"images": len(images), "threads": args.threads, "results": report}, report_file, indent=2)
+        print(f"Report written to {args.report}")
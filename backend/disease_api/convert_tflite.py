@@ -0,0 +1,88 @@
+"""
+Convert the disease Keras model to a quantized TFLite model for the "tflite" backend.
+
+Run from backend/ after retraining:
+
+    python -m disease_api.convert_tflite --quantization float16
+    python -m disease_api.convert_tflite --quantization int8 --calibration-dir path/to/leaf/images
+
+int8 uses full-integer quantization calibrated on a sample of real images (a few hundred is
+enough); without --calibration-dir it falls back to dynamic-range quantization, which still
+stores int8 weights but keeps float activations. Conversion is deterministic for a fixed model,
+calibration set and --seed.
+
+The API serves model/crop_disease_model.int8.tflite if it exists, else the float16 model;
+DISEASE_TFLITE_MODEL overrides the choice.
+"""
+
+import argparse
+import os
+import random
+import numpy as np
+import tensorflow as tf
+
+from disease_api.utils.image_preprocessing import preprocess_image
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "model", "crop_disease_model.h5")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def calibration_images(directory, limit, seed):
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    random.Random(seed).shuffle(paths)
+    return paths[:limit]
+
+
+def convert(model_path, quantization, calibration_dir=None, calibration_size=200, seed=0):
+    model = tf.keras.models.load_model(model_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8" and calibration_dir:
+        paths = calibration_images(calibration_dir, calibration_size, seed)
+        if not paths:
+            raise SystemExit(f"No calibration images found in {calibration_dir}")
+        print(f"Calibrating on {len(paths)} images")
+
+        def representative_dataset():
+            for path in paths:
+                with open(path, "rb") as image_file:
+                    yield [preprocess_image(image_file.read()).astype(np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        # Same uint8 pixels as the Keras path, so the route needs no extra conversion
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.float32
+    elif quantization == "int8":
+        print("No --calibration-dir given; using dynamic-range int8 quantization")
+
+    return converter.convert()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the disease model to a quantized TFLite model.")
+    parser.add_argument("--model", default=MODEL_PATH, help="Keras .h5 model to convert")
+    parser.add_argument("--quantization", choices=["float16", "int8"], default="float16")
+    parser.add_argument("--calibration-dir", help="Directory of sample leaf images for int8 calibration")
+    parser.add_argument("--calibration-size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0, help="Seed for sampling calibration images")
+    parser.add_argument("--output", help="Defaults to model/crop_disease_model.<quantization>.tflite")
+    args = parser.parse_args()
+
+    tf.random.set_seed(args.seed)
+    output = args.output or os.path.join(BASE_DIR, "model", f"crop_disease_model.{args.quantization}.tflite")
+    tflite_model = convert(args.model, args.quantization, args.calibration_dir, args.calibration_size, args.seed)
+    with open(output, "wb") as output_file:
+        output_file.write(tflite_model)
+
+    print(f"Wrote {output}: {len(tflite_model) / 1e6:.2f} MB (Keras model: {os.path.getsize(args.model) / 1e6:.2f} MB)")
+    print("Compare against Keras with: python -m disease_api.compare_backends --tflite " + output)
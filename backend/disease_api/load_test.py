@@ -0,0 +1,104 @@
+"""
+Load test: does disease inference stall the rest of the unified API?
+
+Measures the latency of a cheap probe endpoint on its own, then again while several clients keep
+uploading images to /api/disease/predict_disease. If the disease route blocks the event loop,
+probe latency during load jumps to the duration of a whole disease request.
+
+Run against a live server (needs httpx, see requirements-dev.txt):
+
+    uvicorn main:app --port 8000
+    python -m disease_api.load_test --base-url http://localhost:8000 --image leaf.jpg
+"""
+
+import argparse
+import asyncio
+import io
+import time
+import numpy as np
+
+
+def synthetic_image(width=3000, height=4000):
+    """JPEG bytes of a phone-camera-sized random image."""
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def summarize(latencies):
+    if not latencies:
+        return "no samples"
+    values = np.array(latencies) * 1000
+    return (f"n={len(values)} p50={np.percentile(values, 50):.1f} ms "
+            f"p95={np.percentile(values, 95):.1f} ms max={values.max():.1f} ms")
+
+
+async def probe(client, path, duration, interval):
+    latencies = []
+    stop_at = time.perf_counter() + duration
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def upload_loop(client, image, stop_event, latencies, errors, max_backoff=2.0):
+    failures = 0
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        try:
+            response = await client.post("/api/disease/predict_disease", files={"file": ("leaf.jpg", image, "image/jpeg")})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+            failures = 0
+        except Exception as e:
+            errors.append(str(e))
+            # Back off so a down or rejecting server isn't hammered in a tight loop
+            failures += 1
+            await asyncio.sleep(min(max_backoff, 0.05 * 2 ** failures))
+
+
+async def run(args):
+    import httpx
+
+    image = open(args.image, "rb").read() if args.image else synthetic_image()
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120) as client:
+        print(f"Baseline: probing {args.probe_path} for {args.duration}s...")
+        baseline = await probe(client, args.probe_path, args.duration, args.probe_interval)
+
+        print(f"Under load: {args.concurrency} concurrent disease uploads ({len(image) / 1e6:.1f} MB each)...")
+        stop_event = asyncio.Event()
+        disease_latencies, errors = [], []
+        uploaders = [
+            asyncio.create_task(upload_loop(client, image, stop_event, disease_latencies, errors))
+            for _ in range(args.concurrency)
+        ]
+        # Give the uploads a head start so the probe window is fully under load
+        await asyncio.sleep(1.0)
+        loaded = await probe(client, args.probe_path, args.duration, args.probe_interval)
+        stop_event.set()
+        await asyncio.gather(*uploaders)
+
+    print(f"Probe latency, idle:       {summarize(baseline)}")
+    print(f"Probe latency, under load: {summarize(loaded)}")
+    print(f"Disease requests:          {summarize(disease_latencies)}, errors={len(errors)}")
+    if errors:
+        print(f"First error: {errors[0]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that disease inference does not block other endpoints.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--image", help="Image to upload (defaults to a synthetic 12 MP JPEG)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent disease upload clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per probe phase")
+    parser.add_argument("--probe-path", default="/", help="Cheap endpoint whose latency is measured")
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    asyncio.run(run(parser.parse_args()))
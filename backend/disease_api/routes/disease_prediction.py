@@ -1,13 +1,28 @@
 # Disease Prediction Routes 
-from fastapi import APIRouter, File, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
 import numpy as np
-from tensorflow.keras.models import load_model
-from PIL import Image
+from PIL import UnidentifiedImageError
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from typing import List
+import asyncio
 import io
-import joblib
 import os
-from ..utils.gemini_tips import get_disease_prevention_tips
+import zipfile
+from common.batching import MicroBatcher
+from common.model_store import PerProcessModel, load_artifact
+from common.sse import format_sse
+from common.structured_output import OUTPUT_MODE
+from ..utils.gemini_tips import stream_disease_prevention_tips
+from ..utils.disease_names import format_disease_name
+from ..utils.tips_store import PREVENTION_KIND, TipsStore, unavailable_message
+from ..utils.tips_parser import DiseaseTipsParser, structure_tips
+from ..utils.result_cache import DiseaseResultCache
+from ..utils.tflite_model import TFLiteModel
+from ..utils.image_preprocessing import (
+    MAX_UPLOAD_BYTES, ImageBufferPool, ImageTooLargeError, preprocess_image
+)
 
 router = APIRouter()
 
@@ -15,126 +30,375 @@ router = APIRouter()
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 MODEL_PATH = os.path.join(BASE_DIR, "disease_api", "model", "crop_disease_model.h5")
 CLASS_NAMES_PATH = os.path.join(BASE_DIR, "disease_api", "model", "class_names.pkl")
+# Models written by `python -m disease_api.convert_tflite`; the first one that exists is served
+TFLITE_CANDIDATE_PATHS = [
+    os.path.join(BASE_DIR, "disease_api", "model", f"crop_disease_model.{quantization}.tflite")
+    for quantization in ("int8", "float16")
+]
+TFLITE_MODEL_PATH = os.getenv("DISEASE_TFLITE_MODEL") or next(
+    (path for path in TFLITE_CANDIDATE_PATHS if os.path.exists(path)), TFLITE_CANDIDATE_PATHS[-1]
+)
 
-# Load model and class names once
-model = load_model(MODEL_PATH)
-class_names = joblib.load(CLASS_NAMES_PATH)
+# "tflite" runs a quantized conversion (build it with `python -m disease_api.convert_tflite`);
+# "keras" runs the full-precision .h5 model
+INFERENCE_BACKEND = os.getenv("DISEASE_BACKEND", "tflite" if os.path.exists(TFLITE_MODEL_PATH) else "keras")
 
-def preprocess_image(image_bytes):
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    img = img.resize((224, 224))
-    img_array = np.array(img) 
-    return np.expand_dims(img_array, axis=0)
+def load_disease_model():
+    if INFERENCE_BACKEND == "tflite":
+        loaded = TFLiteModel(TFLITE_MODEL_PATH)
+    else:
+        from tensorflow.keras.models import load_model
+        loaded = load_model(MODEL_PATH)
+    print(f"Disease model loaded with the {INFERENCE_BACKEND} backend in process {os.getpid()}.")
+    return loaded
+
+# The model is loaded by each worker on its first prediction (TensorFlow must not be
+# initialized before gunicorn forks); the class names are memory-mapped and shared
+model = PerProcessModel(load_disease_model)
+class_names = load_artifact(CLASS_NAMES_PATH)
+
+# Image decoding and model.predict run on this bounded pool so they never block the event loop
+# shared by every route of the unified app
+inference_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DISEASE_WORKER_THREADS", str(min(4, os.cpu_count() or 1)))),
+    thread_name_prefix="disease-inference",
+)
+
+# Concurrent uploads are stacked into one model.predict call
+dispatcher = MicroBatcher(
+    lambda images: model.predict(images, verbose=0),
+    max_batch_size=int(os.getenv("DISEASE_BATCH_MAX_SIZE", "16")),
+    max_wait_ms=float(os.getenv("DISEASE_BATCH_MAX_WAIT_MS", "5")),
+    name="disease",
+    executor=inference_pool,
+)
+
+# Preallocated model-input buffers, reused across requests
+image_buffers = ImageBufferPool()
 
-def format_disease_name(disease_name):
+# Full responses for re-uploaded images, keyed by a hash of the normalized 224x224 input.
+# DISEASE_CACHE_NEAR_DUPLICATES=1 also matches near-identical photos by perceptual hash.
+result_cache = DiseaseResultCache(
+    maxsize=int(os.getenv("DISEASE_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("DISEASE_CACHE_TTL_SECONDS", "86400")),
+    near_duplicates=os.getenv("DISEASE_CACHE_NEAR_DUPLICATES", "0") == "1",
+    max_distance=int(os.getenv("DISEASE_CACHE_MAX_DISTANCE", "4")),
+)
+
+# Upper bound on images per /predict_disease/batch request (files or zip entries)
+MAX_BATCH_IMAGES = int(os.getenv("DISEASE_MAX_BATCH_IMAGES", "64"))
+# Upper bound on the size of a zip uploaded to /predict_disease/batch
+MAX_ZIP_BYTES = int(os.getenv("DISEASE_MAX_ZIP_BYTES", str(200 * 1024 * 1024)))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+# Prevention tips per disease class, persisted across restarts (warm with disease_api/warm_tips.py)
+tips_store = TipsStore()
+
+async def classify_upload(file):
     """
-    Format disease name for better display
+    Read, preprocess and classify an upload.
+
+    Returns (cache_keys, cached_response, classification). cached_response is the full stored
+    response for a previously seen image (classification is then None); otherwise
+    classification holds the CNN result.
     """
-    # Convert underscores to spaces and capitalize properly
-    formatted = disease_name.replace('_', ' ')
-    
-    # Handle common disease name patterns
-    if 'Late Blight' in formatted:
-        return formatted  # Already good
-    elif 'Early Blight' in formatted:
-        return formatted  # Already good
-    elif 'Blight' in formatted:
-        return formatted  # Already good
-    elif 'Rust' in formatted:
-        return formatted  # Already good
-    elif 'Mildew' in formatted:
-        return formatted  # Already good
-    elif 'Spot' in formatted:
-        return formatted  # Already good
-    elif 'Rot' in formatted:
-        return formatted  # Already good
-    else:
-        # For other cases, just capitalize properly
-        return formatted.title()
+    # Reject oversized uploads from the declared size before reading the body
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image is {file.size} bytes; the limit is {MAX_UPLOAD_BYTES} bytes.")
 
-@router.post("/predict_disease")
-async def predict_disease(file: UploadFile = File(...)):
-    print("Request received for disease prediction.")
-    
     image_data = await file.read()
     print("Image data read.")
     
-    processed_img = preprocess_image(image_data)
-    print("Image preprocessed.")
+    loop = asyncio.get_running_loop()
+    buffer = image_buffers.acquire()
+    try:
+        try:
+            processed_img = await loop.run_in_executor(inference_pool, preprocess_image, image_data, buffer)
+        except ImageTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except (UnidentifiedImageError, OSError):
+            # OSError covers truncated or corrupt image data found while decoding
+            raise HTTPException(status_code=400, detail="Uploaded file is not a supported image.")
+        print("Image preprocessed.")
 
-    print("Running model prediction...")
-    prediction = model.predict(processed_img)
+        cache_keys = result_cache.keys_for(processed_img)
+        cached_response = result_cache.lookup(cache_keys)
+        if cached_response is not None:
+            print("Returning cached result for a previously seen image.")
+            return cache_keys, cached_response, None
+
+        print("Running model prediction...")
+        prediction = await dispatcher.submit(processed_img)
+    finally:
+        # The batcher has copied the pixels into its batch once the prediction is back
+        image_buffers.release(buffer)
     predicted_index = np.argmax(prediction)
     raw_disease_name = class_names[predicted_index]
     formatted_disease_name = format_disease_name(raw_disease_name)
     confidence = float(np.max(prediction))
     print(f"Model prediction complete. Disease: {formatted_disease_name}, Confidence: {confidence}")
 
-    print("Getting prevention tips from Gemini...")
-    tips = get_disease_prevention_tips(formatted_disease_name)
-    print("Prevention tips received.")
-
-    # Parse and structure the tips for better frontend display
-    structured_tips = parse_disease_tips(tips, formatted_disease_name)
-
-    response_data = {
+    classification = {
         "predicted_disease": formatted_disease_name,
         "raw_disease_name": raw_disease_name,
         "confidence": round(confidence * 100, 2),
+    }
+    return cache_keys, None, classification
+
+async def prevention_tips(disease_name):
+    """
+    Returns (prevention tips text, structured info) in the configured output mode.
+    """
+    tips = await tips_store.get(PREVENTION_KIND, disease_name)
+    return structure_tips(tips, disease_name, OUTPUT_MODE)
+
+def cache_response(cache_keys, response_data):
+    # Don't pin a Gemini failure message in the cache (a failed stream ends with it)
+    failure = unavailable_message(PREVENTION_KIND, response_data["predicted_disease"])
+    if not response_data["prevention_tips"].endswith(failure):
+        result_cache.store(cache_keys, response_data)
+
+@router.post("/predict_disease")
+async def predict_disease(file: UploadFile = File(...)):
+    print("Request received for disease prediction.")
+
+    cache_keys, cached_response, classification = await classify_upload(file)
+    if cached_response is not None:
+        return JSONResponse(cached_response)
+    formatted_disease_name = classification["predicted_disease"]
+
+    print("Getting prevention tips...")
+    # Tips text plus the structure parsed from it (or validated, in JSON output mode)
+    tips, structured_tips = await prevention_tips(formatted_disease_name)
+    print("Prevention tips received.")
+
+    response_data = {
+        **classification,
         "prevention_tips": tips,
         "structured_info": structured_tips
     }
-    
+    cache_response(cache_keys, response_data)
+
     print("Sending response.")
     return JSONResponse(response_data)
 
-def parse_disease_tips(tips_text, disease_name):
+@router.post("/predict_disease/stream")
+async def predict_disease_stream(file: UploadFile = File(...)):
     """
-    Parse the Gemini response and structure it for better frontend display
+    Server-Sent Events variant of /predict_disease. The classification is sent as soon as the
+    CNN finishes ("prediction" event), followed by the Gemini tips as they stream in ("tips"
+    events with text deltas), the structured info as soon as it can be parsed ("structured"),
+    and the complete response ("done").
+
+    In JSON output mode the tips are generated whole and sent as a single "tips" event.
     """
-    try:
-        # Split the text into sections based on common patterns
-        sections = {
-            "overview": "",
-            "immediate_actions": [],
-            "cultural_practices": [],
-            "chemical_controls": [],
-            "monitoring": [],
-            "resistant_varieties": []
-        }
-        
-        # Extract overview from Gemini response
-        # Look for the first paragraph or section that describes the approach
-        lines = tips_text.split('\n')
-        overview_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            if line and not line.startswith('*') and not line.startswith('1.') and not line.startswith('2.') and not line.startswith('3.') and not line.startswith('4.'):
-                # This is likely the overview/introduction
-                if 'prevention' in line.lower() or 'guide' in line.lower() or 'approach' in line.lower():
-                    overview_lines.append(line)
-                    break
-                elif len(overview_lines) == 0 and len(line) > 50:  # First substantial paragraph
-                    overview_lines.append(line)
-                    break
-        
-        if overview_lines:
-            sections["overview"] = overview_lines[0]
+    print("Request received for streaming disease prediction.")
+    cache_keys, cached_response, classification = await classify_upload(file)
+
+    async def events():
+        if cached_response is not None:
+            yield format_sse("prediction", {key: cached_response[key] for key in ("predicted_disease", "raw_disease_name", "confidence")})
+            yield format_sse("tips", {"text": cached_response["prevention_tips"]})
+            yield format_sse("structured", cached_response["structured_info"])
+            yield format_sse("done", cached_response)
+            return
+
+        yield format_sse("prediction", classification)
+
+        formatted_disease_name = classification["predicted_disease"]
+        if OUTPUT_MODE == "json":
+            tips, structured_tips = await prevention_tips(formatted_disease_name)
+            yield format_sse("tips", {"text": tips})
+            yield format_sse("structured", structured_tips)
+            response_data = {
+                **classification,
+                "prevention_tips": tips,
+                "structured_info": structured_tips
+            }
+            cache_response(cache_keys, response_data)
+            yield format_sse("done", response_data)
+            return
+
+        parser = DiseaseTipsParser(formatted_disease_name)
+        stored_tips = await tips_store.lookup(PREVENTION_KIND, formatted_disease_name)
+        if stored_tips is not None:
+            # Precomputed tips go out as a single chunk
+            tips = stored_tips
+            yield format_sse("tips", {"text": tips})
+            if parser.feed(tips):
+                yield format_sse("structured", parser.result())
         else:
-            # Fallback to a simple overview
-            sections["overview"] = f"{disease_name}: A comprehensive guide for farmers."
-        
-        return sections
-        
-    except Exception as e:
-        print(f"Error parsing tips: {e}")
-        # Return a basic structure if parsing fails
-        return {
-            "overview": f"Prevention tips for {disease_name}",
-            "immediate_actions": [],
-            "cultural_practices": [],
-            "chemical_controls": [],
-            "monitoring": [],
-            "resistant_varieties": []
-        } 
\ No newline at end of file
+            chunks = []
+            try:
+                async with aclosing(stream_disease_prevention_tips(formatted_disease_name)) as stream:
+                    async for text in stream:
+                        chunks.append(text)
+                        yield format_sse("tips", {"text": text})
+                        if parser.feed(text):
+                            yield format_sse("structured", parser.result())
+                tips = "".join(chunks).strip()
+            except Exception as e:
+                print(f"Error streaming tips: {e}")
+                tips = ""
+
+            if tips:
+                await asyncio.to_thread(tips_store.write, PREVENTION_KIND, formatted_disease_name, tips)
+            else:
+                # A failed or empty stream is reported, not stored
+                failure = unavailable_message(PREVENTION_KIND, formatted_disease_name)
+                tips = "".join(chunks) + failure
+                yield format_sse("tips", {"text": failure})
+                parser.feed(failure)
+        if parser.close():
+            yield format_sse("structured", parser.result())
+
+        response_data = {
+            **classification,
+            "prevention_tips": tips,
+            "structured_info": parser.result()
+        }
+        cache_response(cache_keys, response_data)
+        yield format_sse("done", response_data)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+async def read_limited(file, limit):
+    """Read an upload, rejecting it with 413 as soon as it is known to exceed `limit` bytes."""
+    if file.size is not None and file.size > limit:
+        raise HTTPException(status_code=413, detail=f"{file.filename} is {file.size} bytes; the limit is {limit} bytes.")
+    data = await file.read(limit + 1)
+    if len(data) > limit:
+        raise HTTPException(status_code=413, detail=f"{file.filename} is over the {limit} byte limit.")
+    return data
+
+async def read_batch_uploads(files):
+    """
+    Return [(filename, bytes)] for the uploaded images. A single zip upload is expanded into
+    its image entries. Entries over MAX_UPLOAD_BYTES get None instead of their bytes.
+    """
+    if len(files) > MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=413, detail=f"Received {len(files)} images; the limit is {MAX_BATCH_IMAGES}.")
+
+    if len(files) == 1 and files[0].filename.lower().endswith(".zip"):
+        uploads = [(files[0].filename, await read_limited(files[0], MAX_ZIP_BYTES))]
+    else:
+        uploads = [(file.filename, await read_limited(file, MAX_UPLOAD_BYTES)) for file in files]
+
+    if len(uploads) == 1 and zipfile.is_zipfile(io.BytesIO(uploads[0][1])):
+        with zipfile.ZipFile(io.BytesIO(uploads[0][1])) as archive:
+            entries = [
+                info for info in archive.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+                and not os.path.basename(info.filename).startswith(".")
+            ]
+            if len(entries) > MAX_BATCH_IMAGES:
+                raise HTTPException(status_code=413, detail=f"Zip contains {len(entries)} images; the limit is {MAX_BATCH_IMAGES}.")
+            uploads = []
+            for info in entries:
+                # Check the declared size before inflating to avoid zip bombs; zipfile stops
+                # decompressing at the declared size, so a lying header fails the CRC check
+                if info.file_size > MAX_UPLOAD_BYTES:
+                    uploads.append((info.filename, None))
+                    continue
+                try:
+                    uploads.append((info.filename, archive.read(info)))
+                except zipfile.BadZipFile:
+                    raise HTTPException(status_code=400, detail=f"Zip entry {info.filename} is corrupt.")
+                except NotImplementedError:
+                    raise HTTPException(status_code=400, detail=f"Zip entry {info.filename} uses an unsupported compression method.")
+                except RuntimeError:
+                    # zipfile raises RuntimeError for encrypted entries read without a password
+                    raise HTTPException(status_code=400, detail=f"Zip entry {info.filename} is encrypted.")
+    else:
+        # A .zip-named upload that is not an archive is held to the per-image limit
+        uploads = [(name, data if len(data) <= MAX_UPLOAD_BYTES else None) for name, data in uploads]
+
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No images found in the upload.")
+    return uploads
+
+def preprocess_into(image_bytes, out):
+    """Decode one image into its slot of the batch tensor; returns an error message or None."""
+    if image_bytes is None:
+        return f"Image exceeds the {MAX_UPLOAD_BYTES} byte limit."
+    try:
+        preprocess_image(image_bytes, out)
+    except ImageTooLargeError as e:
+        return str(e)
+    except (UnidentifiedImageError, OSError):
+        return "File is not a supported image."
+    return None
+
+@router.post("/predict_disease/batch")
+async def predict_disease_batch(files: List[UploadFile] = File(...)):
+    """
+    Diagnose several images at once, uploaded as multiple files or as a single zip. Images are
+    decoded in parallel into one batch tensor, classified with a single model.predict, and the
+    prevention tips are looked up once per predicted class.
+    """
+    print("Request received for batch disease prediction.")
+    uploads = await read_batch_uploads(files)
+
+    loop = asyncio.get_running_loop()
+    batch = np.empty((len(uploads), *image_buffers.shape[1:]), dtype=np.uint8)
+    errors = await asyncio.gather(*(
+        loop.run_in_executor(inference_pool, preprocess_into, image_bytes, batch[i:i + 1])
+        for i, (_, image_bytes) in enumerate(uploads)
+    ))
+    valid = [i for i, error in enumerate(errors) if error is None]
+    print(f"Preprocessed {len(valid)} of {len(uploads)} images.")
+
+    predictions = {}
+    if valid:
+        print("Running model prediction...")
+        probabilities = await loop.run_in_executor(inference_pool, lambda: model.predict(batch[valid], verbose=0))
+        predictions = dict(zip(valid, probabilities))
+
+    results = []
+    for i, (filename, _) in enumerate(uploads):
+        if i not in predictions:
+            results.append({"filename": filename, "error": errors[i]})
+            continue
+        raw_disease_name = class_names[int(np.argmax(predictions[i]))]
+        results.append({
+            "filename": filename,
+            "predicted_disease": format_disease_name(raw_disease_name),
+            "raw_disease_name": raw_disease_name,
+            "confidence": round(float(np.max(predictions[i])) * 100, 2),
+        })
+
+    # One tips lookup per distinct class rather than per image
+    diseases = sorted({result["predicted_disease"] for result in results if "error" not in result})
+    tips = await asyncio.gather(*(prevention_tips(disease) for disease in diseases))
+
+    summary = []
+    for disease, (disease_tips, structured_tips) in zip(diseases, tips):
+        matches = [result for result in results if result.get("predicted_disease") == disease]
+        confidences = [result["confidence"] for result in matches]
+        summary.append({
+            "predicted_disease": disease,
+            "count": len(matches),
+            "mean_confidence": round(sum(confidences) / len(confidences), 2),
+            "max_confidence": max(confidences),
+            "filenames": [result["filename"] for result in matches],
+            "prevention_tips": disease_tips,
+            "structured_info": structured_tips,
+        })
+    summary.sort(key=lambda entry: entry["count"], reverse=True)
+
+    print("Sending batch response.")
+    return JSONResponse({
+        "total_images": len(uploads),
+        "classified": len(predictions),
+        "failed": len(uploads) - len(predictions),
+        "results": results,
+        "summary": summary,
+    })
+
+@router.get("/dispatcher-stats")
+def dispatcher_stats():
+    return dispatcher.stats()
+
+@router.get("/cache-stats")
+def cache_stats():
+    return {**result_cache.stats(), "tips_store": tips_store.stats()}
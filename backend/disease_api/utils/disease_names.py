@@ -0,0 +1,27 @@
+# Disease Name Utilities
+
+def format_disease_name(disease_name):
+    """
+    Format disease name for better display
+    """
+    # Convert underscores to spaces and capitalize properly
+    formatted = disease_name.replace('_', ' ')
+    
+    # Handle common disease name patterns
+    if 'Late Blight' in formatted:
+        return formatted  # Already good
+    elif 'Early Blight' in formatted:
+        return formatted  # Already good
+    elif 'Blight' in formatted:
+        return formatted  # Already good
+    elif 'Rust' in formatted:
+        return formatted  # Already good
+    elif 'Mildew' in formatted:
+        return formatted  # Already good
+    elif 'Spot' in formatted:
+        return formatted  # Already good
+    elif 'Rot' in formatted:
+        return formatted  # Already good
+    else:
+        # For other cases, just capitalize properly
+        return formatted.title()
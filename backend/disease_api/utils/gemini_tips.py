@@ -1,23 +1,19 @@
 # Gemini Tips Utilities 
 
-import os
-import google.generativeai as genai
-from dotenv import load_dotenv
+from contextlib import aclosing
+from common.llm_client import llm_client
+from common.structured_output import json_generation_config, validate_json
+from .tips_parser import DiseaseTips
 
-# Construct the absolute path to the .env file
-dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '..', '.env')
-load_dotenv(dotenv_path=dotenv_path)
+# Bump whenever a prompt below changes so stored tips (see tips_store.py) are regenerated
+PROMPT_VERSION = "1"
 
-# Set your API key
-genai.configure(api_key=os.getenv("VITE_GEMINI_API_KEY"))
-
-def get_disease_overview(disease_name):
+async def get_disease_overview(disease_name):
     """
     Generates a detailed and structured overview of the disease or a healthy crop status.
+    Returns None when the call fails or Gemini returns no text.
     """
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-
         if disease_name.lower() == "healthy":
             prompt = """
 The uploaded plant image has been identified as **Healthy**.
@@ -54,19 +50,18 @@ Analyze the plant disease **"{disease_name}"** and provide a comprehensive, well
 Be precise, clear, and farmer-friendly in tone.
 """
 
-        response = model.generate_content(prompt)
-        return response.text.strip() if hasattr(response, 'text') else f"Overview not available for {disease_name}."
+        text = await llm_client.generate(prompt, name="disease_overview")
+        return text or None
     except Exception as e:
         print(f"Error generating overview: {e}")
-        return f"Overview unavailable for {disease_name} due to a technical issue."
+        return None
 
-def get_disease_recommendations(disease_name):
+async def get_disease_recommendations(disease_name):
     """
     Provides actionable recommendations depending on whether crop is healthy or infected.
+    Returns None when the call fails or Gemini returns no text.
     """
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-
         if disease_name.lower() == "healthy":
             prompt = """
 Since the crop is classified as **Healthy**, provide preventive strategies and sustainability tips.
@@ -110,22 +105,18 @@ Provide detailed and stage-wise management strategies for the crop disease **"{d
 Write in simple language for rural farmers and agronomists.
 """
 
-        response = model.generate_content(prompt)
-        return response.text.strip() if hasattr(response, 'text') else f"Recommendations not available for {disease_name}."
+        text = await llm_client.generate(prompt, name="disease_recommendations")
+        return text or None
     except Exception as e:
         print(f"Error generating recommendations: {e}")
-        return f"Recommendations unavailable for {disease_name} due to a technical issue."
+        return None
 
-def get_disease_prevention_tips(disease_name):
+def build_prevention_tips_prompt(disease_name):
     """
-    Generates AI-powered tips based on whether the crop is healthy or infected.
-    Distinguishes clearly between healthy crops and actual diseases.
+    Prompt for the farmer-facing prevention guide, distinguishing healthy crops from diseases.
     """
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-
-        if disease_name.lower() == "healthy":
-            prompt = """
+    if disease_name.lower() == "healthy":
+        prompt = """
 The uploaded plant image has been classified as **Healthy**.
 
 You are an expert agronomist assistant helping farmers maintain healthy crops. Provide valuable tips and preventive measures in the following format:
@@ -150,8 +141,8 @@ You are an expert agronomist assistant helping farmers maintain healthy crops. P
 
 Format the response in farmer-friendly language with bullet points. Keep it clear, short, and immediately actionable.
 """
-        else:
-            prompt = f"""
+    else:
+        prompt = f"""
 The uploaded image has been classified as infected with the plant disease: **{disease_name}**.
 
 You are an expert agricultural AI. Provide a structured, useful guide for farmers. Follow this format:
@@ -181,10 +172,78 @@ You are an expert agricultural AI. Provide a structured, useful guide for farmer
 
 The tone should be clear, confident, and actionable for real farmers. Avoid academic jargon. Bullet-point formatting preferred.
 """
+    return prompt
+
+def build_prevention_tips_json_prompt(disease_name):
+    """
+    Prompt for JSON mode; the response schema carries the output format.
+    """
+    if disease_name.lower() == "healthy":
+        return """
+The uploaded plant image has been classified as **Healthy**.
+
+You are an expert agronomist assistant helping farmers maintain healthy crops. Fill in each field:
+- overview: a short note that the crop is healthy and how to keep it that way
+- immediate_actions: general tips for watering, sunlight, ventilation and checking leaves
+- cultural_practices: soil, fertilizer (including NPK ratios) and organic practices
+- chemical_controls: natural barriers, companion plants and safe preventive sprays
+- monitoring: seasonal care and weekly plant health checks
+- resistant_varieties: varieties that resist common local diseases, or an empty list
+
+Use farmer-friendly language. Keep each item short and immediately actionable.
+"""
+    return f"""
+The uploaded image has been classified as infected with the plant disease: **{disease_name}**.
+
+You are an expert agricultural AI. Provide a useful guide for farmers by filling in each field:
+- overview: what {disease_name} is, which crops it affects, its symptoms and common causes
+- immediate_actions: steps to prevent spread now, including isolation, pruning or removal
+- cultural_practices: soil, spacing, rotation and hygiene practices for long-term prevention
+- chemical_controls: chemical and organic treatments with application method and safety warnings
+- monitoring: signs to look for each week and how to track recovery or reinfection
+- resistant_varieties: resistant varieties to plant, or an empty list if none are known
+
+The tone should be clear, confident, and actionable for real farmers. Avoid academic jargon.
+"""
+
+async def get_disease_prevention_tips_async(disease_name):
+    """
+    Generates AI-powered tips based on whether the crop is healthy or infected.
+    Distinguishes clearly between healthy crops and actual diseases.
+    Returns None when the call fails or Gemini returns no text.
+    """
+    try:
+        prompt = build_prevention_tips_prompt(disease_name)
+        text = await llm_client.generate(prompt, name="disease_tips")
+        return text or None
 
-        response = model.generate_content(prompt)
-        return response.text.strip() if hasattr(response, 'text') else f"Tips not available for {disease_name}."
-    
     except Exception as e:
         print(f"Error generating tips: {e}")
-        return f"Unable to generate tips for {disease_name} due to technical issues." 
\ No newline at end of file
+        return None
+
+async def get_disease_prevention_tips_json(disease_name):
+    """
+    Prevention tips as JSON matching DiseaseTips, or None when the call fails or the answer
+    does not validate.
+    """
+    try:
+        text = await llm_client.generate(
+            build_prevention_tips_json_prompt(disease_name), name="disease_tips_json",
+            generation_config=json_generation_config(DiseaseTips),
+        )
+        validate_json(DiseaseTips, text)
+        return text
+
+    except Exception as e:
+        print(f"Error generating tips: {e}")
+        return None
+
+async def stream_disease_prevention_tips(disease_name):
+    """
+    Async generator yielding the prevention tips text chunk by chunk as Gemini produces it.
+    Errors are raised to the caller, which decides what to show and whether to store the text.
+    """
+    prompt = build_prevention_tips_prompt(disease_name)
+    async with aclosing(llm_client.stream(prompt, name="disease_tips_stream")) as stream:
+        async for text in stream:
+            yield text
@@ -0,0 +1,69 @@
+# Image Preprocessing Utilities
+
+import io
+import os
+import queue
+import numpy as np
+from PIL import Image
+
+TARGET_SIZE = (224, 224)
+
+# Uploads above these limits are rejected before any pixel data is decoded
+MAX_UPLOAD_BYTES = int(os.getenv("DISEASE_MAX_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("DISEASE_MAX_IMAGE_PIXELS", str(50_000_000)))
+
+
+class ImageTooLargeError(ValueError):
+    """Raised for uploads whose byte size or pixel count exceeds the configured limits."""
+
+
+class ImageBufferPool:
+    """
+    Reusable (1, 224, 224, 3) uint8 model-input buffers.
+
+    A buffer must not be handed back until the prediction that reads it has finished, since the
+    micro-batcher only copies it when the batch is flushed.
+    """
+
+    def __init__(self, shape=(1, TARGET_SIZE[1], TARGET_SIZE[0], 3)):
+        self.shape = shape
+        self._free = queue.SimpleQueue()
+
+    def acquire(self):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            return np.empty(self.shape, dtype=np.uint8)
+
+    def release(self, buffer):
+        self._free.put(buffer)
+
+
+def open_checked(image_bytes):
+    """
+    Open an upload lazily (only the header is parsed) and enforce the size limits.
+    """
+    if len(image_bytes) > MAX_UPLOAD_BYTES:
+        raise ImageTooLargeError(f"Image is {len(image_bytes)} bytes; the limit is {MAX_UPLOAD_BYTES} bytes.")
+    img = Image.open(io.BytesIO(image_bytes))
+    if img.width * img.height > MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(f"Image is {img.width}x{img.height} pixels; the limit is {MAX_IMAGE_PIXELS} pixels.")
+    return img
+
+
+def preprocess_image(image_bytes, out=None):
+    """
+    Decode an upload into a (1, 224, 224, 3) uint8 model input.
+
+    For JPEGs, draft mode asks libjpeg to DCT-scale by 1/2, 1/4 or 1/8 while decoding, so a 12 MP
+    photo is never materialized at full resolution. `out` is an optional preallocated buffer
+    (see ImageBufferPool) that receives the pixels.
+    """
+    img = open_checked(image_bytes)
+    img.draft("RGB", TARGET_SIZE)
+    img = img.convert("RGB").resize(TARGET_SIZE)
+
+    if out is None:
+        out = np.empty((1, TARGET_SIZE[1], TARGET_SIZE[0], 3), dtype=np.uint8)
+    out[0] = np.asarray(img)
+    return out
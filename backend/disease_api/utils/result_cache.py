@@ -0,0 +1,100 @@
+# Disease Result Cache Utilities
+
+import hashlib
+import threading
+import numpy as np
+from PIL import Image
+
+from common.prediction_cache import LRUCache
+
+
+def content_hash(image):
+    """Exact key: hash of the normalized 224x224 uint8 model input."""
+    return hashlib.blake2b(np.ascontiguousarray(image).tobytes(), digest_size=16).hexdigest()
+
+
+def perceptual_hash(image):
+    """
+    64-bit difference hash (dHash) of the model input. Re-encoded or slightly recropped copies
+    of the same photo land within a few bits of each other.
+    """
+    pixels = np.asarray(image).reshape(image.shape[-3:])
+    gray = Image.fromarray(pixels).convert("L").resize((9, 8), Image.BOX)
+    cells = np.asarray(gray, dtype=np.int16)
+    bits = (cells[:, 1:] > cells[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+class DiseaseResultCache:
+    """
+    Cache of full disease responses (class, confidence and tips) keyed by the image content.
+
+    With near_duplicates enabled, a miss on the exact hash falls back to the cached image whose
+    perceptual hash is within max_distance bits.
+    """
+
+    def __init__(self, maxsize=1024, ttl=86400, near_duplicates=False, max_distance=4):
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.near_duplicates = near_duplicates
+        self.max_distance = max_distance
+        self._phashes = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def keys_for(self, image):
+        """Compute the lookup keys while the image buffer is still valid."""
+        return content_hash(image), perceptual_hash(image) if self.near_duplicates else None
+
+    def lookup(self, keys):
+        exact_key, phash = keys
+        result = self.cache.get(exact_key)
+        if result is not None:
+            self.exact_hits += 1
+            return result
+
+        if phash is not None:
+            with self._lock:
+                candidates = list(self._phashes.items())
+            best_key, best_distance = None, self.max_distance + 1
+            for key, other in candidates:
+                distance = (phash ^ other).bit_count()
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+            if best_key is not None:
+                result = self.cache.get(best_key)
+                if result is not None:
+                    self.near_hits += 1
+                    return result
+                # Expired or evicted from the LRU; drop it from the index as well
+                with self._lock:
+                    self._phashes.pop(best_key, None)
+
+        self.misses += 1
+        return None
+
+    def store(self, keys, result):
+        exact_key, phash = keys
+        self.cache.put(exact_key, result)
+        if phash is not None:
+            with self._lock:
+                self._phashes[exact_key] = phash
+                if len(self._phashes) > 2 * self.cache.maxsize:
+                    # Prune index entries whose results the LRU has already evicted
+                    live = set(self.cache.keys())
+                    self._phashes = {key: value for key, value in self._phashes.items() if key in live}
+
+    def stats(self):
+        lookups = self.exact_hits + self.near_hits + self.misses
+        return {
+            "size": len(self.cache),
+            "maxsize": self.cache.maxsize,
+            "ttl_seconds": self.cache.ttl,
+            "near_duplicates": self.near_duplicates,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.cache.evictions,
+            "hit_rate": round((self.exact_hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+        }
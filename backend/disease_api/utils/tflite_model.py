@@ -0,0 +1,101 @@
+# TFLite Inference Utilities
+
+import os
+import threading
+import numpy as np
+
+
+def _interpreter_class():
+    """
+    Prefer the standalone LiteRT / tflite-runtime interpreters, which avoid importing the full
+    TensorFlow package; fall back to tf.lite.
+    """
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        import tensorflow as tf
+        return tf.lite.Interpreter
+
+
+class TFLiteModel:
+    """
+    Keras-compatible predict() over a (possibly quantized) .tflite model.
+
+    Quantized input and output tensors are (de)quantized here, so callers pass the same uint8
+    (N, 224, 224, 3) batches as to the Keras model and get float probabilities back.
+
+    Batches are zero-padded up to the next power of two (at most max_batch_size; larger batches
+    are split) and each padded size gets its own interpreter, allocated once and then reused, so
+    varying dispatcher batch sizes never resize and reallocate tensors.
+    """
+
+    def __init__(self, model_path, num_threads=None, max_batch_size=None):
+        self.model_path = model_path
+        self.num_threads = num_threads or int(os.getenv("DISEASE_TFLITE_THREADS", str(os.cpu_count() or 1)))
+        # Defaults to the dispatcher's largest batch so a full flush runs in one invocation
+        self.max_batch_size = max_batch_size or int(
+            os.getenv("DISEASE_TFLITE_MAX_BATCH_SIZE", os.getenv("DISEASE_BATCH_MAX_SIZE", "16"))
+        )
+        self._interpreters = {}
+        # The interpreters hold mutable tensor state, so invocations are serialized
+        self._lock = threading.Lock()
+        # Quantization parameters are the same for every batch size
+        _, self.input_detail, self.output_detail = self._interpreter(1)
+
+    def _interpreter(self, batch_size):
+        """
+        The (interpreter, input detail, output detail) allocated for batch_size, created on first use.
+        """
+        entry = self._interpreters.get(batch_size)
+        if entry is None:
+            interpreter = _interpreter_class()(model_path=self.model_path, num_threads=self.num_threads)
+            input_detail = interpreter.get_input_details()[0]
+            if int(input_detail["shape"][0]) != batch_size:
+                interpreter.resize_tensor_input(input_detail["index"], [batch_size, *input_detail["shape"][1:]])
+            interpreter.allocate_tensors()
+            entry = (interpreter, interpreter.get_input_details()[0], interpreter.get_output_details()[0])
+            self._interpreters[batch_size] = entry
+        return entry
+
+    def _padded_size(self, rows):
+        size = 1
+        while size < rows:
+            size *= 2
+        return min(size, self.max_batch_size)
+
+    def _quantize_input(self, images):
+        dtype = self.input_detail["dtype"]
+        scale, zero_point = self.input_detail["quantization"]
+        if np.issubdtype(dtype, np.integer) and scale:
+            info = np.iinfo(dtype)
+            quantized = np.round(images.astype(np.float32) / scale + zero_point)
+            return np.clip(quantized, info.min, info.max).astype(dtype)
+        return images.astype(dtype, copy=False)
+
+    def _dequantize_output(self, output):
+        scale, zero_point = self.output_detail["quantization"]
+        if np.issubdtype(output.dtype, np.integer) and scale:
+            return (output.astype(np.float32) - zero_point) * scale
+        return output
+
+    def predict(self, images, verbose=0):
+        images = np.asarray(images)
+        outputs = []
+        with self._lock:
+            for start in range(0, len(images), self.max_batch_size):
+                chunk = self._quantize_input(images[start:start + self.max_batch_size])
+                rows = len(chunk)
+                size = self._padded_size(rows)
+                interpreter, input_detail, output_detail = self._interpreter(size)
+                if size > rows:
+                    chunk = np.concatenate([chunk, np.zeros((size - rows, *chunk.shape[1:]), dtype=chunk.dtype)])
+                interpreter.set_tensor(input_detail["index"], chunk)
+                interpreter.invoke()
+                outputs.append(interpreter.get_tensor(output_detail["index"])[:rows])
+        return self._dequantize_output(np.concatenate(outputs))
@@ -0,0 +1,145 @@
+# Disease Tips Parsing
+
+import time
+from typing import List
+
+from pydantic import BaseModel, Field
+
+from common.sections import SectionTokenizer
+from common.structured_output import SchemaError, parse_stats, validate_json
+
+class DiseaseTips(BaseModel):
+    """
+    Shape of structured_info, also sent to Gemini as the JSON-mode response schema.
+    """
+    overview: str = Field(description="One or two sentences describing the disease (or the healthy status) and the approach")
+    immediate_actions: List[str] = Field(description="Steps to take right now")
+    cultural_practices: List[str] = Field(description="Field hygiene, spacing, rotation, soil and water practices")
+    chemical_controls: List[str] = Field(description="Chemical or organic treatments with usage and safety tips")
+    monitoring: List[str] = Field(description="What to check each week and how to track recovery")
+    resistant_varieties: List[str] = Field(description="Resistant varieties worth planting, if any")
+
+# Headings used to render JSON-mode tips as text for the prevention_tips field
+TIPS_SECTION_TITLES = {
+    "immediate_actions": "Immediate Actions",
+    "cultural_practices": "Cultural Practices",
+    "chemical_controls": "Treatment Recommendations",
+    "monitoring": "Monitoring & Follow-up",
+    "resistant_varieties": "Resistant Varieties",
+}
+
+def empty_tips(overview):
+    return {
+        "overview": overview,
+        "immediate_actions": [],
+        "cultural_practices": [],
+        "chemical_controls": [],
+        "monitoring": [],
+        "resistant_varieties": []
+    }
+
+class DiseaseTipsParser:
+    """
+    Incremental version of the tips parser: feed() Gemini text as it streams in and the overview
+    is extracted as soon as its line is complete.
+    """
+
+    def __init__(self, disease_name):
+        self.disease_name = disease_name
+        self.tokenizer = SectionTokenizer({})
+        self.sections = empty_tips("")
+
+    def _consider(self, line):
+        line = line.strip()
+        if line and not line.startswith('*') and not line.startswith('1.') and not line.startswith('2.') and not line.startswith('3.') and not line.startswith('4.'):
+            # This is likely the overview/introduction
+            if 'prevention' in line.lower() or 'guide' in line.lower() or 'approach' in line.lower():
+                self.sections["overview"] = line
+            elif len(line) > 50:  # First substantial paragraph
+                self.sections["overview"] = line
+
+    def _consider_lines(self, lines):
+        for _, line in lines:
+            self._consider(line)
+            if self.sections["overview"]:
+                return True
+        return False
+
+    def feed(self, text):
+        """
+        Consume a chunk of text. Returns True when the structured sections changed.
+        """
+        if self.sections["overview"]:
+            return False
+        _, lines = self.tokenizer.feed(text)
+        return self._consider_lines(lines)
+
+    def close(self):
+        """
+        Flush the last partial line and apply the fallback overview. Returns True when the
+        structured sections changed.
+        """
+        if self.sections["overview"]:
+            return False
+        _, lines = self.tokenizer.close()
+        if not self._consider_lines(lines):
+            # Fallback to a simple overview
+            self.sections["overview"] = f"{self.disease_name}: A comprehensive guide for farmers."
+        return True
+
+    def result(self):
+        return self.sections
+
+def render_disease_tips(tips, disease_name):
+    """
+    Markdown text of JSON-mode tips, in the layout of the text-mode answer.
+    """
+    if disease_name.lower() == "healthy":
+        lines = [" **Crop Status: Healthy**", ""]
+    else:
+        lines = [f" **Detected Disease: {disease_name}**", ""]
+    lines += [tips.overview, ""]
+    for field, title in TIPS_SECTION_TITLES.items():
+        items = getattr(tips, field)
+        if items:
+            lines.append(f"**{title}:**")
+            lines += [f"- {item}" for item in items]
+            lines.append("")
+    return "\n".join(lines).strip()
+
+def structure_tips(tips_text, disease_name, mode):
+    """
+    Returns (prevention tips text, structured info) for a Gemini answer in either output mode,
+    counting parse latency and failures per mode. A JSON answer that does not validate is
+    reported like a failed Gemini call.
+    """
+    started = time.perf_counter()
+    if mode == "json":
+        try:
+            tips = validate_json(DiseaseTips, tips_text)
+        except SchemaError as e:
+            print(f"Error validating tips: {e}")
+            parse_stats.record("disease_tips", mode, started, ok=False)
+            return f"Unable to generate tips for {disease_name} due to technical issues.", empty_tips(f"Prevention tips for {disease_name}")
+        parse_stats.record("disease_tips", mode, started, ok=True)
+        return render_disease_tips(tips, disease_name), tips.model_dump()
+
+    structured = parse_disease_tips(tips_text, disease_name)
+    fallback = f"{disease_name}: A comprehensive guide for farmers."
+    parse_stats.record("disease_tips", mode, started, ok=structured["overview"] != fallback)
+    return tips_text, structured
+
+def parse_disease_tips(tips_text, disease_name):
+    """
+    Parse the Gemini response and structure it for better frontend display
+    """
+    try:
+        parser = DiseaseTipsParser(disease_name)
+        parser.feed(tips_text)
+        parser.close()
+        return parser.result()
+        
+    except Exception as e:
+        print(f"Error parsing tips: {e}")
+        # Return a basic structure if parsing fails
+        return empty_tips(f"Prevention tips for {disease_name}")
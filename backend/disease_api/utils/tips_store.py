@@ -0,0 +1,164 @@
+# Persistent Disease Tips Store
+
+import asyncio
+import os
+import sqlite3
+import time
+
+from common.structured_output import OUTPUT_MODE
+from .gemini_tips import (
+    PROMPT_VERSION,
+    get_disease_overview,
+    get_disease_prevention_tips_async,
+    get_disease_prevention_tips_json,
+    get_disease_recommendations,
+)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORE_PATH = os.getenv("DISEASE_TIPS_STORE", os.path.join(BASE_DIR, "data", "tips_store.sqlite3"))
+
+# Entries older than this are still served, but refreshed from Gemini in the background
+MAX_AGE_SECONDS = float(os.getenv("DISEASE_TIPS_MAX_AGE_SECONDS", str(30 * 24 * 3600)))
+
+# Shown instead of the text when a generator returns None (failed call or empty answer);
+# never stored
+UNAVAILABLE_MESSAGES = {
+    "prevention": "Unable to generate tips for {} due to technical issues.",
+    "prevention_json": "Unable to generate tips for {} due to technical issues.",
+    "overview": "Overview unavailable for {} due to a technical issue.",
+    "recommendations": "Recommendations unavailable for {} due to a technical issue.",
+}
+
+
+GENERATORS = {
+    "prevention": get_disease_prevention_tips_async,
+    # JSON-mode answers (LLM_OUTPUT_MODE=json), stored as validated DiseaseTips JSON
+    "prevention_json": get_disease_prevention_tips_json,
+    "overview": get_disease_overview,
+    "recommendations": get_disease_recommendations,
+}
+
+# The prevention tips kind served by the routes in the configured output mode
+PREVENTION_KIND = "prevention_json" if OUTPUT_MODE == "json" else "prevention"
+
+
+def unavailable_message(kind, disease_name):
+    return UNAVAILABLE_MESSAGES[kind].format(disease_name)
+
+
+class TipsStore:
+    """
+    On-disk store of Gemini texts keyed by (kind, disease name, prompt version).
+
+    The disease label set is small and fixed, so once the store is warmed (see
+    disease_api/warm_tips.py) steady-state requests never wait for an LLM call.
+
+    read() and write() block on SQLite; the async methods run them on a worker thread so the
+    event loop is never held up by a busy database.
+    """
+
+    def __init__(self, path=STORE_PATH, max_age=MAX_AGE_SECONDS, prompt_version=PROMPT_VERSION):
+        self.path = path
+        self.max_age = max_age
+        self.prompt_version = prompt_version
+        self._refreshing = set()
+        self._tasks = set()
+        self.hits = 0
+        self.misses = 0
+        self.stale_refreshes = 0
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS tips ("
+                " kind TEXT NOT NULL, disease TEXT NOT NULL, prompt_version TEXT NOT NULL,"
+                " text TEXT NOT NULL, updated_at REAL NOT NULL,"
+                " PRIMARY KEY (kind, disease, prompt_version))"
+            )
+
+    def _connect(self):
+        # A short-lived connection per operation is safe across threads and forked workers
+        return sqlite3.connect(self.path, timeout=10)
+
+    def read(self, kind, disease_name):
+        """Return (text, updated_at) or None."""
+        with self._connect() as connection:
+            return connection.execute(
+                "SELECT text, updated_at FROM tips WHERE kind = ? AND disease = ? AND prompt_version = ?",
+                (kind, disease_name, self.prompt_version),
+            ).fetchone()
+
+    def write(self, kind, disease_name, text):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO tips (kind, disease, prompt_version, text, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, disease_name, self.prompt_version, text, time.time()),
+            )
+
+    async def refresh(self, kind, disease_name):
+        """Generate a fresh text from Gemini and store it. Returns None, storing nothing, on failure."""
+        text = await GENERATORS[kind](disease_name)
+        if text is not None:
+            await asyncio.to_thread(self.write, kind, disease_name, text)
+        return text
+
+    def _schedule_refresh(self, kind, disease_name):
+        key = (kind, disease_name)
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        self.stale_refreshes += 1
+
+        async def run():
+            try:
+                await self.refresh(kind, disease_name)
+            except Exception as e:
+                print(f"Background tips refresh failed for {disease_name}: {e}")
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def lookup(self, kind, disease_name):
+        """
+        Return the stored text or None on a miss. Stale entries are returned immediately and
+        refreshed in the background.
+        """
+        row = await asyncio.to_thread(self.read, kind, disease_name)
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        text, updated_at = row
+        if time.time() - updated_at > self.max_age:
+            self._schedule_refresh(kind, disease_name)
+        return text
+
+    async def get(self, kind, disease_name):
+        """
+        Return the stored text, generating and storing it on a miss. When generation fails the
+        kind's unavailable message is returned instead.
+        """
+        text = await self.lookup(kind, disease_name)
+        if text is None:
+            text = await self.refresh(kind, disease_name)
+        return text if text is not None else unavailable_message(kind, disease_name)
+
+    def stats(self):
+        with self._connect() as connection:
+            entries = connection.execute(
+                "SELECT COUNT(*) FROM tips WHERE prompt_version = ?", (self.prompt_version,)
+            ).fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "prompt_version": self.prompt_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_refreshes": self.stale_refreshes,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,54 @@
+"""
+Warm the disease tips store for every class in class_names.pkl.
+
+Run from backend/ after deploying or after bumping PROMPT_VERSION in utils/gemini_tips.py:
+
+    python -m disease_api.warm_tips
+    python -m disease_api.warm_tips --kinds prevention --force
+"""
+
+import argparse
+import asyncio
+import os
+import joblib
+
+from disease_api.utils.disease_names import format_disease_name
+from disease_api.utils.tips_store import GENERATORS, PREVENTION_KIND, TipsStore
+
+CLASS_NAMES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model", "class_names.pkl")
+
+
+async def warm(kinds, force, concurrency):
+    store = TipsStore()
+    disease_names = sorted({format_disease_name(name) for name in joblib.load(CLASS_NAMES_PATH)})
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"generated": 0, "skipped": 0, "failed": 0}
+
+    async def warm_one(kind, disease_name):
+        if not force and store.read(kind, disease_name) is not None:
+            counts["skipped"] += 1
+            return
+        async with semaphore:
+            text = await store.refresh(kind, disease_name)
+        if text is None:
+            counts["failed"] += 1
+            print(f"  failed: {kind} / {disease_name}")
+        else:
+            counts["generated"] += 1
+            print(f"  stored: {kind} / {disease_name}")
+
+    print(f"Warming {len(kinds)} kind(s) for {len(disease_names)} classes into {store.path}")
+    await asyncio.gather(*(warm_one(kind, name) for kind in kinds for name in disease_names))
+    print(f"Done: {counts['generated']} generated, {counts['skipped']} already stored, {counts['failed']} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute Gemini tips for every disease class.")
+    # By default only the prevention kind of the configured LLM_OUTPUT_MODE is warmed
+    default_kinds = [kind for kind in GENERATORS if kind == PREVENTION_KIND or not kind.startswith("prevention")]
+    parser.add_argument("--kinds", default=",".join(default_kinds), help="Comma-separated: " + ",".join(GENERATORS))
+    parser.add_argument("--force", action="store_true", help="Regenerate entries that already exist")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel Gemini calls")
+    args = parser.parse_args()
+
+    asyncio.run(warm([kind.strip() for kind in args.kinds.split(",")], args.force, args.concurrency))
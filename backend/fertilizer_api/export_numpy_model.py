@@ -0,0 +1,102 @@
+"""
+Export the fertilizer Keras model to a .npz that numpy_model.NumpyDenseModel can run.
+
+Requires TensorFlow; the API itself does not once the export exists. Usage, from backend/:
+
+    python -m fertilizer_api.export_numpy_model
+"""
+
+import argparse
+import os
+import numpy as np
+
+from .numpy_model import NumpyDenseModel, ACTIVATIONS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+KERAS_MODEL_PATH = os.path.join(BASE_DIR, "model", "a1_fertilizer_model.h5")
+NUMPY_MODEL_PATH = os.path.join(BASE_DIR, "model", "a1_fertilizer_model.npz")
+
+# Layers that do nothing at inference time
+PASSTHROUGH_LAYERS = {"InputLayer", "Dropout", "GaussianNoise", "GaussianDropout", "AlphaDropout"}
+
+
+def export_model(keras_model):
+    """
+    Collect the weights and activations of a Sequential Dense/BatchNormalization model into a
+    dict of arrays suitable for np.savez.
+    """
+    arrays = {}
+    layer_types = []
+    activations = []
+
+    for layer in keras_model.layers:
+        kind = type(layer).__name__
+        config = layer.get_config()
+        prefix = f"layer{len(layer_types)}_"
+
+        if kind in PASSTHROUGH_LAYERS:
+            continue
+        if kind == "Activation":
+            # Fold a standalone activation into the previous layer
+            if not layer_types or activations[-1] != "linear":
+                raise ValueError(f"Cannot fold activation layer '{layer.name}'")
+            activations[-1] = config["activation"]
+            continue
+
+        if kind == "Dense":
+            kernel, *rest = layer.get_weights()
+            arrays[prefix + "kernel"] = kernel
+            arrays[prefix + "bias"] = rest[0] if rest else np.zeros(kernel.shape[1], dtype=kernel.dtype)
+            activation = config.get("activation", "linear")
+        elif kind == "BatchNormalization":
+            weights = iter(layer.get_weights())
+            size = layer.get_weights()[-1].shape[0]
+            arrays[prefix + "gamma"] = next(weights) if config.get("scale", True) else np.ones(size, dtype=np.float32)
+            arrays[prefix + "beta"] = next(weights) if config.get("center", True) else np.zeros(size, dtype=np.float32)
+            arrays[prefix + "moving_mean"] = next(weights)
+            arrays[prefix + "moving_variance"] = next(weights)
+            arrays[prefix + "epsilon"] = np.float32(config["epsilon"])
+            activation = "linear"
+        else:
+            raise ValueError(f"Unsupported layer type '{kind}' ({layer.name})")
+
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation '{activation}' ({layer.name})")
+        layer_types.append(kind)
+        activations.append(activation)
+
+    arrays["layer_types"] = np.array(layer_types)
+    arrays["activations"] = np.array(activations)
+    return arrays
+
+
+def check_parity(keras_model, numpy_model, n_features, rows=2048, seed=0):
+    """
+    Largest absolute difference between Keras and NumPy outputs on random scaled inputs.
+    """
+    rng = np.random.default_rng(seed)
+    # The fertilizer inputs are MinMax-scaled, so sample slightly beyond [0, 1]
+    x = rng.uniform(-0.1, 1.1, size=(rows, n_features)).astype(np.float32)
+    expected = keras_model.predict(x, verbose=0)
+    actual = numpy_model.predict(x)
+    return float(np.max(np.abs(expected - actual))), int(np.sum(expected.argmax(axis=1) != actual.argmax(axis=1)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the fertilizer Keras model to NumPy weights.")
+    parser.add_argument("--keras-model", default=KERAS_MODEL_PATH)
+    parser.add_argument("--output", default=NUMPY_MODEL_PATH)
+    parser.add_argument("--tolerance", type=float, default=1e-5, help="Maximum allowed output difference")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    keras_model = tf.keras.models.load_model(args.keras_model, compile=False)
+    np.savez(args.output, **export_model(keras_model))
+    print(f"NumPy weights saved to: {args.output}")
+
+    numpy_model = NumpyDenseModel.load(args.output)
+    max_diff, mismatches = check_parity(keras_model, numpy_model, keras_model.input_shape[-1])
+    print(f"Max output difference: {max_diff:.2e}, argmax mismatches: {mismatches}")
+    if max_diff > args.tolerance or mismatches:
+        raise SystemExit("NumPy model does not match the Keras model within tolerance.")
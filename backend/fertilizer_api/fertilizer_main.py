@@ -4,25 +4,91 @@ Fertilizer recommendation API main file.
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from typing import List, NamedTuple
 import numpy as np
-import tensorflow as tf
-import joblib
 import os
 
+from common.batching import MicroBatcher
+from common.model_store import PerProcessModel, load_artifact
+from common.prediction_cache import PredictionCache, parse_precision
+from .numpy_model import NumpyDenseModel
+
 router = APIRouter()
 
 # ---------- Load model and utils ----------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, "model", "a1_fertilizer_model.h5")
 UTILS_PATH = os.path.join(BASE_DIR, "model", "a1_fertilizer_utils.pkl")
+NUMPY_MODEL_PATH = os.path.join(BASE_DIR, "model", "a1_fertilizer_model.npz")
+
+# "numpy" runs the exported weights without TensorFlow (regenerate them with
+# `python -m fertilizer_api.export_numpy_model` after retraining); "keras" loads the .h5 model
+INFERENCE_BACKEND = os.getenv(
+    "FERTILIZER_BACKEND", "numpy" if os.path.exists(NUMPY_MODEL_PATH) else "keras"
+).lower()
+ACTIVE_MODEL_PATH = NUMPY_MODEL_PATH if INFERENCE_BACKEND == "numpy" else MODEL_PATH
+
+def load_keras_model():
+    import tensorflow as tf
+    return tf.keras.models.load_model(MODEL_PATH)
+
+class FertilizerModels(NamedTuple):
+    model: object
+    scaler: object
+    fertilizer_encoder: object
+    soil_types: list
+    crop_types: list
+    # Case-insensitive name -> encoded value lookups, built once instead of per request
+    soil_codes: dict
+    crop_codes: dict
+
+def load_models():
+    """
+    Load (or reload) the model and the preprocessing utils, then publish them together in the
+    `models` global so a request never mixes a new model with an old scaler or encoder.
+    """
+    global models
+    try:
+        if INFERENCE_BACKEND == "numpy":
+            model = NumpyDenseModel.load(NUMPY_MODEL_PATH)
+        else:
+            if not os.path.exists(MODEL_PATH):
+                raise FileNotFoundError(MODEL_PATH)
+            # Loaded per worker on first use; TensorFlow must not be initialized before fork
+            model = PerProcessModel(load_keras_model)
+        utils = load_artifact(UTILS_PATH)
+        soil_types = [str(name) for name in utils["soil_encoder"].classes_]
+        crop_types = [str(name) for name in utils["crop_encoder"].classes_]
+    except Exception as e:
+        raise RuntimeError("Model or utils.pkl not found or invalid.") from e
+
+    models = FertilizerModels(
+        model=model,
+        scaler=utils["scaler"],
+        fertilizer_encoder=utils["fertilizer_encoder"],
+        soil_types=soil_types,
+        crop_types=crop_types,
+        soil_codes={name.lower(): code for code, name in enumerate(soil_types)},
+        crop_codes={name.lower(): code for code, name in enumerate(crop_types)},
+    )
+
+load_models()
+
+# Largest number of plots accepted by the batch endpoint in a single request
+MAX_BATCH_SIZE = int(os.getenv("FERTILIZER_MAX_BATCH_SIZE", "1000"))
 
-try:
-    model = tf.keras.models.load_model(MODEL_PATH)
-    utils = joblib.load(UTILS_PATH)
-    scaler = utils["scaler"]
-    fertilizer_encoder = utils["fertilizer_encoder"]
-except Exception as e:
-    raise RuntimeError("Model or utils.pkl not found or invalid.") from e
+# ---------- Prediction cache ----------
+# Predictions are cached on inputs rounded to soil-test precision; FERTILIZER_CACHE_SIZE=0 disables it
+prediction_cache = PredictionCache(
+    maxsize=int(os.getenv("FERTILIZER_CACHE_SIZE", "4096")),
+    precision=parse_precision(os.getenv(
+        "FERTILIZER_CACHE_PRECISION",
+        "temperature=0,humidity=0,moisture=0,nitrogen=0,potassium=0,phosphorous=0",
+    )),
+    default_precision=int(os.getenv("FERTILIZER_CACHE_DEFAULT_PRECISION", "2")),
+    watch_paths=[ACTIVE_MODEL_PATH, UTILS_PATH],
+)
+prediction_cache.add_invalidation_hook(load_models)
 
 # ---------- Fertilizer Information ----------
 fertilizer_info = {
@@ -95,30 +161,77 @@ class FertilizerInput(BaseModel):
     potassium: float
     phosphorous: float
 
+class NamedFertilizerInput(BaseModel):
+    temperature: float
+    humidity: float
+    moisture: float
+    soil_type: str    # e.g. "Loamy"
+    crop_type: str    # e.g. "Wheat"
+    nitrogen: float
+    potassium: float
+    phosphorous: float
+
+class FertilizerBatchInput(BaseModel):
+    rows: List[NamedFertilizerInput]
+
+def get_fertilizer_info(fertilizer):
+    """
+    Look up the description and tips for an encoder label. Some labels are spelled differently
+    from the table keys (e.g. "10/10/10", "Potassium sulfate.").
+    """
+    default = {
+        "description": "No description available.",
+        "tips": "No tips available."
+    }
+    info = fertilizer_info.get(fertilizer)
+    if info is None:
+        info = fertilizer_info.get(fertilizer.replace("/", "-").rstrip("."), default)
+    return info
+
 # ---------- Routes ----------
 @router.get("/")
 def index():
     return {"msg": "Fertilizer Recommendation API"}
 
+def predict_batch(input_data):
+    """
+    Scale and score a stacked batch of raw feature rows in one call. Used by the dispatcher.
+    """
+    current = models
+    return current.model.predict(current.scaler.transform(input_data), verbose=0)
+
+# ---------- Micro-batching dispatcher ----------
+# Concurrent requests are flushed together as one scaler.transform + model.predict call
+dispatcher = MicroBatcher(
+    predict_batch,
+    max_batch_size=int(os.getenv("FERTILIZER_BATCH_MAX_SIZE", "64")),
+    max_wait_ms=float(os.getenv("FERTILIZER_BATCH_MAX_WAIT_MS", "5")),
+    name="fertilizer",
+)
+
+async def run_prediction(features):
+    """
+    Score one row of features through the dispatcher and decode the best fertilizer.
+    Returns (fertilizer_name, confidence).
+    """
+    input_data = np.array([features["temperature"], features["humidity"], features["moisture"],
+                           features["soil_type"], features["crop_type"],
+                           features["nitrogen"], features["potassium"], features["phosphorous"]])
+
+    prediction = await dispatcher.submit(input_data)
+
+    index = int(np.argmax(prediction))
+    confidence = float(np.max(prediction))
+    fertilizer = models.fertilizer_encoder.inverse_transform([index])[0]
+    return fertilizer, confidence
+
 @router.post("/predict")
-def predict(data: FertilizerInput):
+async def predict(data: FertilizerInput):
     try:
-        input_data = np.array([[data.temperature, data.humidity, data.moisture,
-                                data.soil_type, data.crop_type,
-                                data.nitrogen, data.potassium, data.phosphorous]])
-        
-        scaled_input = scaler.transform(input_data)
-        prediction = model.predict(scaled_input)
-        
-        index = int(np.argmax(prediction[0]))
-        confidence = float(np.max(prediction[0]))
-        fertilizer = fertilizer_encoder.inverse_transform([index])[0]
+        fertilizer, confidence = await prediction_cache.get_or_compute_async(data.model_dump(), run_prediction)
 
         # Get fertilizer information
-        info = fertilizer_info.get(fertilizer, {
-            "description": "No description available.",
-            "tips": "No tips available."
-        })
+        info = get_fertilizer_info(fertilizer)
 
         return {
             "recommended_fertilizer": fertilizer,
@@ -129,3 +242,64 @@ def predict(data: FertilizerInput):
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/types")
+def list_types():
+    """Soil and crop names accepted by /predict/batch."""
+    current = models
+    return {"soil_types": current.soil_types, "crop_types": current.crop_types}
+
+@router.post("/predict/batch")
+def predict_batch_named(data: FertilizerBatchInput):
+    if not data.rows:
+        raise HTTPException(status_code=400, detail="At least one row is required.")
+    if len(data.rows) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch size {len(data.rows)} exceeds the maximum of {MAX_BATCH_SIZE} rows.")
+
+    # The batch path bypasses the cache, so it checks for a replaced model file itself
+    prediction_cache.check_for_changes()
+
+    # Resolve names through the lookup tables and report every unknown one at once
+    current = models
+    errors = []
+    input_rows = []
+    for position, row in enumerate(data.rows):
+        soil_code = current.soil_codes.get(row.soil_type.strip().lower())
+        crop_code = current.crop_codes.get(row.crop_type.strip().lower())
+        if soil_code is None:
+            errors.append(f"rows[{position}]: unknown soil_type '{row.soil_type}'")
+        if crop_code is None:
+            errors.append(f"rows[{position}]: unknown crop_type '{row.crop_type}'")
+        input_rows.append([row.temperature, row.humidity, row.moisture, soil_code, crop_code,
+                           row.nitrogen, row.potassium, row.phosphorous])
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
+
+    try:
+        # One scaler.transform and one model.predict for the whole batch
+        prediction = current.model.predict(current.scaler.transform(np.array(input_rows, dtype=np.float64)), verbose=0)
+        best = np.argmax(prediction, axis=1)
+        fertilizers = current.fertilizer_encoder.classes_[best]
+        confidences = prediction[np.arange(len(best)), best]
+
+        results = []
+        for fertilizer, confidence in zip(fertilizers, confidences):
+            info = get_fertilizer_info(str(fertilizer))
+            results.append({
+                "recommended_fertilizer": str(fertilizer),
+                "confidence": float(confidence),
+                "description": info["description"],
+                "tips": info["tips"]
+            })
+        return {"count": len(results), "results": results}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/dispatcher-stats")
+def dispatcher_stats():
+    return dispatcher.stats()
+
+@router.get("/cache-stats")
+def cache_stats():
+    return prediction_cache.stats()
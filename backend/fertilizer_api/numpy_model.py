@@ -0,0 +1,91 @@
+"""
+NumPy inference engine for the fertilizer recommendation network.
+
+Runs the exported weights of the Keras Dense/BatchNormalization stack (see export_numpy_model.py)
+without importing TensorFlow. Outputs match tf.keras Model.predict within float32 tolerance.
+"""
+
+import numpy as np
+
+
+def _relu(x):
+    return np.maximum(x, 0.0)
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _softmax(x):
+    shifted = np.exp(x - np.max(x, axis=-1, keepdims=True))
+    return shifted / np.sum(shifted, axis=-1, keepdims=True)
+
+
+def _elu(x):
+    return np.where(x > 0, x, np.expm1(np.minimum(x, 0.0)))
+
+
+def _selu(x):
+    return 1.0507009873554805 * np.where(x > 0, x, 1.6732632423543772 * np.expm1(np.minimum(x, 0.0)))
+
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": _relu,
+    "sigmoid": _sigmoid,
+    "softmax": _softmax,
+    "tanh": np.tanh,
+    "elu": _elu,
+    "selu": _selu,
+}
+
+
+class NumpyDenseModel:
+    """
+    Sequential stack of affine layers, each followed by an activation.
+
+    Dense layers use their kernel and bias; inference-mode BatchNormalization is precomputed
+    into a per-feature scale and shift when the weights are loaded.
+    """
+
+    def __init__(self, layers):
+        # Each layer is (kind, weight, bias, activation); for "scale" layers weight is a vector
+        self.layers = layers
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            kinds = [str(kind) for kind in data["layer_types"]]
+            activations = [str(name) for name in data["activations"]]
+            layers = []
+            for index, (kind, activation) in enumerate(zip(kinds, activations)):
+                if activation not in ACTIVATIONS:
+                    raise ValueError(f"Unsupported activation '{activation}' in layer {index}")
+                prefix = f"layer{index}_"
+                if kind == "Dense":
+                    weight = data[prefix + "kernel"].astype(np.float32)
+                    bias = data[prefix + "bias"].astype(np.float32)
+                    layers.append(("dense", weight, bias, activation))
+                elif kind == "BatchNormalization":
+                    scale = data[prefix + "gamma"] / np.sqrt(data[prefix + "moving_variance"] + data[prefix + "epsilon"])
+                    shift = data[prefix + "beta"] - data[prefix + "moving_mean"] * scale
+                    layers.append(("scale", scale.astype(np.float32), shift.astype(np.float32), activation))
+                else:
+                    raise ValueError(f"Unsupported layer type '{kind}' in layer {index}")
+        return cls(layers)
+
+    def predict(self, x, **kwargs):
+        """
+        Forward pass over a (n_rows, n_features) batch. Extra keyword arguments accepted by
+        Keras' predict (verbose, batch_size, ...) are ignored.
+        """
+        output = np.asarray(x, dtype=np.float32)
+        if output.ndim == 1:
+            output = output.reshape(1, -1)
+        for kind, weight, bias, activation in self.layers:
+            if kind == "dense":
+                output = output @ weight + bias
+            else:
+                output = output * weight + bias
+            output = ACTIVATIONS[activation](output)
+        return output
@@ -0,0 +1,31 @@
+# Gunicorn configuration for the unified SeedSync API
+#
+# The app is imported once in the master process. Workers are then forked and share the
+# sklearn and NumPy model pages copy-on-write; those artifacts are additionally memory-mapped
+# from .model_cache/ (see common/model_store.py) so their arrays stay shared. TensorFlow and
+# TFLite models are not preloaded: TensorFlow does not survive fork(), so each worker loads
+# its own copy on first use (common.model_store.PerProcessModel).
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+
+def when_ready(server):
+    from common.model_store import memory_usage
+
+    # Move everything allocated while loading models out of the tracked GC generations so
+    # collections in the workers don't touch (and un-share) those pages
+    gc.freeze()
+    server.log.info(f"Master memory after preload: {memory_usage()}")
+
+
+def post_fork(server, worker):
+    from common.model_store import memory_usage
+
+    server.log.info(f"Worker {worker.pid} started: {memory_usage()}")
@@ -15,6 +15,9 @@ from disease_api.routes.disease_prediction import router as disease_router
 from crop_rotation_api.routes.crop_rotation import router as rotation_router
 from pest_disease_api.routes.pest_disease import router as pest_disease_router
 from profile_api.routes.profile import router as profile_router
+from common.model_store import memory_usage
+from common.llm_client import llm_client
+from common.structured_output import OUTPUT_MODE, parse_stats
 
 app = FastAPI()
 
@@ -42,4 +45,14 @@ app.include_router(profile_router, prefix="/api", tags=["profile"])
 
 @app.get("/")
 async def root():
-    return {"message": "Unified SeedSync API"} 
\ No newline at end of file
+    return {"message": "Unified SeedSync API"}
+
+@app.get("/health/memory")
+async def worker_memory():
+    """Resident memory of the worker that served this request."""
+    return memory_usage() 
+
+@app.get("/health/llm")
+async def llm_metrics():
+    """Gemini call latency, retry and token counters, and parse counters per output mode, for this worker."""
+    return {**llm_client.stats(), "output_mode": OUTPUT_MODE, "parsing": parse_stats.stats()}
\ No newline at end of file
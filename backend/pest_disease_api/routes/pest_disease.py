@@ -1,12 +1,27 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
-import re
+from typing import List, Optional
+from contextlib import aclosing
+import asyncio
+import os
 
-from ..utils.pest_disease_gemini import generate_pest_disease_advice
+from common.sse import format_sse
+from common.structured_output import OUTPUT_MODE, SchemaError
+from ..utils.pest_disease_gemini import (
+    generate_pest_disease_advice, generate_pest_disease_batch_advice, stream_pest_disease_advice
+)
+from ..utils.pest_disease_parser import (
+    PestDiseaseStreamParser, parse_pest_disease_advice, parse_pest_disease_batch
+)
 
 router = APIRouter()
 
+# Fields per batch request, fields per Gemini prompt, and group prompts in flight per request
+MAX_BATCH_FIELDS = int(os.getenv("PEST_BATCH_MAX_FIELDS", "100"))
+MAX_GROUP_SIZE = int(os.getenv("PEST_BATCH_MAX_GROUP_SIZE", "10"))
+BATCH_CONCURRENCY = int(os.getenv("PEST_BATCH_CONCURRENCY", "4"))
+
 class PestDiseaseInput(BaseModel):
     crop: str
     crop_variety: Optional[str]
@@ -19,76 +34,201 @@ class PestDiseaseInput(BaseModel):
     soil_ph: float
     previous_issues: Optional[str]
 
-def parse_pest_disease_response(response_text: str):
-    """
-    Parses the raw text from Gemini into a structured dictionary for pest/disease advice.
-    Limits each section to 4 paragraphs maximum.
-    """
-    def limit_to_4_paragraphs(text: str) -> str:
-        """Helper function to limit text to 4 paragraphs"""
-        paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
-        return '\n'.join(paragraphs[:4])
-
-    try:
-        cleaned_text = re.sub(r'\*\*', '', response_text)
+class PestDiseaseField(PestDiseaseInput):
+    field_id: Optional[str] = None
 
-        response = {
-            "likelyPests": "Not specified",
-            "symptoms": "No symptoms provided.",
-            "preventiveMeasures": "No measures provided."
-        }
+class PestDiseaseBatchInput(BaseModel):
+    fields: List[PestDiseaseField]
 
-        pests_match = re.search(r'LIKELY PESTS OR DISEASES:\s*(.*?)(?=SYMPTOMS TO WATCH:|$)', cleaned_text, re.IGNORECASE | re.DOTALL)
-        if pests_match:
-            response["likelyPests"] = limit_to_4_paragraphs(pests_match.group(1).strip())
-
-        symptoms_match = re.search(r'SYMPTOMS TO WATCH:\s*(.*?)(?=PREVENTIVE MEASURES:|$)', cleaned_text, re.IGNORECASE | re.DOTALL)
-        if symptoms_match:
-            response["symptoms"] = limit_to_4_paragraphs(symptoms_match.group(1).strip())
-
-        measures_match = re.search(r'PREVENTIVE MEASURES:\s*(.*)', cleaned_text, re.IGNORECASE | re.DOTALL)
-        if measures_match:
-            response["preventiveMeasures"] = limit_to_4_paragraphs(measures_match.group(1).strip())
-
-        if response["likelyPests"] == "Not specified":
-            print(f"Could not parse response. Full Gemini Response:\n{response_text}")
-            response["preventiveMeasures"] = "Could not automatically parse the AI's response. The full response has been logged for review."
-            response["likelyPests"] = "See Full Response"
-            response["symptoms"] = response_text
-
-        return response
-    except Exception as e:
-        print(f"Error during response parsing: {e}")
-        return {
-            "likelyPests": "Parsing Error",
-            "symptoms": f"An error occurred while parsing the AI's advice: {str(e)}",
-            "preventiveMeasures": ""
-        }
+def build_pest_disease_request(data: PestDiseaseInput):
+    return {
+        "crop": data.crop,
+        "crop_variety": data.crop_variety or "Not specified",
+        "location": data.location,
+        "season": data.season,
+        "soil_type": data.soil_type,
+        "nitrogen": data.nitrogen,
+        "phosphorus": data.phosphorus,
+        "potassium": data.potassium,
+        "soil_ph": data.soil_ph,
+        "previous_issues": data.previous_issues or "None"
+    }
 
 @router.post("/predict")
-def get_pest_disease_prediction(data: PestDiseaseInput):
+async def get_pest_disease_prediction(data: PestDiseaseInput):
     try:
-        input_data = {
-            "crop": data.crop,
-            "crop_variety": data.crop_variety or "Not specified",
-            "location": data.location,
-            "season": data.season,
-            "soil_type": data.soil_type,
-            "nitrogen": data.nitrogen,
-            "phosphorus": data.phosphorus,
-            "potassium": data.potassium,
-            "soil_ph": data.soil_ph,
-            "previous_issues": data.previous_issues or "None"
-        }
-
-        gemini_response = generate_pest_disease_advice(input_data)
+        input_data = build_pest_disease_request(data)
+
+        gemini_response = await generate_pest_disease_advice(input_data)
         
         if "error occurred" in gemini_response.lower():
             raise HTTPException(status_code=500, detail=gemini_response)
 
-        structured_response = parse_pest_disease_response(gemini_response)
+        structured_response = parse_pest_disease_advice(gemini_response, OUTPUT_MODE)
         
         return structured_response
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/predict/stream")
+async def stream_pest_disease_prediction(data: PestDiseaseInput):
+    """
+    Server-Sent Events variant of /predict. Gemini's text is forwarded as "chunk" events while
+    each section (likelyPests, symptoms, preventiveMeasures) is sent as its own event as soon as
+    its block is complete; "done" carries the full structured response.
+
+    Partial JSON cannot be split into sections, so in JSON output mode the whole answer is
+    awaited and the section events follow each other immediately, without "chunk" events.
+    """
+    input_data = build_pest_disease_request(data)
+
+    async def events():
+        if OUTPUT_MODE == "json":
+            try:
+                gemini_response = await generate_pest_disease_advice(input_data, "json")
+                if "error occurred" in gemini_response.lower():
+                    raise RuntimeError(gemini_response)
+                structured_response = parse_pest_disease_advice(gemini_response, "json")
+            except Exception as e:
+                print(f"Gemini Error: {e}")
+                yield format_sse("error", {"detail": f"An error occurred while generating the prediction: {str(e)}"})
+                return
+            for section, value in structured_response.items():
+                yield format_sse(section, {section: value})
+            yield format_sse("done", structured_response)
+            return
+
+        parser = PestDiseaseStreamParser()
+        try:
+            async with aclosing(stream_pest_disease_advice(input_data)) as stream:
+                async for text in stream:
+                    yield format_sse("chunk", {"text": text})
+                    for section, value in parser.feed(text).items():
+                        yield format_sse(section, {section: value})
+            for section, value in parser.close().items():
+                yield format_sse(section, {section: value})
+        except Exception as e:
+            print(f"Gemini Error: {e}")
+            yield format_sse("error", {"detail": f"An error occurred while generating the prediction: {str(e)}"})
+            return
+
+        yield format_sse("done", parse_pest_disease_advice(parser.text, "text"))
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def group_fields(fields):
+    """
+    Indices of the fields grouped by crop, season and location (compared case-insensitively),
+    in chunks of at most MAX_GROUP_SIZE fields.
+    """
+    groups = {}
+    for index, field in enumerate(fields):
+        key = tuple(" ".join(value.split()).casefold() for value in (field.crop, field.season, field.location))
+        groups.setdefault(key, []).append(index)
+    return [
+        indices[start:start + MAX_GROUP_SIZE]
+        for indices in groups.values()
+        for start in range(0, len(indices), MAX_GROUP_SIZE)
+    ]
+
+# Returned for a field whose assessment failed; the cause is only logged
+BATCH_FIELD_ERROR = "An error occurred while generating the prediction for this field."
+
+@router.post("/predict/batch")
+async def predict_pest_disease_batch(batch: PestDiseaseBatchInput):
+    """
+    Risk assessment for many fields in one request. Identical fields are assessed once. Fields
+    sharing crop, season and location are sent to Gemini as one prompt with per-field output,
+    and the answer is fanned back out to the fields. Groups run with bounded concurrency. Fields
+    a parsed group answer leaves out are retried with the single-field prompt; a failed group
+    call is not retried. "report" compares the Gemini calls made with one call per distinct field.
+    """
+    fields = batch.fields
+    if not fields:
+        raise HTTPException(status_code=400, detail="No fields provided.")
+    if len(fields) > MAX_BATCH_FIELDS:
+        raise HTTPException(status_code=413, detail=f"Received {len(fields)} fields; the limit is {MAX_BATCH_FIELDS}.")
+
+    # Identical fields build identical prompts, which the LLM client would coalesce anyway
+    distinct_fields = []
+    field_inputs = []
+    distinct_of = []
+    positions = {}
+    for field in fields:
+        input_data = build_pest_disease_request(field)
+        key = tuple(input_data.values())
+        if key not in positions:
+            positions[key] = len(field_inputs)
+            distinct_fields.append(field)
+            field_inputs.append(input_data)
+        distinct_of.append(positions[key])
+
+    groups = group_fields(distinct_fields)
+    results = [None] * len(field_inputs)
+    calls = {"group": 0, "single": 0}
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def assess_single(index):
+        async with semaphore:
+            calls["single"] += 1
+            gemini_response = await generate_pest_disease_advice(field_inputs[index])
+        if "error occurred" in gemini_response.lower():
+            results[index] = {"error": BATCH_FIELD_ERROR}
+            return
+        try:
+            results[index] = parse_pest_disease_advice(gemini_response, OUTPUT_MODE)
+        except SchemaError as e:
+            print(f"Invalid answer: {e}")
+            results[index] = {"error": BATCH_FIELD_ERROR}
+
+    async def assess_group(indices):
+        if len(indices) == 1:
+            await assess_single(indices[0])
+            return
+        async with semaphore:
+            calls["group"] += 1
+            gemini_response = await generate_pest_disease_batch_advice([field_inputs[index] for index in indices])
+        advice = {}
+        if "error occurred" in gemini_response.lower():
+            print(f"Gemini Error: {gemini_response}")
+        else:
+            try:
+                advice = parse_pest_disease_batch(gemini_response, len(indices), OUTPUT_MODE)
+            except SchemaError as e:
+                print(f"Invalid batch answer: {e}")
+        if not advice:
+            # The group call failed outright; retrying every field would cost more than it saved
+            for index in indices:
+                results[index] = {"error": BATCH_FIELD_ERROR}
+            return
+        missing = []
+        for number, index in enumerate(indices, 1):
+            if number in advice:
+                results[index] = advice[number]
+            else:
+                missing.append(index)
+        await asyncio.gather(*(assess_single(index) for index in missing))
+
+    await asyncio.gather(*(assess_group(indices) for indices in groups))
+
+    group_of = {index: number for number, indices in enumerate(groups, 1) for index in indices}
+    llm_calls = calls["group"] + calls["single"]
+    return {
+        "results": [
+            {"field_id": field.field_id or str(position + 1), "group": group_of[index], **results[index]}
+            for position, (field, index) in enumerate(zip(fields, distinct_of))
+        ],
+        "report": {
+            "fields": len(fields),
+            "distinct_fields": len(field_inputs),
+            "groups": len(groups),
+            "group_calls": calls["group"],
+            "single_field_calls": calls["single"],
+            "llm_calls": llm_calls,
+            # One call per field, with identical fields coalesced
+            "baseline_llm_calls": len(field_inputs),
+            "llm_calls_saved": len(field_inputs) - llm_calls,
+            "failed_fields": sum(1 for index in distinct_of if "error" in results[index]),
+        },
+    }
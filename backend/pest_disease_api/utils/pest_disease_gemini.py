@@ -1,17 +1,10 @@
-import os
-from dotenv import load_dotenv
-import google.generativeai as genai
+from contextlib import aclosing
+from common.llm_client import llm_client
+from common.structured_output import OUTPUT_MODE, json_generation_config
+from .pest_disease_parser import PestDiseaseAdvice, PestDiseaseBatchAdvice
 
-dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '..', '.env')
-load_dotenv(dotenv_path=dotenv_path)
-
-genai.configure(api_key=os.getenv("VITE_GEMINI_API_KEY"))
-
-def generate_pest_disease_advice(data: dict) -> str:
-    try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        prompt = f"""
-You're an expert plant health advisor. Based on the provided field conditions and crop information, predict likely pest or disease threats and suggest preventive measures.
+def pest_disease_input_details(data: dict) -> str:
+    return f"""You're an expert plant health advisor. Based on the provided field conditions and crop information, predict likely pest or disease threats and suggest preventive measures.
 
 **Input Details:**
 - Crop: {data['crop']}
@@ -23,7 +16,11 @@ You're an expert plant health advisor. Based on the provided field conditions an
 - Phosphorus (P): {data['phosphorus']} mg/kg
 - Potassium (K): {data['potassium']} mg/kg
 - Soil pH: {data['soil_ph']}
-- Previous Issues: {data['previous_issues'] or "None"}
+- Previous Issues: {data['previous_issues'] or "None"}"""
+
+def build_pest_disease_prompt(data: dict) -> str:
+    return f"""
+{pest_disease_input_details(data)}
 
 **Provide output in this format:**
 
@@ -39,8 +36,107 @@ You're an expert plant health advisor. Based on the provided field conditions an
 Keep the response practical and clear for Indian farmers and extension officers.
         """
 
-        response = model.generate_content(prompt)
-        return response.text if hasattr(response, 'text') else "No prediction available at the moment."
+def build_pest_disease_json_prompt(data: dict) -> str:
+    """
+    Prompt for JSON mode; the response schema carries the output format.
+    """
+    return f"""
+{pest_disease_input_details(data)}
+
+Answer with the likely pests or diseases (each with a brief description and risk level), the symptoms to watch, and the preventive measures, with one point per line and at most four points per field.
+
+Keep the response practical and clear for Indian farmers and extension officers.
+        """
+
+async def generate_pest_disease_advice(data: dict, mode: str = OUTPUT_MODE) -> str:
+    try:
+        if mode == "json":
+            text = await llm_client.generate(
+                build_pest_disease_json_prompt(data), name="pest_disease_advice_json",
+                generation_config=json_generation_config(PestDiseaseAdvice),
+            )
+        else:
+            text = await llm_client.generate(build_pest_disease_prompt(data), name="pest_disease_advice")
+        return text or "No prediction available at the moment."
     except Exception as e:
         print(f"Gemini Error: {e}")
         return f"An error occurred while generating the prediction: {str(e)}"
+
+def batch_input_details(fields: list) -> str:
+    shared = fields[0]
+    lines = [
+        f"- Field {number}: Crop Variety: {data['crop_variety']}; Soil Type: {data['soil_type']}; "
+        f"Nitrogen (N): {data['nitrogen']} mg/kg; Phosphorus (P): {data['phosphorus']} mg/kg; "
+        f"Potassium (K): {data['potassium']} mg/kg; Soil pH: {data['soil_ph']}; "
+        f"Previous Issues: {data['previous_issues'] or 'None'}"
+        for number, data in enumerate(fields, 1)
+    ]
+    fields_text = "\n".join(lines)
+    return f"""You're an expert plant health advisor. Based on the provided field conditions and crop information, predict likely pest or disease threats and suggest preventive measures for each of the {len(fields)} fields below. They grow the same crop in the same region and season.
+
+**Shared Details:**
+- Crop: {shared['crop']}
+- Region/Location: {shared['location']}
+- Season: {shared['season']}
+
+**Fields:**
+{fields_text}"""
+
+def build_pest_disease_batch_prompt(fields: list) -> str:
+    """
+    One prompt for several fields sharing crop, season and location; fields are numbered from 1
+    in the order given.
+    """
+    return f"""
+{batch_input_details(fields)}
+
+**Provide output in this format, repeating the block for every field in order:**
+
+**FIELD <number>:**
+
+**LIKELY PESTS OR DISEASES:**  
+[List of threats with brief description and risk level]
+
+**SYMPTOMS TO WATCH:**  
+[List common early indicators farmers should monitor]
+
+**PREVENTIVE MEASURES:**  
+[Bullet points on field practices, natural remedies, and treatments]
+
+Base each field's advice on its own soil readings and history. Keep the response practical and clear for Indian farmers and extension officers.
+        """
+
+def build_pest_disease_batch_json_prompt(fields: list) -> str:
+    return f"""
+{batch_input_details(fields)}
+
+Answer with one entry per field, giving its number, the likely pests or diseases (each with a brief description and risk level), the symptoms to watch, and the preventive measures, with one point per line and at most four points per field.
+
+Base each field's advice on its own soil readings and history. Keep the response practical and clear for Indian farmers and extension officers.
+        """
+
+async def generate_pest_disease_batch_advice(fields: list, mode: str = OUTPUT_MODE) -> str:
+    """
+    Advice for several fields of one crop, season and location from a single Gemini call.
+    """
+    try:
+        if mode == "json":
+            text = await llm_client.generate(
+                build_pest_disease_batch_json_prompt(fields), name="pest_disease_batch_json",
+                generation_config=json_generation_config(PestDiseaseBatchAdvice),
+            )
+        else:
+            text = await llm_client.generate(build_pest_disease_batch_prompt(fields), name="pest_disease_batch")
+        return text or "No prediction available at the moment."
+    except Exception as e:
+        print(f"Gemini Error: {e}")
+        return f"An error occurred while generating the prediction: {str(e)}"
+
+async def stream_pest_disease_advice(data: dict):
+    """
+    Async generator yielding the pest/disease advice text as Gemini produces it. Errors propagate
+    to the caller.
+    """
+    async with aclosing(llm_client.stream(build_pest_disease_prompt(data), name="pest_disease_advice_stream")) as stream:
+        async for text in stream:
+            yield text
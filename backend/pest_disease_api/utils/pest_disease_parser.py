@@ -0,0 +1,146 @@
+# Pest and Disease Response Parsing
+
+import time
+from typing import List
+
+from pydantic import BaseModel, Field
+
+from common.sections import SectionTokenizer
+from common.structured_output import SchemaError, parse_stats, validate_json
+
+PEST_HEADERS = {
+    "LIKELY PESTS OR DISEASES": "likelyPests",
+    "SYMPTOMS TO WATCH": "symptoms",
+    "PREVENTIVE MEASURES": "preventiveMeasures",
+}
+
+# likelyPests values of a text answer that could not be parsed
+PARSE_FAILURES = ("See Full Response", "Parsing Error")
+
+class PestDiseaseAdvice(BaseModel):
+    """
+    Response shape of /predict, also sent to Gemini as the JSON-mode response schema. Each field
+    is plain text with one point per line.
+    """
+    likelyPests: str = Field(description="Likely pest or disease threats, one per line, each with a brief description and risk level")
+    symptoms: str = Field(description="Early indicators farmers should monitor, one per line")
+    preventiveMeasures: str = Field(description="Field practices, natural remedies and treatments, one per line")
+
+class PestDiseaseFieldAdvice(PestDiseaseAdvice):
+    field: int = Field(description="Number of the field this advice is for, as numbered in the prompt")
+
+class PestDiseaseBatchAdvice(BaseModel):
+    """
+    JSON-mode response schema of a multi-field prompt, with one entry per field.
+    """
+    fields: List[PestDiseaseFieldAdvice]
+
+def limit_to_4_paragraphs(text: str) -> str:
+    """Helper function to limit text to 4 paragraphs"""
+    paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
+    return '\n'.join(paragraphs[:4])
+
+def pest_disease_fields(sections):
+    return {section.key: limit_to_4_paragraphs(section.text) for section in sections}
+
+def extract_pest_disease_sections(response_text: str):
+    """
+    Returns the sections found in the Gemini text, without defaults or fallbacks.
+    """
+    tokenizer = SectionTokenizer(PEST_HEADERS, strip_bold=True)
+    return pest_disease_fields(tokenizer.tokenize(response_text).values())
+
+def parse_pest_disease_response(response_text: str):
+    """
+    Parses the raw text from Gemini into a structured dictionary for pest/disease advice.
+    Limits each section to 4 paragraphs maximum.
+    """
+    try:
+        response = {
+            "likelyPests": "Not specified",
+            "symptoms": "No symptoms provided.",
+            "preventiveMeasures": "No measures provided."
+        }
+        response.update(extract_pest_disease_sections(response_text))
+
+        if response["likelyPests"] == "Not specified":
+            print(f"Could not parse response. Full Gemini Response:\n{response_text}")
+            response["preventiveMeasures"] = "Could not automatically parse the AI's response. The full response has been logged for review."
+            response["likelyPests"] = "See Full Response"
+            response["symptoms"] = response_text
+
+        return response
+    except Exception as e:
+        print(f"Error during response parsing: {e}")
+        return {
+            "likelyPests": "Parsing Error",
+            "symptoms": f"An error occurred while parsing the AI's advice: {str(e)}",
+            "preventiveMeasures": ""
+        }
+
+class PestDiseaseStreamParser:
+    """
+    Incremental version of parse_pest_disease_response: feed() Gemini text as it streams in and
+    get back the sections whose block has been closed by the next section header.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.tokenizer = SectionTokenizer(PEST_HEADERS, strip_bold=True)
+
+    def feed(self, chunk: str):
+        self.text += chunk
+        closed, _ = self.tokenizer.feed(chunk)
+        return pest_disease_fields(closed)
+
+    def close(self):
+        closed, _ = self.tokenizer.close()
+        return pest_disease_fields(closed)
+
+def parse_pest_disease_advice(response_text: str, mode: str):
+    """
+    Turns a Gemini answer in either output mode into the response dictionary, counting parse
+    latency and failures per mode. Raises SchemaError when a JSON answer does not validate.
+    """
+    started = time.perf_counter()
+    if mode == "json":
+        try:
+            advice = validate_json(PestDiseaseAdvice, response_text)
+        except SchemaError:
+            parse_stats.record("pest_disease", mode, started, ok=False)
+            raise
+        # Same 4 paragraph limit as the text sections
+        advice = {field: limit_to_4_paragraphs(value) for field, value in advice.model_dump().items()}
+    else:
+        advice = parse_pest_disease_response(response_text)
+    parse_stats.record("pest_disease", mode, started, ok=advice["likelyPests"] not in PARSE_FAILURES)
+    return advice
+
+def parse_pest_disease_batch(response_text: str, field_count: int, mode: str):
+    """
+    Splits the answer to a multi-field prompt into {field number: response dictionary}, with
+    fields numbered from 1. Fields the answer leaves out, or whose block cannot be parsed, are
+    missing from the result. Raises SchemaError when a JSON answer does not validate.
+    """
+    started = time.perf_counter()
+    advice = {}
+    if mode == "json":
+        try:
+            batch = validate_json(PestDiseaseBatchAdvice, response_text)
+        except SchemaError:
+            parse_stats.record("pest_disease_batch", mode, started, ok=False)
+            raise
+        for item in batch.fields:
+            if 1 <= item.field <= field_count and item.field not in advice:
+                advice[item.field] = {
+                    name: limit_to_4_paragraphs(getattr(item, name)) for name in PestDiseaseAdvice.model_fields
+                }
+    else:
+        # Each field's block starts with a "**FIELD <number>:**" line
+        headers = {f"FIELD {number}": number for number in range(1, field_count + 1)}
+        for number, section in SectionTokenizer(headers).tokenize(response_text).items():
+            parsed = parse_pest_disease_response(section.text)
+            if parsed["likelyPests"] not in PARSE_FAILURES:
+                advice[number] = parsed
+    parse_stats.record("pest_disease_batch", mode, started, ok=len(advice) == field_count)
+    return advice
@@ -0,0 +1,90 @@
+"""
+CompiledForest gives the same probabilities and labels as the sklearn pipeline it was built
+from (see crop_api/utils/compiled_forest.py).
+"""
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from crop_api.utils.compiled_forest import CompiledForest, verify_parity
+
+
+def fit_pipeline(X, y, **classifier_params):
+    pipeline = Pipeline([
+        ("scaler", StandardScaler()),
+        ("classifier", RandomForestClassifier(random_state=0, **classifier_params)),
+    ])
+    return pipeline.fit(X, y)
+
+
+@pytest.fixture(scope="module")
+def crop_like():
+    # Seven features and several classes, like the crop recommendation data
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, 7)) * [30, 20, 25, 5, 15, 0.8, 60] + [50, 50, 50, 25, 70, 6.5, 100]
+    y = np.array(["rice", "maize", "chickpea", "cotton"])[np.argmax(X[:, :4] * [1, 1.2, 0.9, 2], axis=1)]
+    return X, y
+
+
+def test_matches_pipeline(crop_like):
+    X, y = crop_like
+    pipeline = fit_pipeline(X, y, n_estimators=25)
+    compiled = CompiledForest(pipeline)
+
+    rng = np.random.default_rng(1)
+    rows = rng.uniform(X.min(axis=0) * 1.5, X.max(axis=0) * 1.5, size=(2000, X.shape[1]))
+    mismatches, max_diff = verify_parity(pipeline, compiled, rows)
+    assert mismatches == 0
+    assert max_diff < 1e-9
+    np.testing.assert_array_equal(compiled.classes_, pipeline.classes_)
+
+
+def test_single_row(crop_like):
+    X, y = crop_like
+    pipeline = fit_pipeline(X, y, n_estimators=5)
+    compiled = CompiledForest(pipeline)
+    np.testing.assert_allclose(compiled.predict_proba(X[0]), pipeline.predict_proba(X[:1]))
+
+
+def test_ties_pick_the_same_class():
+    # Every row appears once per class, so no tree can separate them and all probabilities tie
+    rng = np.random.default_rng(2)
+    rows = rng.normal(size=(40, 7))
+    X = np.vstack([rows, rows, rows])
+    y = np.repeat(["rice", "maize", "cotton"], len(rows))
+    pipeline = fit_pipeline(X, y, n_estimators=4, bootstrap=False)
+    compiled = CompiledForest(pipeline)
+
+    proba = pipeline.predict_proba(rows)
+    assert np.allclose(proba, 1 / 3)
+    np.testing.assert_allclose(compiled.predict_proba(rows), proba)
+    np.testing.assert_array_equal(compiled.predict(rows), pipeline.predict(rows))
+
+
+@pytest.mark.parametrize("value", [np.inf, -np.inf])
+def test_rejects_infinite_input_like_sklearn(crop_like, value):
+    X, y = crop_like
+    pipeline = fit_pipeline(X, y, n_estimators=5)
+    compiled = CompiledForest(pipeline)
+    rows = X[:2].copy()
+    rows[1, 3] = value
+
+    with pytest.raises(ValueError):
+        pipeline.predict_proba(rows)
+    with pytest.raises(ValueError, match="Input X contains infinity"):
+        compiled.predict_proba(rows)
+
+
+def test_rejects_nan_input(crop_like):
+    # Recent sklearn forests route NaN down a learned "missing" branch instead of rejecting it;
+    # the compiled forest has no such branch and rejects NaN like check_array's default
+    X, y = crop_like
+    compiled = CompiledForest(fit_pipeline(X, y, n_estimators=5))
+    rows = X[:2].copy()
+    rows[0, 0] = np.nan
+
+    with pytest.raises(ValueError, match="Input X contains NaN"):
+        compiled.predict(rows)
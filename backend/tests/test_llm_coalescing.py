@@ -0,0 +1,69 @@
+"""
+Identical concurrent LLM requests are coalesced into a single upstream call.
+
+Runs the real rotation and pest helpers against the local Gemini stub (tools/llm_stub_server.py).
+From backend/, with the packages in requirements-dev.txt installed:
+
+    python -m pytest
+"""
+
+import asyncio
+
+import pytest
+
+from common.llm_client import LLMClient
+from crop_rotation_api.utils import crop_rotation_gemini
+from pest_disease_api.utils import pest_disease_gemini
+from tools.llm_stub_server import StubHandler, serve
+
+REQUESTS = 50
+
+ROTATION = {
+    "current_crop": "rice", "previous_crops": ["wheat"], "soil_type": "loamy", "nitrogen": "40-50",
+    "phosphorus": "30-35", "potassium": "40-50", "soil_ph": "6.5-7", "climate_zone": "tropical",
+    "season": "rabi", "water_availability": "medium", "irrigation_type": "drip",
+    "pest_history": "None", "target_goal": "yield",
+}
+PEST = {
+    "crop": "Rice", "crop_variety": "Not specified", "location": "Punjab", "season": "Kharif",
+    "soil_type": "Clay", "nitrogen": 40, "phosphorus": 30, "potassium": 40, "soil_ph": 6.8,
+    "previous_issues": "None",
+}
+
+
+@pytest.fixture(scope="module")
+def stub():
+    server = serve(0, latency_ms=300)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def llm_client(stub, monkeypatch):
+    """A client pointed at the stub, swapped into the helpers in place of the env-configured one."""
+    client = LLMClient(
+        api_key="stub", api_endpoint=f"http://127.0.0.1:{stub.server_port}", transport="rest", coalesce=True
+    )
+    monkeypatch.setattr(crop_rotation_gemini, "llm_client", client)
+    monkeypatch.setattr(pest_disease_gemini, "llm_client", client)
+    StubHandler.requests = 0
+    return client
+
+
+def test_identical_concurrent_requests_share_one_upstream_call(llm_client):
+    async def fire():
+        return await asyncio.gather(
+            *(crop_rotation_gemini.generate_rotation_advice(ROTATION, "text") for _ in range(REQUESTS)),
+            *(pest_disease_gemini.generate_pest_disease_advice(PEST, "text") for _ in range(REQUESTS)),
+        )
+
+    results = asyncio.run(fire())
+    rotation_results, pest_results = results[:REQUESTS], results[REQUESTS:]
+    operations = llm_client.stats()["operations"]
+
+    assert StubHandler.requests == 2
+    assert len(set(rotation_results)) == 1 and "NEXT CROP" in rotation_results[0]
+    assert len(set(pest_results)) == 1 and "LIKELY PESTS" in pest_results[0]
+    for name in ("rotation_advice", "pest_disease_advice"):
+        assert operations[name]["calls"] == 1
+        assert operations[name]["coalesced"] == REQUESTS - 1
@@ -0,0 +1 @@
+"""Development tooling: the local Gemini stub and parser benchmarks. Not imported by the app."""
@@ -0,0 +1,273 @@
+"""
+Parity check and microbenchmark for the section parsers: the regex parsers they replaced vs.
+the single-pass tokenizer in common.sections.
+
+The corpus (tools/section_corpus.json) holds Gemini responses in the formats the rotation,
+pest/disease and disease tips prompts ask for, each with the output the regex parsers gave for
+it. Every response is parsed as a whole and as a stream cut at random points, and both must
+reproduce the recorded output. Usage, from backend/:
+
+    python -m tools.benchmark_sections --repeats 2000
+    python -m tools.benchmark_sections --record    # re-record expected outputs from the regex parsers
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+from crop_rotation_api.utils.rotation_parser import (
+    RotationAdviceStreamParser, extract_rotation_sections, parse_gemini_response
+)
+from disease_api.utils.tips_parser import DiseaseTipsParser, parse_disease_tips
+from pest_disease_api.utils.pest_disease_parser import (
+    PestDiseaseStreamParser, extract_pest_disease_sections, limit_to_4_paragraphs, parse_pest_disease_response
+)
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "section_corpus.json")
+
+
+def legacy_numbered_items(section_text):
+    items = re.findall(r'\d+\.\s*(.*?)(?=\n\d+\.|\n*$)', section_text, re.DOTALL)
+    cleaned_items = []
+    for item in items:
+        cleaned_item = re.sub(r'\*\*', '', item.strip())
+        cleaned_item = re.sub(r'\s+', ' ', cleaned_item).strip()
+        if cleaned_item:
+            cleaned_items.append(cleaned_item)
+    return cleaned_items
+
+
+def legacy_rotation(response_text):
+    """The original rotation parser: one DOTALL search per section over the whole text."""
+    response = {
+        "nextCrop": "Not specified",
+        "justification": "No justification provided.",
+        "advantages": [],
+        "rotationPlan": []
+    }
+    next_crop_match = re.search(r'\*\*NEXT CROP:\*\*\s*(.*?)(?=\n\*\*|$)', response_text, re.IGNORECASE | re.DOTALL)
+    if next_crop_match:
+        response["nextCrop"] = next_crop_match.group(1).strip()
+    justification_match = re.search(r'\*\*JUSTIFICATION:\*\*\s*(.*?)(?=\n\*\*|$)', response_text, re.IGNORECASE | re.DOTALL)
+    if justification_match:
+        response["justification"] = justification_match.group(1).strip()
+    advantages_match = re.search(r'\*\*ADVANTAGES:\*\*\s*\n(.*?)(?=\n\*\*|$)', response_text, re.IGNORECASE | re.DOTALL)
+    if advantages_match:
+        advantages = legacy_numbered_items(advantages_match.group(1).strip())
+        if advantages:
+            response["advantages"] = advantages
+    rotation_match = re.search(r'\*\*ROTATION PLAN:\*\*\s*\n(.*?)(?=\n\*\*|$)', response_text, re.IGNORECASE | re.DOTALL)
+    if rotation_match:
+        rotation_plan = legacy_numbered_items(rotation_match.group(1).strip())
+        if rotation_plan:
+            response["rotationPlan"] = rotation_plan
+
+    if response["nextCrop"] == "Not specified":
+        response["justification"] = "Could not automatically parse the AI's response. The full response has been logged for review."
+        response["nextCrop"] = "See Full Response"
+        response["advantages"] = [response_text]
+    return response
+
+
+def legacy_pest_disease(response_text):
+    """The original pest/disease parser: strip ** then one DOTALL search per section."""
+    cleaned_text = re.sub(r'\*\*', '', response_text)
+    response = {
+        "likelyPests": "Not specified",
+        "symptoms": "No symptoms provided.",
+        "preventiveMeasures": "No measures provided."
+    }
+    pests_match = re.search(r'LIKELY PESTS OR DISEASES:\s*(.*?)(?=SYMPTOMS TO WATCH:|$)', cleaned_text, re.IGNORECASE | re.DOTALL)
+    if pests_match:
+        response["likelyPests"] = limit_to_4_paragraphs(pests_match.group(1).strip())
+    symptoms_match = re.search(r'SYMPTOMS TO WATCH:\s*(.*?)(?=PREVENTIVE MEASURES:|$)', cleaned_text, re.IGNORECASE | re.DOTALL)
+    if symptoms_match:
+        response["symptoms"] = limit_to_4_paragraphs(symptoms_match.group(1).strip())
+    measures_match = re.search(r'PREVENTIVE MEASURES:\s*(.*)', cleaned_text, re.IGNORECASE | re.DOTALL)
+    if measures_match:
+        response["preventiveMeasures"] = limit_to_4_paragraphs(measures_match.group(1).strip())
+
+    if response["likelyPests"] == "Not specified":
+        response["preventiveMeasures"] = "Could not automatically parse the AI's response. The full response has been logged for review."
+        response["likelyPests"] = "See Full Response"
+        response["symptoms"] = response_text
+    return response
+
+
+def legacy_disease_tips(tips_text, disease_name):
+    """The original tips parser: the first overview-like line of the split text."""
+    sections = {
+        "overview": "",
+        "immediate_actions": [],
+        "cultural_practices": [],
+        "chemical_controls": [],
+        "monitoring": [],
+        "resistant_varieties": []
+    }
+    for line in tips_text.split('\n'):
+        line = line.strip()
+        if line and not line.startswith('*') and not line.startswith('1.') and not line.startswith('2.') and not line.startswith('3.') and not line.startswith('4.'):
+            if 'prevention' in line.lower() or 'guide' in line.lower() or 'approach' in line.lower():
+                sections["overview"] = line
+                break
+            elif len(line) > 50:
+                sections["overview"] = line
+                break
+    if not sections["overview"]:
+        sections["overview"] = f"{disease_name}: A comprehensive guide for farmers."
+    return sections
+
+
+def random_chunks(text, rng):
+    # Cut points anywhere, including inside "**" markers and header labels
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(1, 40))))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+def stream_rotation(chunks):
+    parser = RotationAdviceStreamParser()
+    fields = {}
+    for chunk in chunks:
+        fields.update(parser.feed(chunk))
+    fields.update(parser.close())
+    return fields, parse_gemini_response(parser.text)
+
+
+def stream_pest_disease(chunks):
+    parser = PestDiseaseStreamParser()
+    fields = {}
+    for chunk in chunks:
+        fields.update(parser.feed(chunk))
+    fields.update(parser.close())
+    return fields, parse_pest_disease_response(parser.text)
+
+
+def stream_disease_tips(chunks, disease_name):
+    parser = DiseaseTipsParser(disease_name)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+    return parser.result()
+
+
+KINDS = {
+    # kind: (legacy parser, new parser), both taking a corpus entry
+    "rotation": (lambda entry: legacy_rotation(entry["text"]), lambda entry: parse_gemini_response(entry["text"])),
+    "pest_disease": (lambda entry: legacy_pest_disease(entry["text"]), lambda entry: parse_pest_disease_response(entry["text"])),
+    "disease_tips": (
+        lambda entry: legacy_disease_tips(entry["text"], entry["disease"]),
+        lambda entry: parse_disease_tips(entry["text"], entry["disease"]),
+    ),
+}
+
+
+def streamed(kind, entry, chunks):
+    """Parse an entry from chunks; returns (sections emitted while streaming, final response)."""
+    if kind == "rotation":
+        return stream_rotation(chunks)
+    if kind == "pest_disease":
+        return stream_pest_disease(chunks)
+    result = stream_disease_tips(chunks, entry["disease"])
+    return result, result
+
+
+def expected_sections(kind, entry):
+    if kind == "rotation":
+        return extract_rotation_sections(entry["text"])
+    if kind == "pest_disease":
+        return extract_pest_disease_sections(entry["text"])
+    return entry["expected"]
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as corpus_file:
+        return json.load(corpus_file)
+
+
+def record(corpus, path=CORPUS_PATH):
+    for kind, entries in corpus.items():
+        legacy, _ = KINDS[kind]
+        for entry in entries:
+            entry["expected"] = legacy(entry)
+    with open(path, "w", encoding="utf-8") as corpus_file:
+        json.dump(corpus, corpus_file, indent=2, ensure_ascii=False)
+        corpus_file.write("\n")
+
+
+def check_parity(corpus, splits, seed=0):
+    """
+    Returns (failures, intentional differences) as lists of "kind #index: reason" strings.
+    """
+    rng = random.Random(seed)
+    failures, differences = [], []
+    for kind, entries in corpus.items():
+        _, parse = KINDS[kind]
+        for index, entry in enumerate(entries):
+            label = f"{kind} #{index}"
+            result = parse(entry)
+            if result != entry["expected"]:
+                if entry.get("intentional_difference"):
+                    differences.append(f"{label}: {entry['intentional_difference']}")
+                else:
+                    failures.append(f"{label}: full-text parse differs from the recorded output")
+                    continue
+            for _ in range(splits):
+                sections, final = streamed(kind, entry, random_chunks(entry["text"], rng))
+                if final != result or sections != expected_sections(kind, entry):
+                    failures.append(f"{label}: streamed parse differs from the full-text parse")
+                    break
+    return failures, differences
+
+
+def time_parser(parse, entries, repeats):
+    """Median microseconds per response over the corpus entries."""
+    timings = []
+    for _ in range(repeats):
+        for entry in entries:
+            start = time.perf_counter()
+            parse(entry)
+            timings.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--repeats", type=int, default=1000, help="timing passes over the corpus")
+    parser.add_argument("--splits", type=int, default=50, help="random chunkings per response for the stream check")
+    parser.add_argument("--record", action="store_true", help="write the regex parsers' output into the corpus")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    # The parsers print the full response when they fall back; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        if args.record:
+            record(corpus, args.corpus)
+        failures, differences = check_parity(corpus, args.splits)
+        timings = {
+            kind: [time_parser(implementation, corpus[kind], args.repeats) for implementation in KINDS[kind]]
+            for kind in corpus
+        }
+
+    if args.record:
+        print(f"Recorded expected outputs in {args.corpus}")
+    print(f"{'parser':<14}{'responses':>10}{'regex us':>11}{'tokenizer us':>14}{'speedup':>9}")
+    for kind, (legacy_us, new_us) in timings.items():
+        print(f"{kind:<14}{len(corpus[kind]):>10}{legacy_us:>11.1f}{new_us:>14.1f}{legacy_us / new_us:>8.2f}x")
+    for difference in differences:
+        print(f"intentional difference, {difference}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("parity: " + ("ok" if not failures else f"{len(failures)} failure(s)"))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
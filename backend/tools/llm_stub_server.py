@@ -0,0 +1,208 @@
+"""
+Local stand-in for the Gemini REST API, for exercising the LLM routes without network access.
+
+Serves generateContent and streamGenerateContent with canned answers in the formats the
+rotation, pest and disease prompts ask for; requests with a JSON response schema
+(LLM_OUTPUT_MODE=json) get a JSON answer for that schema. Usage, from backend/:
+
+    python -m tools.llm_stub_server --port 8089 --latency-ms 300 --failure-rate 0.1
+    LLM_API_ENDPOINT=http://127.0.0.1:8089 LLM_TRANSPORT=rest uvicorn main:app
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROTATION_ANSWER = """**NEXT CROP:** Chickpea
+
+**JUSTIFICATION:** A legume after a cereal restores soil nitrogen and breaks the pest cycle.
+
+**ADVANTAGES:**
+1. Fixes atmospheric nitrogen
+2. Low water requirement
+3. Breaks cereal pest and disease cycles
+4. Good market demand
+
+**ROTATION PLAN:**
+1. Rabi: Chickpea
+2. Kharif: Maize with farmyard manure
+3. Rabi: Wheat
+
+**ADDITIONAL NOTES:** Test soil pH before sowing and inoculate seed with Rhizobium.
+"""
+
+PEST_ANSWER = """**LIKELY PESTS OR DISEASES:**
+Stem borer (high risk)
+Leaf blast (medium risk)
+
+**SYMPTOMS TO WATCH:**
+Dead hearts in young tillers
+Spindle-shaped lesions on leaves
+
+**PREVENTIVE MEASURES:**
+Use resistant varieties
+Avoid excess nitrogen
+Install pheromone traps
+"""
+
+DISEASE_ANSWER = """This prevention guide gives a practical approach to managing the detected condition.
+
+**1. Disease Overview:**
+- Fungal infection favoured by warm, humid weather
+
+**2. Immediate Actions (What to do NOW):**
+- Remove and destroy infected leaves
+
+**3. Treatment Recommendations:**
+- Copper-based fungicide every 7-10 days
+
+**4. Long-term Prevention Plan:**
+- Rotate crops and improve spacing
+
+**5. Monitoring & Follow-up:**
+- Inspect lower leaves weekly
+"""
+
+
+JSON_ANSWERS = {
+    "nextCrop": {
+        "nextCrop": "Chickpea",
+        "justification": "A legume after a cereal restores soil nitrogen and breaks the pest cycle.",
+        "advantages": ["Fixes atmospheric nitrogen", "Low water requirement", "Breaks cereal pest and disease cycles", "Good market demand"],
+        "rotationPlan": ["Rabi: Chickpea", "Kharif: Maize with farmyard manure", "Rabi: Wheat"],
+    },
+    "likelyPests": {
+        "likelyPests": "Stem borer (high risk)\nLeaf blast (medium risk)",
+        "symptoms": "Dead hearts in young tillers\nSpindle-shaped lesions on leaves",
+        "preventiveMeasures": "Use resistant varieties\nAvoid excess nitrogen\nInstall pheromone traps",
+    },
+    "overview": {
+        "overview": "A fungal infection favoured by warm, humid weather; act early to stop it spreading.",
+        "immediate_actions": ["Remove and destroy infected leaves"],
+        "cultural_practices": ["Rotate crops and improve spacing"],
+        "chemical_controls": ["Copper-based fungicide every 7-10 days"],
+        "monitoring": ["Inspect lower leaves weekly"],
+        "resistant_varieties": [],
+    },
+}
+
+
+def batch_field_count(prompt):
+    # Multi-field pest prompts list one "- Field <number>:" line per field
+    return len(re.findall(r"^- Field \d+:", prompt, re.MULTILINE))
+
+
+def canned_json_answer(schema, prompt=""):
+    # The answer is picked by a property of the requested response schema
+    properties = (schema or {}).get("properties", {})
+    if "fields" in properties:
+        return json.dumps({"fields": [
+            {**JSON_ANSWERS["likelyPests"], "field": number} for number in range(1, batch_field_count(prompt) + 1)
+        ]})
+    for field, answer in JSON_ANSWERS.items():
+        if field in properties:
+            return json.dumps(answer)
+    return "{}"
+
+
+def canned_answer(prompt):
+    if "FIELD <number>" in prompt:
+        return "\n".join(f"**FIELD {number}:**\n\n{PEST_ANSWER}" for number in range(1, batch_field_count(prompt) + 1))
+    if "NEXT CROP" in prompt:
+        return ROTATION_ANSWER
+    if "LIKELY PESTS" in prompt:
+        return PEST_ANSWER
+    return DISEASE_ANSWER
+
+
+def response_payload(text, prompt_tokens, final=True):
+    payload = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}]}
+    if final:
+        payload["candidates"][0]["finishReason"] = "STOP"
+        payload["usageMetadata"] = {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": len(text.split()),
+            "totalTokenCount": prompt_tokens + len(text.split()),
+        }
+    return payload
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    failure_rate = 0.0
+    requests = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        with self.lock:
+            StubHandler.requests += 1
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = "".join(
+            part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])
+        )
+        time.sleep(self.latency)
+
+        if random.random() < self.failure_rate:
+            self._send_json(503, {"error": {"code": 503, "message": "Stub overloaded", "status": "UNAVAILABLE"}})
+            return
+
+        generation_config = body.get("generationConfig") or body.get("generation_config") or {}
+        if (generation_config.get("responseMimeType") or generation_config.get("response_mime_type")) == "application/json":
+            text = canned_json_answer(generation_config.get("responseSchema") or generation_config.get("response_schema"), prompt)
+        else:
+            text = canned_answer(prompt)
+        prompt_tokens = len(prompt.split())
+        if ":streamGenerateContent" in self.path:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            # The REST transport streams a JSON array of responses, one element per chunk
+            pieces = text.split("\n\n")
+            for i, piece in enumerate(pieces):
+                chunk = piece + ("\n\n" if i < len(pieces) - 1 else "")
+                payload = response_payload(chunk, prompt_tokens, final=i == len(pieces) - 1)
+                self.wfile.write((("[" if i == 0 else ",") + json.dumps(payload) + "\n").encode())
+                self.wfile.flush()
+                time.sleep(self.latency / max(len(pieces), 1))
+            self.wfile.write(b"]")
+        else:
+            self._send_json(200, response_payload(text, prompt_tokens))
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=0, latency_ms=0.0, failure_rate=0.0):
+    """Start the stub on a background thread and return the server (server.server_port)."""
+    StubHandler.latency = latency_ms / 1000.0
+    StubHandler.failure_rate = failure_rate
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local Gemini REST stub.")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.latency_ms, args.failure_rate)
+    print(f"Gemini stub listening on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
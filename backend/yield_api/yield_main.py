@@ -2,10 +2,11 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 import pandas as pd
-import joblib
 import os
 import random
 
+from common.model_store import load_artifact
+
 router = APIRouter()
 
 # Load the trained pipeline (includes both preprocessing and model)
@@ -20,7 +21,7 @@ def load_model():
     global pipeline
     if pipeline is None:
         try:
-            pipeline = joblib.load(model_path)
+            pipeline = load_artifact(model_path)
         except Exception as e:
             print(f"Warning: Could not load yield prediction model: {e}")
             pipeline = None